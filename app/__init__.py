@@ -31,6 +31,40 @@ migrate = Migrate()
 login_manager = LoginManager()
 mail = Mail()
 
+# (table, column, DDL) pairs checked on startup, see create_app()
+_LATE_COLUMNS = [
+    ('supplier_xmls', 'parse_mode', "VARCHAR(20) DEFAULT 'dom'"),
+    ('supplier_xmls', 'etag', 'VARCHAR(500)'),
+    ('supplier_xmls', 'last_modified', 'VARCHAR(100)'),
+    ('supplier_xmls', 'content_hash', 'VARCHAR(64)'),
+    ('supplier_xmls', 'extraction_plan', 'TEXT'),
+    ('supplier_xmls', 'change_seq', 'BIGINT NOT NULL DEFAULT 0'),
+    ('cached_xml_products', 'row_hash', 'VARCHAR(32)'),
+    ('persistent_jobs', 'owner_id', 'INTEGER'),
+    ('persistent_jobs', 'priority', 'INTEGER DEFAULT 5'),
+]
+
+# Tables and unique indexes only `flask db upgrade` creates (db.create_all is not run on startup).
+# Missing ones are reported on startup and kept in app.config['SCHEMA_MISSING'].
+_MIGRATED_TABLES = ['xml_change_journal', 'job_logs', 'setting_versions', 'rate_limit_buckets']
+_MIGRATED_UNIQUE_INDEXES = [
+    # INSERT ... ON CONFLICT (xml_source_id, stock_code) in refresh_xml_cache needs it
+    ('cached_xml_products', 'idx_xml_stock_code'),
+]
+
+
+def _missing_migrated_schema() -> list:
+    """Names of _MIGRATED_TABLES / _MIGRATED_UNIQUE_INDEXES not present in the database."""
+    from sqlalchemy import inspect
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    missing = [t for t in _MIGRATED_TABLES if t not in tables]
+    for table, index in _MIGRATED_UNIQUE_INDEXES:
+        indexes = inspector.get_indexes(table) if table in tables else []
+        if not any(ix['name'] == index and ix.get('unique') for ix in indexes):
+            missing.append(index)
+    return missing
+
 # Configure login manager
 login_manager.login_view = 'auth.login'
 login_manager.login_message = 'Bu sayfaya erişmek için giriş yapmalısınız.'
@@ -176,6 +210,29 @@ def create_app(config_name='default'):
                 db.session.rollback()
                 app.logger.error(f"Database: Failed to add is_support column: {e}")
 
+        # Columns added by later migrations; add them if the migration was not run yet
+        for table, column, ddl in _LATE_COLUMNS:
+            try:
+                db.session.execute(text(f'SELECT {column} FROM {table} LIMIT 1'))
+            except Exception:
+                db.session.rollback()
+                try:
+                    db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+                    db.session.commit()
+                    app.logger.info(f"Database: Added {column} column to {table} table")
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.error(f"Database: Failed to add {column} column: {e}")
+
+        try:
+            app.config['SCHEMA_MISSING'] = _missing_migrated_schema()
+        except Exception as e:
+            app.logger.error(f"Database: Schema check failed: {e}")
+            app.config['SCHEMA_MISSING'] = []
+        if app.config['SCHEMA_MISSING']:
+            app.logger.error("Database: Missing tables/indexes %s; run `flask db upgrade`. "
+                             "XML cache refresh is disabled until then.", ', '.join(app.config['SCHEMA_MISSING']))
+
         # Create admin user if not exists
         try:
             from app.services.user_service import create_admin_user_if_not_exists
@@ -1,8 +1,8 @@
 from .user import User
 from .subscription import Subscription
 from .admin_log import AdminLog
-from .product import Product, SupplierXML, MarketplaceProduct, CachedXmlProduct, PersistentJob
-from .settings import Setting, BatchLog
+from .product import Product, SupplierXML, MarketplaceProduct, CachedXmlProduct, XmlChangeJournal, PersistentJob, JobLog
+from .settings import Setting, SettingVersion, BatchLog
 from .order import Order, OrderItem, Customer
 from .auto_sync import AutoSync, SyncLog
 from .excel_file import ExcelFile
@@ -16,3 +16,4 @@ from .expense import Expense
 from app.models.notification import Notification, PushSubscription
 from app.models.contact import ContactMessage
 from app.models.sync_exception import SyncException
+from app.models.rate_limit import RateLimitBucket
@@ -48,6 +48,13 @@ class SupplierXML(db.Model):
     active = db.Column(db.Boolean, default=True)
     use_random_barcode = db.Column(db.Boolean, default=False) # Kullanıcı isteğine bağlı random barkod
     last_cached_at = db.Column(db.DateTime, nullable=True)     # Son cache'lenme zamanı
+    parse_mode = db.Column(db.String(20), default='dom')       # 'dom' (xmltodict) veya 'stream' (iterparse)
+    # Conditional GET doğrulayıcıları (son başarılı önbellek yenilemesindeki değerler)
+    etag = db.Column(db.String(500), nullable=True)
+    last_modified = db.Column(db.String(100), nullable=True)   # Last-Modified başlığı (ham metin)
+    content_hash = db.Column(db.String(64), nullable=True)     # İçeriğin sha256 özeti
+    extraction_plan = db.Column(db.Text, nullable=True)        # Öğrenilmiş alan anahtarları (JSON, xml_extraction_plan)
+    change_seq = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')  # Son XmlChangeJournal sırası
     created_at = db.Column(db.String, default=lambda: datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
 
 
@@ -81,6 +88,7 @@ class MarketplaceProduct(db.Model):
     
     __table_args__ = (
         db.UniqueConstraint('user_id', 'marketplace', 'barcode', name='unique_mp_product'),
+        db.Index('idx_mp_product_stock_code', 'user_id', 'marketplace', 'stock_code'),
     )
 
     @property
@@ -110,12 +118,32 @@ class CachedXmlProduct(db.Model):
     category = db.Column(db.String(500))
     images_json = db.Column(db.Text)
     raw_data = db.Column(db.Text) # Kaynak verinin tamamı (JSON)
+    row_hash = db.Column(db.String(32)) # raw_data md5 özeti (değişen satırları bulmak için)
     last_updated = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
 
     __table_args__ = (
-        db.Index('idx_xml_stock_code', 'xml_source_id', 'stock_code'),
+        db.Index('idx_xml_stock_code', 'xml_source_id', 'stock_code', unique=True),
     )
 
+class XmlChangeJournal(db.Model):
+    """Price / stock changes of a source's cached XML rows; seq increases per source (SupplierXML.change_seq)."""
+    __tablename__ = 'xml_change_journal'
+
+    id = db.Column(db.Integer, primary_key=True)
+    xml_source_id = db.Column(db.Integer, nullable=False)
+    seq = db.Column(db.BigInteger, nullable=False)
+    stock_code = db.Column(db.String(200), nullable=False)
+    old_price = db.Column(db.Float, nullable=True)     # NULL: new in the feed
+    new_price = db.Column(db.Float, nullable=True)     # NULL: dropped from the feed
+    old_quantity = db.Column(db.Integer, nullable=True)
+    new_quantity = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    __table_args__ = (
+        db.Index('idx_xml_journal_source_seq', 'xml_source_id', 'seq', unique=True),
+    )
+
+
 class PersistentJob(db.Model):
     __tablename__ = 'persistent_jobs'
     
@@ -135,6 +163,9 @@ class PersistentJob(db.Model):
     logs_json = db.Column(db.Text)   # JSON serialized logs
     
     cancel_requested = db.Column(db.Boolean, default=False)
+    # Scheduling (job_scheduler): owner for per-user limits / fair share, lower priority runs first
+    owner_id = db.Column(db.Integer, nullable=True, index=True)
+    priority = db.Column(db.Integer, default=5)
     
     created_at = db.Column(db.DateTime, default=datetime.now)
     updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
@@ -148,3 +179,21 @@ class PersistentJob(db.Model):
     def get_logs(self):
         import json
         return json.loads(self.logs_json) if self.logs_json else []
+
+
+class JobLog(db.Model):
+    """Append-only job log lines (written in batches by job_log_sink); id orders lines of a job."""
+    __tablename__ = 'job_logs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(50), nullable=False)
+    ts = db.Column(db.String(32))      # ISO timestamp (UTC), same as the old logs_json entries
+    level = db.Column(db.String(10))
+    message = db.Column(db.Text)
+
+    __table_args__ = (
+        db.Index('idx_job_logs_job_id_id', 'job_id', 'id'),
+    )
+
+    def to_dict(self):
+        return {'seq': self.id, 'ts': self.ts, 'level': self.level, 'message': self.message}
@@ -0,0 +1,15 @@
+from app import db
+
+
+class RateLimitBucket(db.Model):
+    """
+    Pazaryeri API limitleyicisinin paylaşılan kova durumu (RATE_LIMIT_BACKEND='postgres').
+    Tüm worker'lar / sunucular aynı satırı SELECT ... FOR UPDATE ile kilitleyip günceller.
+    Zamanlar veritabanı saatine göre epoch saniyesidir.
+    """
+    __tablename__ = "rate_limit_buckets"
+
+    key = db.Column(db.String(120), primary_key=True)  # '<marketplace>:<credential hash>'
+    tat = db.Column(db.Float, nullable=False, default=0)  # GCRA theoretical arrival time
+    blocked_until = db.Column(db.Float, nullable=False, default=0)  # 429 backoff
+    streak = db.Column(db.Integer, nullable=False, default=0)  # consecutive 429s
@@ -16,6 +16,12 @@ class Setting(db.Model):
 
     @staticmethod
     def get(k, default=None, user_id=None):
+        from app.services.settings_cache import SETTINGS_CACHE
+        if SETTINGS_CACHE.usable():
+            try:
+                return SETTINGS_CACHE.get(k, default, user_id=user_id)
+            except Exception as e:
+                SETTINGS_CACHE.suspend(e)
         try:
             s = Setting.query.filter_by(key=k, user_id=user_id).first()
             return s.value if s else default
@@ -44,6 +50,7 @@ class Setting(db.Model):
                 db.session.add(Setting(key=k, value=v, user_id=user_id))
             
             db.session.commit()
+            Setting.invalidate_cache(user_id)
             # print(f"Setting saved - {k}: {v}")
             return True
         except Exception as e:
@@ -51,6 +58,20 @@ class Setting(db.Model):
             db.session.rollback()
             return False
 
+    @staticmethod
+    def invalidate_cache(user_id=None):
+        """Call after changing a user's settings outside Setting.set (bulk update / delete)."""
+        from app.services.settings_cache import SETTINGS_CACHE
+        SETTINGS_CACHE.written(user_id)
+
+
+class SettingVersion(db.Model):
+    """Change counter of each user's settings (scope 0: global); cached Setting.get reloads when it moves."""
+    __tablename__ = "setting_versions"
+    scope = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+
 class BatchLog(db.Model):
     __tablename__ = "batch_logs"
     id = db.Column(db.Integer, primary_key=True)
@@ -449,6 +449,8 @@ def delete_user_route(user_id):
 
         db.session.commit()
 
+        Setting.invalidate_cache(user_id)
+
         flash(f'Kullanıcı "{user_name}" ve tüm verileri başarıyla silindi.', 'success')
 
     except Exception as e:
@@ -1431,6 +1433,13 @@ def api_live_logs():
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@admin_bp.route('/api/rate-limits')
+@admin_required
+def api_rate_limits():
+    """Pazaryeri API limitleyici kova metrikleri (bu worker; anahtarlar kimlik bilgisi hash'i)."""
+    from app.utils.rate_limiter import limiter_metrics
+    return jsonify({'success': True, 'limiters': limiter_metrics()})
+
 @admin_bp.route('/debug/xml-log')
 @admin_required
 def debug_xml_log():
@@ -4,12 +4,18 @@ import logging
 from datetime import datetime
 from collections import Counter
 from typing import Dict, Any, List, Optional
-from flask import Blueprint, request, jsonify, flash, redirect, url_for
+from flask import Blueprint, request, jsonify, flash, redirect, url_for, Response, stream_with_context
 from flask_login import login_required, current_user
+from sqlalchemy import or_
 from app import db
-from app.models import SupplierXML, Product, BatchLog, Setting, AutoSync, SyncLog, MarketplaceProduct
+from app.models import SupplierXML, Product, BatchLog, Setting, AutoSync, SyncLog, MarketplaceProduct, PersistentJob
 from app.services.job_queue import submit_mp_job, get_mp_job, append_mp_job_log, get_running_job_for_user, control_mp_job
-from app.services.xml_service import fetch_xml_from_url, load_xml_source_index
+from app.services.job_events import (
+    stream_job_events, acquire_stream_slot, release_stream_slot, stream_busy_body,
+    JOB_EVENTS_HEARTBEAT_SECONDS
+)
+from app.services.xml_service import fetch_xml_from_url, load_xml_source_index, XML_PARSE_MODES
+from app.services.xml_record_store import materialize_record
 from app.services.trendyol_service import (
     perform_trendyol_sync_stock, perform_trendyol_sync_prices, perform_trendyol_sync_all,
     get_trendyol_client, load_trendyol_snapshot
@@ -159,6 +165,7 @@ def api_xml_sources():
                     'name': r.name,
                     'url': r.url,
                     'active': bool(r.active),
+                    'parse_mode': r.parse_mode or 'dom',
                     'created_at': (str(r.created_at) if getattr(r, 'created_at', None) is not None else None),
                 } for r in rows
             ]
@@ -171,8 +178,11 @@ def api_xml_sources():
         data = request.get_json(force=True) or {}
         name = (data.get('name') or '').strip()
         url = (data.get('url') or '').strip()
+        parse_mode = (data.get('parse_mode') or 'dom').strip().lower()
         if not name or not url:
             return jsonify({'success': False, 'message': 'İsim ve URL zorunludur.'}), 400
+        if parse_mode not in XML_PARSE_MODES:
+            return jsonify({'success': False, 'message': 'Geçersiz ayrıştırma modu.'}), 400
             
         # Check plan permission (BUG-Z Restriction)
         if not current_user.has_plan_feature('add_xml_source'):
@@ -189,7 +199,8 @@ def api_xml_sources():
             user_id=user_id,
             name=name,
             url=url,
-            active=True
+            active=True,
+            parse_mode=parse_mode
         )
         db.session.add(new_xml)
         db.session.commit()
@@ -231,6 +242,26 @@ def api_push_order_to_bugz(order_id):
     except Exception as e:
         return jsonify({'success': False, 'message': f"Sistem Hatası: {str(e)}"}), 500
 
+@api_bp.route('/api/xml_sources/<int:source_id>', methods=['PATCH'])
+@login_required
+def api_xml_sources_update(source_id: int):
+    """Update per-source options (currently only parse_mode: 'dom' | 'stream')."""
+    try:
+        row = SupplierXML.query.filter_by(id=source_id, user_id=current_user.id).first()
+        if not row:
+            return jsonify({'success': False, 'message': 'Kayıt bulunamadı.'}), 404
+        data = request.get_json(force=True) or {}
+        if 'parse_mode' in data:
+            parse_mode = (data.get('parse_mode') or '').strip().lower()
+            if parse_mode not in XML_PARSE_MODES:
+                return jsonify({'success': False, 'message': 'Geçersiz ayrıştırma modu.'}), 400
+            row.parse_mode = parse_mode
+        db.session.commit()
+        return jsonify({'success': True, 'parse_mode': row.parse_mode})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+
 @api_bp.route('/api/xml_sources/<int:source_id>', methods=['DELETE'])
 @login_required
 def api_xml_sources_delete(source_id: int):
@@ -246,14 +277,52 @@ def api_xml_sources_delete(source_id: int):
         return jsonify({'success': False, 'message': str(e)}), 500
 
 # ---------------- Job Queue API Endpoints ----------------
+def _owns_mp_job(job_id: str) -> bool:
+    # Log lines carry seller data: only the job's owner may read them.
+    # Jobs submitted from the panel carry user_id, auto-sync jobs only owner_id.
+    return db.session.query(PersistentJob.id).filter(
+        PersistentJob.id == job_id,
+        or_(PersistentJob.user_id == current_user.id, PersistentJob.owner_id == current_user.id),
+    ).first() is not None
+
+
 @api_bp.route('/api/mp_jobs/<job_id>', methods=['GET'])
+@login_required
 def api_mp_job_detail(job_id: str):
-    job = get_mp_job(job_id)
+    if not _owns_mp_job(job_id):
+        return jsonify({'error': 'Job bulunamadı'}), 404
+    # ?log_offset=<seq>: only log lines after seq; ?log_tail=<n>: last n lines (0 = none)
+    job = get_mp_job(job_id, log_offset=request.args.get('log_offset', type=int),
+                     log_tail=request.args.get('log_tail', type=int))
     if not job:
         return jsonify({'error': 'Job bulunamadı'}), 404
     return jsonify(job)
 
 
+@api_bp.route('/api/mp_jobs/<job_id>/events', methods=['GET'])
+@login_required
+def api_mp_job_events(job_id: str):
+    """Canlı ilerleme / log akışı (SSE). Yeniden bağlanınca Last-Event-ID'den sonraki satırlar gelir."""
+    if not _owns_mp_job(job_id):
+        return jsonify({'error': 'Job bulunamadı'}), 404
+
+    if not acquire_stream_slot():
+        # Every stream slot of this worker is taken; the widget falls back to polling
+        return Response(stream_busy_body(), status=503, mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache',
+                                 'Retry-After': str(int(JOB_EVENTS_HEARTBEAT_SECONDS))})
+
+    log_offset = request.headers.get('Last-Event-ID', type=int)
+    if log_offset is None:
+        log_offset = request.args.get('log_offset', type=int)
+    response = Response(stream_with_context(stream_job_events(job_id, log_offset=log_offset,
+                                                              log_tail=request.args.get('log_tail', type=int))),
+                        mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(release_stream_slot)
+    return response
+
+
 @api_bp.route('/api/jobs/active', methods=['GET'])
 @login_required
 def api_active_job():
@@ -599,7 +668,8 @@ def api_xml_source_products():
     total = len(filtered)
     start = max(0, (page-1)*per_page)
     end = start + per_page
-    return jsonify({'total': total, 'items': filtered[start:end]})
+    # Compact record store: materialise only the page being returned
+    return jsonify({'total': total, 'items': [materialize_record(rec) for rec in filtered[start:end]]})
 
 @api_bp.route('/api/marketplace_products/<marketplace>')
 def api_marketplace_products(marketplace: str):
@@ -2342,7 +2412,10 @@ def api_job_status(job_id: str):
     """İş durumunu ve ilerlemesini sorgula"""
     try:
         from app.services.job_queue import get_mp_job
-        job = get_mp_job(job_id)
+        log_offset = request.args.get('log_offset', type=int)
+        log_tail = request.args.get('log_tail', type=int)
+        job = get_mp_job(job_id, log_offset=log_offset,
+                         log_tail=log_tail if log_tail is not None or log_offset is not None else 0)
         if not job:
             return jsonify({'success': False, 'message': 'İş bulunamadı'}), 404
         
@@ -2351,7 +2424,9 @@ def api_job_status(job_id: str):
             'status': job.get('status'),
             'progress': job.get('progress', {}),
             'error': job.get('error'),
-            'marketplace': job.get('marketplace')
+            'marketplace': job.get('marketplace'),
+            'logs': job.get('logs', []),
+            'log_offset': job.get('log_offset', 0)
         })
     except Exception as e:
         logging.exception(f"Error fetching job status for {job_id}")
@@ -7,7 +7,7 @@ from flask import Blueprint, render_template, request, flash, redirect, url_for,
 from flask_login import login_required, current_user
 import logging
 from app import db
-from app.models import Product, BatchLog, Setting, SupplierXML, Order, Announcement, OrderItem, AdminLog, MarketplaceProduct
+from app.models import Product, BatchLog, Setting, SupplierXML, Order, Announcement, OrderItem, AdminLog, MarketplaceProduct, JobLog
 from app.services.trendyol_service import (
     get_trendyol_client, load_trendyol_snapshot, fetch_trendyol_categories_flat
 )
@@ -686,7 +686,12 @@ def batch_logs():
 def batch_detail(batch_id):
     entry = BatchLog.query.filter_by(batch_id=batch_id, user_id=current_user.id).first()
     if entry is not None:
-        return render_template("batch_detail.html", entry=entry, d=entry.get_details())
+        d = entry.get_details()
+        # details_json only keeps the last lines; the full log lives in job_logs
+        rows = JobLog.query.filter_by(job_id=batch_id).order_by(JobLog.id.asc()).all()
+        if rows:
+            d['logs'] = [r.to_dict() for r in rows]
+        return render_template("batch_detail.html", entry=entry, d=d)
     
     flash("Log bulunamadı.", "danger")
     return redirect(url_for('main.batch_logs'))
@@ -10,6 +10,8 @@ from app.models import Setting, SupplierXML, SyncLog, AutoSync
 # from app.services.xml_service import fetch_xml_from_url # No longer needed if using perform_...
 # But perform_... might need it? No, they import it.
 from app.utils.helpers import get_marketplace_multiplier, to_float, to_int, chunked
+from app.services.job_queue import submit_mp_job
+from app.services.job_scheduler import PRIORITY_LOW
 
 
 logger = logging.getLogger(__name__)
@@ -37,7 +39,8 @@ def sync_all_users_marketplace(marketplace: str):
                     f'auto_sync_{marketplace}',
                     marketplace,
                     lambda jid, uid=record.user_id: sync_marketplace_products(marketplace, user_id=uid, job_id=jid),
-                    params={'marketplace': marketplace, 'user_id': record.user_id, 'is_auto': True}
+                    params={'marketplace': marketplace, 'user_id': record.user_id, 'is_auto': True},
+                    priority=PRIORITY_LOW
                 )
                 success_count += 1
                 logger.info(f"Auto-sync job {job_id} submitted for user {record.user_id} on {marketplace}")
@@ -0,0 +1,120 @@
+"""
+Toplu yükleme (bulk upsert) servisi.
+PostgreSQL'de satırlar COPY FROM STDIN ile geçici bir staging tablosuna akıtılır ve tek bir
+INSERT ... SELECT ... ON CONFLICT ifadesiyle hedef tabloya birleştirilir.
+SQLite'ta (geliştirme ortamı) aynı sonuç executemany batch'leri ile elde edilir.
+"""
+import io
+import uuid
+import logging
+from datetime import datetime, date
+from typing import Any, Dict, List, Optional, Sequence
+
+from app import db
+from app.utils.helpers import chunked
+
+logger = logging.getLogger(__name__)
+
+COPY_CHUNK_ROWS = 20000   # rows buffered per COPY call
+EXECUTEMANY_BATCH = 1000  # rows per executemany batch (fallback)
+
+
+def bulk_upsert(model: Any, rows: List[Dict[str, Any]], conflict_cols: Sequence[str],
+                update_cols: Optional[Sequence[str]] = None) -> int:
+    """
+    Insert or update rows of a model keyed by a unique constraint (conflict_cols).
+
+    update_cols: columns overwritten on conflict (default: every given column except the key);
+    an empty list means DO NOTHING. Rows with the same key collapse to the last one.
+    Columns missing from a row get the model's Python-side default.
+    Runs inside the current session transaction and does not commit.
+    """
+    if not rows:
+        return 0
+    table = model.__table__
+    given = list(dict.fromkeys(key for row in rows for key in row))
+    if update_cols is None:
+        # Only what the caller provided; default-filled columns must not overwrite existing rows
+        update_cols = [c for c in given if c not in conflict_cols]
+    columns, rows = _prepare_rows(table, given, rows, conflict_cols)
+
+    if db.engine.dialect.name == 'postgresql':
+        return _copy_upsert(table, columns, rows, conflict_cols, update_cols)
+    return _executemany_upsert(table, rows, conflict_cols, update_cols)
+
+
+def _prepare_rows(table, given: List[str], rows: List[Dict[str, Any]], conflict_cols: Sequence[str]):
+    columns = list(given)
+    defaults = {}
+    for col in table.columns:
+        if col.primary_key or col.default is None or not (col.default.is_scalar or col.default.is_callable):
+            continue
+        if col.name not in columns:
+            columns.append(col.name)
+        defaults[col.name] = col.default.arg(None) if col.default.is_callable else col.default.arg
+
+    # Last row wins per key (ON CONFLICT cannot touch the same row twice in one statement)
+    unique: Dict[tuple, Dict[str, Any]] = {}
+    for row in rows:
+        full = {c: row[c] if c in row else defaults.get(c) for c in columns}
+        unique[tuple(full[c] for c in conflict_cols)] = full
+    return columns, list(unique.values())
+
+
+def _copy_value(value: Any) -> str:
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def _copy_upsert(table, columns: List[str], rows: List[Dict[str, Any]],
+                 conflict_cols: Sequence[str], update_cols: Sequence[str]) -> int:
+    staging = f'_stg_{table.name}_{uuid.uuid4().hex[:8]}'
+    col_list = ', '.join(f'"{c}"' for c in columns)
+    if update_cols:
+        action = 'DO UPDATE SET ' + ', '.join(f'"{c}" = EXCLUDED."{c}"' for c in update_cols)
+    else:
+        action = 'DO NOTHING'
+
+    # Raw psycopg2 cursor on the session's connection, so everything stays in one transaction
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.execute(f'CREATE TEMP TABLE {staging} ON COMMIT DROP AS '
+                       f'SELECT {col_list} FROM "{table.name}" WITH NO DATA')
+        for chunk in chunked(rows, COPY_CHUNK_ROWS):
+            buf = io.StringIO()
+            for row in chunk:
+                buf.write('\t'.join(_copy_value(row[c]) for c in columns))
+                buf.write('\n')
+            buf.seek(0)
+            cursor.copy_expert(f'COPY {staging} ({col_list}) FROM STDIN', buf)
+
+        conflict = ', '.join(f'"{c}"' for c in conflict_cols)
+        cursor.execute(f'INSERT INTO "{table.name}" ({col_list}) SELECT {col_list} FROM {staging} '
+                       f'ON CONFLICT ({conflict}) {action}')
+        affected = cursor.rowcount
+        cursor.execute(f'DROP TABLE IF EXISTS {staging}')
+        return affected
+    finally:
+        cursor.close()
+
+
+def _executemany_upsert(table, rows: List[Dict[str, Any]], conflict_cols: Sequence[str],
+                        update_cols: Sequence[str]) -> int:
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+    stmt = sqlite_insert(table)
+    if update_cols:
+        stmt = stmt.on_conflict_do_update(index_elements=list(conflict_cols),
+                                          set_={c: stmt.excluded[c] for c in update_cols})
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=list(conflict_cols))
+
+    for chunk in chunked(rows, EXECUTEMANY_BATCH):
+        db.session.execute(stmt, chunk)
+    return len(rows)
@@ -0,0 +1,92 @@
+"""
+Pazaryeri API istemcileri için süreç içi kayıt defteri.
+get_*_client her çağrıda yeni bir istemci, dolayısıyla yeni bir requests.Session, HTTPAdapter ve
+yeni TLS bağlantıları kuruyordu (her iş, her panel istatistiği, her sipariş senkronu).
+Artık (pazaryeri, kullanıcı) başına bir istemci tutulur ve bağlantıları keep-alive ile yeniden
+kullanılır. Anahtar, kimlik bilgilerinin özetini de içerir: Ayarlar'da bilgiler değişince bir
+sonraki çağrıda yeni istemci kurulur, eskisinin oturumu kapatılır. Bağlantı havuzu
+MP_HTTP_POOL_MAXSIZE ile eşzamanlı sayfalamaya yetecek büyüklükte açılır.
+"""
+import os
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from requests.adapters import HTTPAdapter
+
+from app.utils.rate_limiter import credential_key
+
+logger = logging.getLogger(__name__)
+
+MP_CLIENT_CACHE = os.environ.get('MP_CLIENT_CACHE', '1').lower() in ('1', 'true', 'yes')
+# Connections kept per host; at least the concurrent pagination fan-out (partitions x pages)
+MP_HTTP_POOL_MAXSIZE = int(os.environ.get('MP_HTTP_POOL_MAXSIZE', '16'))
+
+
+def tune_session(session) -> None:
+    """Re-mount the session's adapters with a larger keep-alive pool, keeping their retry policy."""
+    for prefix, adapter in list(session.adapters.items()):
+        max_retries = getattr(adapter, 'max_retries', 0)
+        session.mount(prefix, HTTPAdapter(pool_connections=4, pool_maxsize=MP_HTTP_POOL_MAXSIZE,
+                                          max_retries=max_retries))
+
+
+class ClientRegistry:
+    """One shared client per (marketplace, owner), rebuilt when its credentials change."""
+
+    def __init__(self, enabled: bool = MP_CLIENT_CACHE):
+        self.enabled = enabled
+        self._clients: Dict[Tuple[str, Hashable], Tuple[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'created': 0, 'replaced': 0}
+
+    def get(self, marketplace: str, owner: Hashable, credentials: Tuple, factory: Callable[[], Any]) -> Any:
+        """Cached client for the credentials, built with factory() on first use or after a change."""
+        if not self.enabled:
+            return factory()
+        fingerprint = credential_key(*credentials)
+        slot = (marketplace, owner)
+        with self._lock:
+            entry = self._clients.get(slot)
+            if entry is not None and entry[0] == fingerprint:
+                self._stats['hits'] += 1
+                return entry[1]
+            # Built under the lock so concurrent callers share one client (constructors do no I/O)
+            client = factory()
+            session = getattr(client, 'session', None)
+            if session is not None:
+                tune_session(session)
+            self._clients[slot] = (fingerprint, client)
+            self._stats['created'] += 1
+            if entry is not None:
+                self._stats['replaced'] += 1
+        if entry is not None:
+            logger.info("%s client credentials changed for %s, rebuilt", marketplace, owner)
+            _close(entry[1])
+        return client
+
+    def invalidate(self, marketplace: Optional[str] = None, owner: Optional[Hashable] = None) -> int:
+        """Drop cached clients (all, one marketplace, or one marketplace/owner). Returns how many."""
+        with self._lock:
+            slots = [s for s in self._clients
+                     if (marketplace is None or s[0] == marketplace) and (owner is None or s[1] == owner)]
+            dropped = [self._clients.pop(s)[1] for s in slots]
+        for client in dropped:
+            _close(client)
+        return len(dropped)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, cached=len(self._clients))
+
+
+def _close(client) -> None:
+    session = getattr(client, 'session', None)
+    if session is not None:
+        try:
+            session.close()
+        except Exception:
+            pass
+
+
+CLIENT_REGISTRY = ClientRegistry()
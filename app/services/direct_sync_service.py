@@ -1,23 +1,125 @@
+import os
 import logging
 import json
 import time
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 from app import db
-from app.models import MarketplaceProduct, SupplierXML, SyncLog, Setting, CachedXmlProduct
+from app.models import MarketplaceProduct, SupplierXML, SyncLog, Setting, CachedXmlProduct, XmlChangeJournal
 from app.services.job_queue import append_mp_job_log, update_mp_job, get_mp_job, update_job_progress
+from app.services.job_control import job_token
 from app.services.xml_service import generate_random_barcode
+from app.services.sync_diff import compute_diff
 import sqlalchemy
 
 logger = logging.getLogger(__name__)
 
+# XML içeriği (content_hash) değişmediyse senkronizasyon atlanır; yine de en az bu
+# aralıkta bir tam karşılaştırma yapılır.
+DIRECT_SYNC_UNCHANGED_MAX_AGE_SECONDS = 24 * 3600
+# Artımlı senkronizasyon: yalnızca filigrandan sonraki XmlChangeJournal kayıtlarındaki stok kodları
+# karşılaştırılır. Bu aralıkta bir, günlükte boşluk varsa ya da çok fazla değişiklik birikmişse tam
+# karşılaştırma yapılır (güvenlik ağı: pazaryerinde elle yapılan değişiklikler, başarısız gönderimler).
+DIRECT_SYNC_FULL_RECONCILE_SECONDS = int(os.environ.get('DIRECT_SYNC_FULL_RECONCILE_SECONDS', str(6 * 3600)))
+DIRECT_SYNC_INCREMENTAL_MAX_CHANGES = int(os.environ.get('DIRECT_SYNC_INCREMENTAL_MAX_CHANGES', '20000'))
+
 class DirectSyncService:
     @staticmethod
-    def perform_sync(marketplace: str, user_id: int, xml_source_id: int, job_id: Optional[str] = None) -> Dict[str, Any]:
+    def _synced_hash_key(marketplace: str, xml_source_id: int) -> str:
+        return f'DIRECT_SYNC_HASH_{marketplace}_{xml_source_id}'
+
+    @staticmethod
+    def is_unchanged_since_last_sync(marketplace: str, user_id: int, src: SupplierXML) -> bool:
+        """XML içeriği son başarılı senkronizasyondakiyle aynı mı? (content_hash karşılaştırması)"""
+        if not src.content_hash:
+            return False
+        raw = Setting.get(DirectSyncService._synced_hash_key(marketplace, src.id), user_id=user_id)
+        if not raw:
+            return False
+        try:
+            state = json.loads(raw)
+        except Exception:
+            return False
+        if state.get('hash') != src.content_hash:
+            return False
+        return (time.time() - float(state.get('at') or 0)) < DIRECT_SYNC_UNCHANGED_MAX_AGE_SECONDS
+
+    @staticmethod
+    def _mark_synced(marketplace: str, user_id: int, src: SupplierXML) -> None:
+        if src.content_hash:
+            Setting.set(DirectSyncService._synced_hash_key(marketplace, src.id),
+                        json.dumps({'hash': src.content_hash, 'at': time.time()}), user_id=user_id)
+
+    @staticmethod
+    def _failed_count(execution_res: Dict[str, Any], to_update: List[Any], to_create: List[Any], to_zero: List[Any]) -> int:
+        """
+        Items of the diff lost to a failed batch or a cancel. The push functions only count
+        successful batches, so this is what was asked minus what was done, less the creates
+        they left out for good (skipped_count: no brand / category match, invalid barcode).
+        Those do not hold back the synced hash or the watermark; after a mapping change the
+        next full compare (DIRECT_SYNC_FULL_RECONCILE_SECONDS) offers them again.
+        """
+        created = execution_res.get('created_count', 0) + execution_res.get('skipped_count', 0)
+        return (max(0, len(to_update) - execution_res.get('updated_count', 0))
+                + max(0, len(to_create) - created)
+                + max(0, len(to_zero) - execution_res.get('zeroed_count', 0)))
+
+    @staticmethod
+    def _watermark_key(marketplace: str, xml_source_id: int) -> str:
+        return f'DIRECT_SYNC_WATERMARK_{marketplace}_{xml_source_id}'
+
+    @staticmethod
+    def _load_watermark(marketplace: str, user_id: int, xml_source_id: int) -> Optional[Dict[str, float]]:
+        raw = Setting.get(DirectSyncService._watermark_key(marketplace, xml_source_id), user_id=user_id)
+        if not raw:
+            return None
+        try:
+            state = json.loads(raw)
+            return {'seq': int(state['seq']), 'full_at': float(state['full_at'])}
+        except Exception:
+            return None
+
+    @staticmethod
+    def _save_watermark(marketplace: str, user_id: int, xml_source_id: int, seq: int, full_at: float) -> None:
+        Setting.set(DirectSyncService._watermark_key(marketplace, xml_source_id),
+                    json.dumps({'seq': seq, 'full_at': full_at}), user_id=user_id)
+
+    @staticmethod
+    def journal_changes(marketplace: str, user_id: int, xml_source_id: int, head: int,
+                        watermark: Optional[Dict[str, float]]) -> Optional[List[str]]:
+        """
+        Filigrandan head'e kadar değişen stok kodları; tam karşılaştırma gerekiyorsa None
+        (filigran yok/eski, tam karşılaştırma zamanı gelmiş, günlük budanmış ya da çok büyük).
+        """
+        if watermark is None or watermark['seq'] > head:
+            return None
+        if time.time() - watermark['full_at'] >= DIRECT_SYNC_FULL_RECONCILE_SECONDS:
+            return None
+        since = watermark['seq']
+        if since == head:
+            return []
+        if head - since > DIRECT_SYNC_INCREMENTAL_MAX_CHANGES:
+            return None
+        in_range = db.session.query(XmlChangeJournal.stock_code).filter(
+            XmlChangeJournal.xml_source_id == xml_source_id,
+            XmlChangeJournal.seq > since,
+            XmlChangeJournal.seq <= head,
+        )
+        # seq is consecutive per source: fewer entries than the range means pruned entries
+        if in_range.count() != head - since:
+            return None
+        return [sc for (sc,) in in_range.distinct()]
+
+    @staticmethod
+    def perform_sync(marketplace: str, user_id: int, xml_source_id: int, job_id: Optional[str] = None, force: bool = False) -> Dict[str, Any]:
         """
         Gelişmiş "Direct Push" Senkronizasyonu.
         Pazaryeri panelinden çekmek yerine yerel veritabanı (MarketplaceProduct) ile
         XML Önbelleği (CachedXmlProduct) karşılaştırılır.
+        force=False iken XML içeriği son başarılı senkronizasyondan beri değişmediyse
+        hiçbir karşılaştırma yapılmadan çıkılır (gönderilemeyen ürün kalan senkronizasyon
+        başarılı sayılmaz); değiştiyse ve filigran güncelse yalnızca
+        değişiklik günlüğündeki (XmlChangeJournal) stok kodları karşılaştırılır.
         """
         start_time = time.time()
         result = {
@@ -35,6 +137,12 @@ class DirectSyncService:
             if job_id: append_mp_job_log(job_id, msg, level='error')
             return {'success': False, 'message': msg}
 
+        if not force and DirectSyncService.is_unchanged_since_last_sync(marketplace, user_id, src):
+            msg = f"[{marketplace.upper()}] XML içeriği son senkronizasyondan beri değişmedi, işlem atlandı."
+            if job_id: append_mp_job_log(job_id, msg)
+            result.update({'success': True, 'skipped': True, 'message': msg})
+            return result
+
         if job_id:
             append_mp_job_log(job_id, f"[{marketplace.upper()}] Direct Push senkronizasyonu başlatıldı.")
             append_mp_job_log(job_id, f"Kaynak: {src.name} | Eşleşme: Stok Kodu")
@@ -42,90 +150,33 @@ class DirectSyncService:
         try:
             # Check Cancel
             if job_id:
-                js = get_mp_job(job_id)
-                if js and js.get('cancel_requested'):
+                if job_token(job_id).cancelled:
                     append_mp_job_log(job_id, "İşlem kullanıcı tarafından iptal edildi.", level='warning')
                     return {'success': False, 'message': 'İptal edildi'}
 
-            # 2. XML Verilerini Al (PostgreSQL'den)
-            # Standart kolonları + ekstra veriler için raw_data'yı çekiyoruz
-            xml_products = db.session.query(
-                CachedXmlProduct.stock_code,
-                CachedXmlProduct.price,
-                CachedXmlProduct.quantity,
-                CachedXmlProduct.barcode,
-                CachedXmlProduct.title,
-                CachedXmlProduct.raw_data
-            ).filter(CachedXmlProduct.xml_source_id == xml_source_id).all()
-            
-            from types import SimpleNamespace
-            import json
-            
-            xml_map = {}
-            for p in xml_products:
-                if not p.stock_code: continue
-                try:
-                    # Ham veriyi SimpleNamespace'e çevirerek dot-notation (p.images vb.) kazandırıyoruz
-                    raw_dict = json.loads(p.raw_data) if p.raw_data else {}
-                    ns = SimpleNamespace(**raw_dict)
-                    
-                    # Veritabanındaki standart/temizlenmiş değerleri garanti ediyoruz
-                    ns.stock_code = p.stock_code
-                    ns.price = p.price
-                    ns.quantity = p.quantity
-                    ns.barcode = p.barcode
-                    ns.title = p.title
-                    ns.raw_data = p.raw_data # Servislerin re-parse yapabilmesi için geri ekliyoruz
-                    
-                    xml_map[p.stock_code] = ns
-                except Exception as e:
-                    logger.warning(f"XML data parse error for {p.stock_code}: {e}")
-            
-            # 3. Yerel Pazaryeri Kayıtlarını Al
-            local_products = db.session.query(
-                MarketplaceProduct.id,
-                MarketplaceProduct.stock_code,
-                MarketplaceProduct.barcode,
-                MarketplaceProduct.quantity,
-                MarketplaceProduct.price,
-                MarketplaceProduct.sale_price,
-                MarketplaceProduct.xml_source_id
-            ).filter_by(user_id=user_id, marketplace=marketplace).all()
-            
-            local_map = {p.stock_code: p for p in local_products if p.stock_code}
+            # 2-4. XML önbelleği ile yerel kayıtların farkı (sütunsal; raw_data yalnızca yeni ürünler için yüklenir)
+            # Günlük başı karşılaştırmadan önce alınır: bu sırada gelen değişiklikler bir sonraki senkronda işlenir
+            head = db.session.query(SupplierXML.change_seq).filter(SupplierXML.id == src.id).scalar() or 0
+            watermark = DirectSyncService._load_watermark(marketplace, user_id, src.id)
+            changed_codes = None if force else DirectSyncService.journal_changes(marketplace, user_id, src.id, head, watermark)
+            full_at = time.time() if changed_codes is None else watermark['full_at']
+            result['incremental'] = changed_codes is not None
+            if job_id:
+                if changed_codes is None:
+                    append_mp_job_log(job_id, "Tam karşılaştırma yapılıyor.")
+                else:
+                    append_mp_job_log(job_id, f"Artımlı karşılaştırma: {head - watermark['seq']} değişiklik kaydı, "
+                                              f"{len(changed_codes)} stok kodu.")
+            diff = compute_diff(marketplace, user_id, xml_source_id, stock_codes=changed_codes)
 
-            if not xml_map:
+            if not diff.xml_count:
                 msg = "XML önbelleği boş. Lütfen önce XML'i yenileyin."
                 if job_id: append_mp_job_log(job_id, msg, level='warning')
                 return {'success': False, 'message': msg}
 
-            # 4. Analiz (Diff)
-            to_update = [] # (xml_item, local_item)
-            to_create = [] # xml_item
-            to_zero = []   # local_item
-
-            for sc, xml_item in xml_map.items():
-                if sc in local_map:
-                    local_item = local_map[sc]
-                    
-                    # Kaynak Sahipliği Kontrolü (Atama yapmadan sadece kontrol ediyoruz)
-                    current_sid = getattr(local_item, 'xml_source_id', None)
-                    ownership_changed = (current_sid != xml_source_id)
-                    
-                    # Değişiklik kontrolü (Stok veya Fiyat veya Sahiplik)
-                    if (xml_item.quantity != local_item.quantity or 
-                        xml_item.price != local_item.price or 
-                        ownership_changed):
-                        to_update.append((xml_item, local_item))
-                else:
-                    to_create.append(xml_item)
-
-            for sc, local_item in local_map.items():
-                if sc not in xml_map and (local_item.quantity or 0) > 0:
-                    # Sadece bu kaynağın sahipliğindeki ürünleri sıfırla
-                    # xml_source_id NULL ise eski veridir, çakışmayı önlemek için dokunmuyoruz
-                    if getattr(local_item, 'xml_source_id', None) == xml_source_id:
-                        to_zero.append(local_item)
+            to_update = diff.to_update # (xml_item, local_item)
+            to_create = diff.to_create # xml_item
+            to_zero = diff.to_zero     # local_item
 
             total_diff = len(to_update) + len(to_create) + len(to_zero)
             if job_id:
@@ -134,12 +185,13 @@ class DirectSyncService:
             if total_diff == 0:
                 msg = "Tüm ürünler zaten güncel."
                 if job_id: append_mp_job_log(job_id, msg)
-                return {'success': True, 'message': msg}
+                DirectSyncService._mark_synced(marketplace, user_id, src)
+                DirectSyncService._save_watermark(marketplace, user_id, src.id, head, full_at)
+                return {'success': True, 'message': msg, 'incremental': result['incremental']}
 
             # Check Cancel
             if job_id:
-                js = get_mp_job(job_id)
-                if js and js.get('cancel_requested'):
+                if job_token(job_id).cancelled:
                     append_mp_job_log(job_id, "İşlem kullanıcı tarafından iptal edildi.", level='warning')
                     return {'success': False, 'message': 'İptal edildi'}
 
@@ -153,6 +205,17 @@ class DirectSyncService:
             
             result.update(execution_res)
             result['success'] = True
+            result['failed_count'] = DirectSyncService._failed_count(execution_res, to_update, to_create, to_zero)
+            if result['failed_count']:
+                # Keep the last synced hash and the watermark: an unchanged feed must not skip the
+                # retry, and the failed stock codes stay in the next incremental diff (the journal
+                # does not say which pushes failed, so the whole range is compared again)
+                if job_id:
+                    append_mp_job_log(job_id, f"{result['failed_count']} ürün pazaryerine gönderilemedi; "
+                                              f"bir sonraki senkronizasyonda tekrar denenecek.", level='warning')
+            else:
+                DirectSyncService._mark_synced(marketplace, user_id, src)
+                DirectSyncService._save_watermark(marketplace, user_id, src.id, head, full_at)
             
         except Exception as e:
             logger.exception(f"Direct sync failed: {e}")
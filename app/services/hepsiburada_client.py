@@ -2,7 +2,7 @@
 import requests
 import logging
 from typing import Dict, Any, List
-from app.utils.rate_limiter import hepsiburada_limiter
+from app.utils.rate_limiter import hepsiburada_limiter, credential_key
 
 class HepsiburadaClient:
     def __init__(self, merchant_id: str, service_key: str):
@@ -29,15 +29,18 @@ class HepsiburadaClient:
         self.session.mount("https://", adapter)
         self.session.mount("http://", adapter)
 
-        # Patch session.request
+        # Patch session.request (one limiter bucket per merchant, 429s slow that bucket down)
+        self._limiter_key = credential_key(self.merchant_id)
         original_request = self.session.request
         def rate_limited_request(method, url, *args, **kwargs):
             # Default timeout for all requests if not specified
             if 'timeout' not in kwargs:
                 kwargs['timeout'] = 20
                 
-            hepsiburada_limiter.wait()
-            return original_request(method, url, *args, **kwargs)
+            hepsiburada_limiter.wait(self._limiter_key)
+            response = original_request(method, url, *args, **kwargs)
+            hepsiburada_limiter.feedback(self._limiter_key, response)
+            return response
         self.session.request = rate_limited_request
 
     def _get_headers(self) -> Dict[str, str]:
@@ -6,8 +6,10 @@ from typing import List, Dict, Any, Optional
 from app import db
 from app.models import Setting, SupplierXML, MarketplaceProduct
 from app.services.hepsiburada_client import HepsiburadaClient
+from app.services.client_registry import CLIENT_REGISTRY
 from app.services.xml_service import load_xml_source_index
 from app.services.job_queue import append_mp_job_log, update_mp_job, get_mp_job
+from app.services.job_control import job_token
 from app.utils.helpers import get_marketplace_multiplier, to_float, to_int, is_product_forbidden, calculate_price
 
 def get_hepsiburada_client(user_id: int = None) -> HepsiburadaClient:
@@ -23,7 +25,9 @@ def get_hepsiburada_client(user_id: int = None) -> HepsiburadaClient:
     if not merchant_id or not service_key:
         raise ValueError("Hepsiburada Merchant ID veya Servis Anahtarı eksik. Ayarlar sayfasından giriniz.")
         
-    return HepsiburadaClient(merchant_id.strip(), service_key.strip())
+    merchant_id, service_key = merchant_id.strip(), service_key.strip()
+    return CLIENT_REGISTRY.get('hepsiburada', user_id, (merchant_id, service_key),
+                               lambda: HepsiburadaClient(merchant_id, service_key))
 
 def perform_hepsiburada_send_products(job_id: str, barcodes: List[str], xml_source_id: Any, user_id: int = None, **kwargs) -> Dict[str, Any]:
     """
@@ -77,8 +81,7 @@ def perform_hepsiburada_send_products(job_id: str, barcodes: List[str], xml_sour
         processed_count += 1
         
         # Check Cancel
-        job = get_mp_job(job_id)
-        if job and job.get('cancel_requested'):
+        if job_token(job_id).cancelled:
             append_mp_job_log(job_id, "İşlem iptal edildi.", level='warning')
             break
             
@@ -450,7 +453,7 @@ def perform_hepsiburada_direct_push_actions(user_id: int, to_update: List[Any],
     import json
     from datetime import datetime
     from app.services.job_queue import append_mp_job_log, append_mp_job_logs, get_mp_job, update_mp_job, update_job_progress
-    from app.utils.helpers import calculate_price, chunked
+    from app.utils.helpers import calculate_prices, chunked
     from app.models import MarketplaceProduct, Setting, db
     
     client = get_hepsiburada_client(user_id=user_id)
@@ -473,15 +476,14 @@ def perform_hepsiburada_direct_push_actions(user_id: int, to_update: List[Any],
         db_mappings = []
         batch_logs = []
         
-        for xml_item, local_item in to_update:
+        update_prices, update_rules = calculate_prices([x.price for x, _ in to_update], 'hepsiburada', user_id=user_id, return_details=True)
+        for (xml_item, local_item), final_price, rule_desc in zip(to_update, update_prices.tolist(), update_rules):
             # Periodic cancel check
             if len(db_mappings) % 50 == 0 and job_id:
-                js = get_mp_job(job_id)
-                if js and js.get('cancel_requested'):
+                if job_token(job_id).cancelled:
                     append_mp_job_log(job_id, "İşlem kullanıcı tarafından iptal edildi.", level='warning')
                     return res
             
-            final_price, rule_desc = calculate_price(xml_item.price, 'hepsiburada', user_id=user_id, return_details=True)
             final_price = round(final_price, 2)
             
             update_payloads.append({
@@ -509,8 +511,7 @@ def perform_hepsiburada_direct_push_actions(user_id: int, to_update: List[Any],
         try:
             for i, batch in enumerate(chunked(update_payloads, 100)):
                 if job_id and i % 5 == 0:
-                    js = get_mp_job(job_id)
-                    if js and js.get('cancel_requested'):
+                    if job_token(job_id).cancelled:
                         append_mp_job_log(job_id, "İptal edildi (Batch sırasında)", level='warning')
                         return res
                 
@@ -541,10 +542,10 @@ def perform_hepsiburada_direct_push_actions(user_id: int, to_update: List[Any],
         from app.services.xml_service import generate_random_barcode
         
         valid_creates = []
-        for xml_item in to_create:
+        create_prices, create_rules = calculate_prices([x.price for x in to_create], 'hepsiburada', user_id=user_id, return_details=True)
+        for xml_item, final_price, rule_desc in zip(to_create, create_prices.tolist(), create_rules):
             if len(valid_creates) % 50 == 0 and job_id:
-                js = get_mp_job(job_id)
-                if js and js.get('cancel_requested'):
+                if job_token(job_id).cancelled:
                     append_mp_job_log(job_id, "İşlem kullanıcı tarafından iptal edildi.", level='warning')
                     return res
             
@@ -555,7 +556,6 @@ def perform_hepsiburada_direct_push_actions(user_id: int, to_update: List[Any],
                 barcode = generate_random_barcode()
             
             raw = json.loads(xml_item.raw_data)
-            final_price, rule_desc = calculate_price(xml_item.price, 'hepsiburada', user_id=user_id, return_details=True)
             
             item_payload = {
                 "MerchantSku": xml_item.stock_code,
@@ -568,11 +568,13 @@ def perform_hepsiburada_direct_push_actions(user_id: int, to_update: List[Any],
             }
             valid_creates.append((item_payload, xml_item, rule_desc))
 
+        # Left out above (no match / invalid barcode), reported apart from failed batches
+        res['skipped_count'] = len(to_create) - len(valid_creates)
+
         # API Chunks
         for batch in chunked(valid_creates, 50):
             if job_id:
-                js = get_mp_job(job_id)
-                if js and js.get('cancel_requested'):
+                if job_token(job_id).cancelled:
                     append_mp_job_log(job_id, "İptal edildi (Create sırasında)", level='warning')
                     return res
  
@@ -620,8 +622,7 @@ def perform_hepsiburada_direct_push_actions(user_id: int, to_update: List[Any],
         for local_item in to_zero:
             # Periodic cancel check
             if len(zero_payloads) % 50 == 0 and job_id:
-                js = get_mp_job(job_id)
-                if js and js.get('cancel_requested'):
+                if job_token(job_id).cancelled:
                     append_mp_job_log(job_id, "İşlem kullanıcı tarafından iptal edildi.", level='warning')
                     return res
             
@@ -638,8 +639,7 @@ def perform_hepsiburada_direct_push_actions(user_id: int, to_update: List[Any],
         try:
             for i, batch in enumerate(chunked(zero_payloads, 100)):
                 if job_id and i % 5 == 0:
-                    js = get_mp_job(job_id)
-                    if js and js.get('cancel_requested'):
+                    if job_token(job_id).cancelled:
                         append_mp_job_log(job_id, "İptal edildi (Zero sırasında)", level='warning')
                         return res
                 
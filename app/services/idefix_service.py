@@ -2,13 +2,17 @@ import base64
 import json
 import time
 import logging
+import threading
 import requests
 from typing import List, Dict, Optional, Any
 from datetime import datetime
-from app.utils.helpers import chunked, get_marketplace_multiplier, to_int, to_float, clean_forbidden_words, is_product_forbidden, calculate_price
-from app.utils.rate_limiter import idefix_limiter
+from app.utils.helpers import chunked, get_marketplace_multiplier, to_int, to_float, clean_forbidden_words, is_product_forbidden, calculate_price, calculate_prices
+from app.utils.rate_limiter import idefix_limiter, credential_key
+from app.utils.pagination import fetch_pages, fetch_partitions, PagedFetch
+from app.services.client_registry import CLIENT_REGISTRY
 
 from app.services.job_queue import append_mp_job_log, get_mp_job, update_mp_job
+from app.services.job_control import job_token
 from app.models import Setting, Product, SupplierXML
 
 logger = logging.getLogger(__name__)
@@ -219,11 +223,14 @@ class IdefixClient:
         self._auth_token = self._generate_auth_token()
         
         self.session = requests.Session()
-        # Patch session.request
+        # Patch session.request (one limiter bucket per vendor, 429s slow that bucket down)
+        self._limiter_key = credential_key(self.vendor_id)
         original_request = self.session.request
         def rate_limited_request(method, url, *args, **kwargs):
-            idefix_limiter.wait()
-            return original_request(method, url, *args, **kwargs)
+            idefix_limiter.wait(self._limiter_key)
+            response = original_request(method, url, *args, **kwargs)
+            idefix_limiter.feedback(self._limiter_key, response)
+            return response
         self.session.request = rate_limited_request
         
     def _generate_auth_token(self) -> str:
@@ -1006,6 +1013,7 @@ items: List[Dict[str, Any]],
             limit: Number of items per page (max 100-500)
             search: Search query (barcode, title, etc.)
             pool_state: Filter by pool state (WAITING_APPROVAL, APPROVED, etc.)
+            raise_errors: Raise instead of returning an empty page on request errors
             
         Returns:
             Dict with 'content' (list of products) and 'totalElements' (totalcount)
@@ -1040,8 +1048,24 @@ items: List[Dict[str, Any]],
             }
         except Exception as e:
             logger.error(f"[IDEFIX] list_products error: {e}")
+            if kwargs.get('raise_errors'):
+                raise
             return {'content': [], 'totalElements': 0}
 
+    def list_all_products(self, limit: int = 100, pool_state: Optional[str] = None, concurrency: Optional[int] = None,
+                          on_progress=None, should_stop=None) -> PagedFetch:
+        """Every page of list_products; pages after the first are fetched concurrently once totalElements is known."""
+        return fetch_pages(
+            lambda page: self.list_products(page=page, limit=limit, pool_state=pool_state, raise_errors=True),
+            lambda resp: resp.get('content') or [],
+            page_size=limit,
+            first_page=0,
+            total_of=lambda resp: resp.get('totalElements'),
+            concurrency=concurrency,
+            on_progress=on_progress,
+            should_stop=should_stop,
+        )
+
     # ============================================================
     # Müşteri Soruları (Customer Questions)
     # ============================================================
@@ -1314,27 +1338,28 @@ def sync_idefix_with_xml_diff(job_id: str, xml_source_id: Any, user_id: int = No
     updated_count = 0
     if final_matched:
         update_payload = []
+        matched_infos = []
         for sc in final_matched:
             # Try Primary Match
             xml_info = xml_map.get(sc)
-            
+
             # Try Fallback Match
             if not xml_info:
                 xml_info = xml_barcode_map.get(sc)
-            
+
             if not xml_info: continue
-            
+            matched_infos.append((sc, xml_info))
+
+        # Price (whole batch at once)
+        final_prices = calculate_prices([to_float(info.get('price'), 0.0) for _, info in matched_infos], 'idefix', user_id=user_id)
+        for (sc, xml_info), final_price in zip(matched_infos, final_prices.tolist()):
             # Need barcode for update payload
             item = remote_stock_map.get(sc)
             barcode = item.get('barcode') if item else sc
-            
+
             # Stock
             qty = to_int(xml_info.get('quantity'), 0)
-            
-            # Price
-            base_price = to_float(xml_info.get('price'), 0.0)
-            final_price = calculate_price(base_price, 'idefix', user_id=user_id)
-            
+
             update_payload.append({
                 'barcode': barcode,
                 'inventoryQuantity': qty,
@@ -1376,7 +1401,7 @@ def fetch_and_cache_categories(user_id: int = None, job_id: str = None) -> Dict[
     
     if user_id is None and job_id:
         from app.services.job_queue import get_mp_job
-        job = get_mp_job(job_id)
+        job = get_mp_job(job_id, log_tail=0)
         if job and job.get('params'):
             user_id = job['params'].get('_user_id')
             
@@ -1495,7 +1520,8 @@ def get_idefix_client(user_id: Optional[int] = None) -> IdefixClient:
         # Return a client that will fail on requests if keys are missing
         return IdefixClient("", "", "")
     
-    return IdefixClient(api_key, api_secret, vendor_id)
+    return CLIENT_REGISTRY.get('idefix', actual_user_id, (api_key, api_secret, vendor_id),
+                               lambda: IdefixClient(api_key, api_secret, vendor_id))
 
 def clear_idefix_cache(user_id: Optional[int] = None):
     """
@@ -1632,9 +1658,7 @@ def perform_idefix_send_products(job_id: str, barcodes: List[str], xml_source_id
     prepared_data_map = {} 
     total_items = len(barcodes)
     def check_cancelled():
-        from app.services.job_queue import get_mp_job
-        job = get_mp_job(job_id)
-        return job and job.get('cancel_requested')
+        return job_token(job_id).cancelled
 
     processed = 0
     for barcode in barcodes:
@@ -1928,9 +1952,7 @@ def perform_idefix_send_products(job_id: str, barcodes: List[str], xml_source_id
     batch_size = 20
     total_batches = (len(create_batch_list) + batch_size - 1) // batch_size
     def check_cancelled():
-        from app.services.job_queue import get_mp_job
-        job = get_mp_job(job_id)
-        return job and job.get('cancel_requested')
+        return job_token(job_id).cancelled
 
     for i in range(0, len(create_batch_list), batch_size):
         # Check for cancel request before each batch
@@ -2075,62 +2097,53 @@ def fetch_all_idefix_products(user_id: Optional[int] = None, job_id: Optional[st
     }
     
     if job_id:
-        append_mp_job_log(job_id, "İdefix'ten tüm statülerdeki ürünler çekiliyor...")
-        
-    for state in POOL_STATES:
+        append_mp_job_log(job_id, f"İdefix'ten tüm statülerdeki ürünler çekiliyor ({', '.join(POOL_STATES)})...")
+    token = job_token(job_id)
+    limit = 100
+    # The pools are independent listings: fetch them side by side and add up their progress
+    counts = {state: (0, 0) for state in POOL_STATES}
+    counts_lock = threading.Lock()
+
+    def _progress_for(state: str):
+        def _progress(count: int, total: Optional[int]):
+            if not job_id:
+                return
+            with counts_lock:
+                counts[state] = (count, max(count, total or 0))
+                current = sum(c for c, _ in counts.values())
+                expected = sum(t for _, t in counts.values())
+            update_mp_job(job_id, progress={
+                'current': current,
+                'total': expected if expected > current else current + 1,
+                'message': f'{state}: {count} ürün çekildi (Toplam: {current})'
+            })
+        return _progress
+
+    # A missing/fake totalElements falls back to page-by-page until a short page
+    fetched_by_state = fetch_partitions({
+        state: (lambda state=state: client.list_all_products(limit=limit, pool_state=state,
+                                                             on_progress=_progress_for(state),
+                                                             should_stop=token.should_stop))
+        for state in POOL_STATES
+    })
+
+    for state, fetched in fetched_by_state.items():
+        # Enrich items with status info
+        label, color = STATUS_MAP.get(state, (state, "secondary"))
+        for item in fetched.items:
+            item['status_label'] = label
+            item['status_color'] = color
+            item['original_status'] = state
+        all_items.extend(fetched.items)
         if job_id:
-            append_mp_job_log(job_id, f"Statü çekiliyor: {state}...")
-            
-        page = 0
-        limit = 100
-        state_item_count = 0
-        
-        while True:
-            try:
-                res = client.list_products(page=page, limit=limit, pool_state=state)
-                items = res.get('content', [])
-                total = int(res.get('totalElements', 0))
-                
-                if not items:
-                    break
-                
-                # Enrich items with status info
-                label, color = STATUS_MAP.get(state, (state, "secondary"))
-                for item in items:
-                    item['status_label'] = label
-                    item['status_color'] = color
-                    item['original_status'] = state
-                    
-                all_items.extend(items)
-                state_item_count += len(items)
-                
-                if job_id:
-                    update_mp_job(job_id, progress={
-                        'current': len(all_items),
-                        'total': total if total > len(all_items) else len(all_items) + 1,
-                        'message': f'{state}: {state_item_count} ürün çekildi (Toplam: {len(all_items)})'
-                    })
-                    
-                # Break if we reached or exceeded total count for THIS state
-                # FIX: If total is 0/missing/fake, do NOT break based on total check alone.
-                # Only break if we got fewer items than limit (meaning end of list).
-                if len(items) < limit:
-                    break
-                    
-                # If total is explicitly > 0 and looks real (not the fake +1 logic), we might use it,
-                # but it's safer to just rely on len(items) < limit or empty items.
-                # However, to avoid infinite loops if API is buggy (returns same page), safety break remains.
-                
-                page += 1
-                if page > 1000: break # Increased Safety limit
-                
-            except Exception as e:
-                # Log error but continue to next state
-                error_msg = f"Statü {state} Sayfa {page} hatası: {e}"
-                logging.error(error_msg)
-                if job_id:
-                    append_mp_job_log(job_id, error_msg, level='error')
-                break
+            append_mp_job_log(job_id, f"Statü {state}: {len(fetched.items)} ürün")
+
+        for page, error in sorted(fetched.failed_pages.items()):
+            # Log error; the other states are kept
+            error_msg = f"Statü {state} Sayfa {page} hatası: {error}"
+            logging.error(error_msg)
+            if job_id:
+                append_mp_job_log(job_id, error_msg, level='error')
             
     return all_items
 
@@ -2143,7 +2156,7 @@ def sync_idefix_products(user_id: Optional[int] = None, job_id: Optional[str] =
         # Priority: passed user_id > job params
         if user_id is None and job_id:
             from app.services.job_queue import get_mp_job
-            job = get_mp_job(job_id)
+            job = get_mp_job(job_id, log_tail=0)
             if job and job.get('params'):
                 user_id = job['params'].get('_user_id')
 
@@ -2154,107 +2167,91 @@ def sync_idefix_products(user_id: Optional[int] = None, job_id: Optional[str] =
             append_mp_job_log(job_id, f"Veritabanına {len(items)} ürün kaydediliyor...")
             
         count = 0
-        batch_size = 100
         remote_barcodes = set()
+        rows = []
+        now = datetime.now()
         
-        from app.utils.helpers import chunked
-        
-        for chunk in chunked(items, batch_size):
-            for item in chunk:
-                # Idefix item structure:
-                # barcode, vendorStockCode, title, price, salePrice(?), quantity/stockAmount
-                # status (poolState?)
-                
-                barcode = item.get('barcode', '')
-                if not barcode: continue
-                remote_barcodes.add(barcode)
-                
-                stock_code = item.get('vendorStockCode') or barcode
-                title = item.get('title')
-                
-                # Price might be in 'price', 'salePrice'?
-                # list_products returns 'price' usually.
-                list_price = float(item.get('price', 0))
-                sale_price = float(item.get('salePrice', list_price)) # Fallback
-                
-                # Stock fallback
-                qty = item.get('stockAmount')
-                if qty is None: qty = item.get('inventoryQuantity')
-                if qty is None: qty = item.get('quantity')
-                if qty is None: qty = item.get('stock')
-                if qty is None: qty = 0
-                qty = int(qty)
-                
-                # Status mapping for better UI
-                pool_state = item.get('poolState') or item.get('productStatus') or item.get('original_status') or 'UNKNOWN'
-                pool_state_up = str(pool_state).upper()
-                
-                if pool_state_up == "APPROVED":
-                    status_str = "Satışta"
-                elif pool_state_up == "WAITING_APPROVAL":
-                    status_str = "İnceleniyor"
-                elif pool_state_up == "WAITING_CONTENT":
-                    status_str = "Eksik Bilgili"
-                elif pool_state_up == "REJECTED":
-                    status_str = "Reddedildi"
-                elif pool_state_up == "DELETED":
-                    status_str = "Silindi"
+        for item in items:
+            # Idefix item structure:
+            # barcode, vendorStockCode, title, price, salePrice(?), quantity/stockAmount
+            # status (poolState?)
+            
+            barcode = item.get('barcode', '')
+            if not barcode: continue
+            remote_barcodes.add(barcode)
+            
+            stock_code = item.get('vendorStockCode') or barcode
+            title = item.get('title')
+            
+            # Price might be in 'price', 'salePrice'?
+            # list_products returns 'price' usually.
+            list_price = float(item.get('price', 0))
+            sale_price = float(item.get('salePrice', list_price)) # Fallback
+            
+            # Stock fallback
+            qty = item.get('stockAmount')
+            if qty is None: qty = item.get('inventoryQuantity')
+            if qty is None: qty = item.get('quantity')
+            if qty is None: qty = item.get('stock')
+            if qty is None: qty = 0
+            qty = int(qty)
+            
+            # Status mapping for better UI
+            pool_state = item.get('poolState') or item.get('productStatus') or item.get('original_status') or 'UNKNOWN'
+            pool_state_up = str(pool_state).upper()
+            
+            if pool_state_up == "APPROVED":
+                status_str = "Satışta"
+            elif pool_state_up == "WAITING_APPROVAL":
+                status_str = "İnceleniyor"
+            elif pool_state_up == "WAITING_CONTENT":
+                status_str = "Eksik Bilgili"
+            elif pool_state_up == "REJECTED":
+                status_str = "Reddedildi"
+            elif pool_state_up == "DELETED":
+                status_str = "Silindi"
+            else:
+                # If we have a friendly label from fetch_all, use it
+                if item.get('status_label'):
+                    status_str = item.get('status_label')
                 else:
-                    # If we have a friendly label from fetch_all, use it
-                    if item.get('status_label'):
-                        status_str = item.get('status_label')
-                    else:
-                        status_str = pool_state
+                    status_str = pool_state
 
-                approval_str = status_str
-                
-                # On Sale?
-                on_sale = (pool_state_up == "APPROVED")
-                
-                # Images
-                imgs = item.get('images', [])
-                img_json = json.dumps([i.get('url') if isinstance(i, dict) else i for i in imgs])
-                
-                # Upsert
-                if not user_id:
-                    # If user_id is missing, we must skip to prevent cross-user pollution
-                    continue
-
-                existing = MarketplaceProduct.query.filter_by(
-                    marketplace='idefix',
-                    barcode=barcode,
-                    user_id=user_id
-                ).first()
-                
-                if existing:
-                    existing.stock_code = stock_code
-                    existing.title = title
-                    existing.price = list_price
-                    existing.sale_price = sale_price
-                    existing.quantity = qty
-                    existing.status = status_str
-                    existing.approval_status = approval_str
-                    existing.images_json = img_json
-                    existing.raw_data = json.dumps(item)
-                    existing.last_sync_at = datetime.now()
-                else:
-                    new_p = MarketplaceProduct(
-                        user_id=user_id,
-                        marketplace='idefix',
-                        barcode=barcode,
-                        stock_code=stock_code,
-                        title=title,
-                        price=list_price,
-                        sale_price=sale_price,
-                        quantity=qty,
-                        status=status_str,
-                        approval_status=approval_str,
-                        images_json=img_json,
-                        raw_data=json.dumps(item)
-                    )
-                    db.session.add(new_p)
-                count += 1
-            db.session.commit()
+            approval_str = status_str
+            
+            # On Sale?
+            on_sale = (pool_state_up == "APPROVED")
+            
+            # Images
+            imgs = item.get('images', [])
+            img_json = json.dumps([i.get('url') if isinstance(i, dict) else i for i in imgs])
+            
+            # Upsert
+            if not user_id:
+                # If user_id is missing, we must skip to prevent cross-user pollution
+                continue
+
+            rows.append({
+                'user_id': user_id,
+                'marketplace': 'idefix',
+                'barcode': barcode,
+                'stock_code': stock_code,
+                'title': title,
+                'price': list_price,
+                'sale_price': sale_price,
+                'quantity': qty,
+                'status': status_str,
+                'approval_status': approval_str,
+                'images_json': img_json,
+                'raw_data': json.dumps(item),
+                'last_sync_at': now,
+            })
+            count += 1
+
+        # Single set-based upsert (COPY + merge on PostgreSQL) instead of a SELECT per product
+        from app.services.bulk_loader import bulk_upsert
+        bulk_upsert(MarketplaceProduct, rows, conflict_cols=('user_id', 'marketplace', 'barcode'))
+        db.session.commit()
             
         if user_id:
             # Cleanup
@@ -2409,8 +2406,8 @@ def perform_idefix_direct_push_actions(user_id: int, to_update: List[Any], to_cr
     to_create: xml_item listesi
     to_zero: local_item listesi
     """
-    from app.services.job_queue import append_mp_job_log, get_mp_job, update_mp_job
-    from app.utils.helpers import calculate_price
+    from app.services.job_queue import append_mp_job_log, get_mp_job, update_mp_job, update_job_progress
+    from app.utils.helpers import calculate_prices
     from app.models import MarketplaceProduct, db
     
     client = get_idefix_client(user_id=user_id)
@@ -2423,21 +2420,20 @@ def perform_idefix_direct_push_actions(user_id: int, to_update: List[Any], to_cr
     
     # --- 1. GÜNCELLEMELER (Update) ---
     if to_update:
-        if job_id: update_mp_job(job_id, completed_ops, total_ops, f'Güncellemeler hazırlanıyor ({len(to_update)} ürün)...')
+        if job_id: update_job_progress(job_id, completed_ops, total_ops, f'Güncellemeler hazırlanıyor ({len(to_update)} ürün)...')
         
         update_payloads = []
         db_mappings = []
         batch_logs = []
         
-        for xml_item, local_item in to_update:
+        update_prices, update_rules = calculate_prices([x.price for x, _ in to_update], 'idefix', user_id=user_id, return_details=True)
+        for (xml_item, local_item), final_price, rule_desc in zip(to_update, update_prices.tolist(), update_rules):
             # Periodic cancel check
             if len(db_mappings) % 50 == 0 and job_id:
-                js = get_mp_job(job_id)
-                if js and js.get('cancel_requested'):
+                if job_token(job_id).cancelled:
                     append_mp_job_log(job_id, "İşlem kullanıcı tarafından iptal edildi.", level='warning')
                     return res
             
-            final_price, rule_desc = calculate_price(xml_item.price, 'idefix', user_id=user_id, return_details=True)
             
             update_payloads.append({
                 "barcode": local_item.barcode,
@@ -2462,8 +2458,7 @@ def perform_idefix_direct_push_actions(user_id: int, to_update: List[Any], to_cr
         try:
             for i, batch in enumerate(chunked(update_payloads, 100)):
                 if job_id and i % 5 == 0:
-                    js = get_mp_job(job_id)
-                    if js and js.get('cancel_requested'):
+                    if job_token(job_id).cancelled:
                         append_mp_job_log(job_id, "İptal edildi (Batch sırasında)", level='warning')
                         return res
                 
@@ -2482,7 +2477,7 @@ def perform_idefix_direct_push_actions(user_id: int, to_update: List[Any], to_cr
 
                 completed_ops += len(batch)
                 if job_id:
-                    update_mp_job(job_id, completed_ops, total_ops, f"Güncelleniyor ({completed_ops}/{total_ops})...")
+                    update_job_progress(job_id, completed_ops, total_ops, f"Güncelleniyor ({completed_ops}/{total_ops})...")
                     if i % 10 == 0:
                         append_mp_job_log(job_id, f"✅ {completed_ops} ürün güncellendi.")
             
@@ -2491,7 +2486,7 @@ def perform_idefix_direct_push_actions(user_id: int, to_update: List[Any], to_cr
             if job_id: append_mp_job_log(job_id, f"Idefix güncelleme hatası: {str(e)}", level='error')
 
     if to_create:
-        if job_id: update_mp_job(job_id, completed_ops, total_ops, f'Yeni ürünler hazırlanıyor ({len(to_create)} ürün)...')
+        if job_id: update_job_progress(job_id, completed_ops, total_ops, f'Yeni ürünler hazırlanıyor ({len(to_create)} ürün)...')
         from app.services.xml_service import generate_random_barcode
         
         # Get default brand from settings
@@ -2502,10 +2497,10 @@ def perform_idefix_direct_push_actions(user_id: int, to_update: List[Any], to_cr
             except: pass
  
         valid_creates = []
-        for xml_item in to_create:
+        create_prices, create_rules = calculate_prices([x.price for x in to_create], 'idefix', user_id=user_id, return_details=True)
+        for xml_item, final_price, rule_desc in zip(to_create, create_prices.tolist(), create_rules):
             if len(valid_creates) % 50 == 0 and job_id:
-                js = get_mp_job(job_id)
-                if js and js.get('cancel_requested'):
+                if job_token(job_id).cancelled:
                     append_mp_job_log(job_id, "İşlem kullanıcı tarafından iptal edildi.", level='warning')
                     return res
             
@@ -2524,7 +2519,6 @@ def perform_idefix_direct_push_actions(user_id: int, to_update: List[Any], to_cr
             if not brand_id or not cat_id:
                 continue # Silent skip
  
-            final_price, rule_desc = calculate_price(xml_item.price, 'idefix', user_id=user_id, return_details=True)
             
             item_payload = {
                 "SKU": xml_item.stock_code,
@@ -2537,11 +2531,13 @@ def perform_idefix_direct_push_actions(user_id: int, to_update: List[Any], to_cr
             }
             valid_creates.append((item_payload, xml_item, rule_desc))
 
+        # Left out above (no match / invalid barcode), reported apart from failed batches
+        res['skipped_count'] = len(to_create) - len(valid_creates)
+
         # API Chunks
         for batch in chunked(valid_creates, 50):
             if job_id:
-                js = get_mp_job(job_id)
-                if js and js.get('cancel_requested'):
+                if job_token(job_id).cancelled:
                     append_mp_job_log(job_id, "İptal edildi (Create sırasında)", level='warning')
                     return res
  
@@ -2576,7 +2572,7 @@ def perform_idefix_direct_push_actions(user_id: int, to_update: List[Any], to_cr
                 res['created_count'] += len(batch)
                 completed_ops += len(batch)
                 if job_id:
-                    update_mp_job(job_id, completed_ops, total_ops, f"Yeni Ürünler Ekleniyor ({completed_ops}/{total_ops})...")
+                    update_job_progress(job_id, completed_ops, total_ops, f"Yeni Ürünler Ekleniyor ({completed_ops}/{total_ops})...")
             except Exception as e:
                 db.session.rollback()
                 if job_id: append_mp_job_log(job_id, f"Idefix yükleme hatası: {str(e)}", level='error')
@@ -2590,8 +2586,7 @@ def perform_idefix_direct_push_actions(user_id: int, to_update: List[Any], to_cr
         for local_item in to_zero:
             # Periodic cancel check
             if len(zero_payloads) % 50 == 0 and job_id:
-                js = get_mp_job(job_id)
-                if js and js.get('cancel_requested'):
+                if job_token(job_id).cancelled:
                     append_mp_job_log(job_id, "İşlem kullanıcı tarafından iptal edildi.", level='warning')
                     return res
             
@@ -2605,8 +2600,7 @@ def perform_idefix_direct_push_actions(user_id: int, to_update: List[Any], to_cr
         try:
             for i, batch in enumerate(chunked(zero_payloads, 100)):
                 if job_id and i % 5 == 0:
-                    js = get_mp_job(job_id)
-                    if js and js.get('cancel_requested'):
+                    if job_token(job_id).cancelled:
                         append_mp_job_log(job_id, "İptal edildi (Zero sırasında)", level='warning')
                         return res
                 client.update_inventory_and_price(batch)
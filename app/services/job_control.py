@@ -0,0 +1,148 @@
+"""
+Çalışan pazaryeri işleri için süreç içi iptal / duraklatma token'ları.
+Senkron döngüleri her sayfada ya da her 50 üründe get_mp_job ile DB'den iş durumunu okuyordu.
+Artık her çalışan işin bir JobToken'ı vardır: token.cancelled bir bayrak okumasıdır,
+token.wait_if_paused() devam ettirilene ya da iptal edilene kadar bekler.
+control_mp_job aynı süreçteki token'ı hemen işaretler; diğer worker'lardan gelen istekleri
+tek bir izleyici thread, kayıtlı işler için dar bir SELECT ile (JOB_CONTROL_POLL_SECONDS) yakalar.
+"""
+import os
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+JOB_CONTROL_POLL_SECONDS = float(os.environ.get('JOB_CONTROL_POLL_SECONDS', '3'))
+
+
+class JobToken:
+    """Cancellation/pause state of one running job."""
+
+    __slots__ = ('job_id', '_cond', '_cancelled', '_paused')
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self._cond = threading.Condition()
+        self._cancelled = False
+        self._paused = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    @property
+    def paused(self) -> bool:
+        return self._paused
+
+    def cancel(self) -> None:
+        with self._cond:
+            self._cancelled = True
+            self._cond.notify_all()
+
+    def pause(self) -> None:
+        with self._cond:
+            self._paused = True
+
+    def resume(self) -> None:
+        with self._cond:
+            self._paused = False
+            self._cond.notify_all()
+
+    def wait_if_paused(self, timeout: Optional[float] = None) -> bool:
+        """Block while paused (until resumed, cancelled or timeout). Returns True if the job may continue."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._paused and not self._cancelled:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return not self._cancelled and not self._paused
+
+    def should_stop(self) -> bool:
+        """Stop check for worker loops: blocks while paused, True once cancelled."""
+        self.wait_if_paused()
+        return self._cancelled
+
+
+_TOKENS: Dict[str, JobToken] = {}
+_TOKENS_LOCK = threading.Lock()
+_WATCHER: Optional[threading.Thread] = None
+_APP = None
+
+
+def job_token(job_id: Optional[str]) -> JobToken:
+    """Token of a job (registered on first use and watched for cross-worker control)."""
+    global _APP
+    if not job_id:
+        # Called outside a job (job_id=None): never cancelled, never paused
+        return JobToken('')
+    with _TOKENS_LOCK:
+        token = _TOKENS.get(job_id)
+        if token is None:
+            token = _TOKENS[job_id] = JobToken(job_id)
+            if _APP is None and has_app_context():
+                _APP = current_app._get_current_object()
+            _ensure_watcher()
+        return token
+
+
+def release_job_token(job_id: str) -> None:
+    with _TOKENS_LOCK:
+        _TOKENS.pop(job_id, None)
+
+
+def signal_job(job_id: str, action: str) -> None:
+    """Apply a control action to the in-process token, if this worker runs the job."""
+    with _TOKENS_LOCK:
+        token = _TOKENS.get(job_id)
+    if token is None:
+        return
+    if action == 'cancel':
+        token.cancel()
+    elif action == 'pause':
+        token.pause()
+    elif action == 'resume':
+        token.resume()
+
+
+def _ensure_watcher() -> None:
+    global _WATCHER
+    if _WATCHER is None or not _WATCHER.is_alive():
+        _WATCHER = threading.Thread(target=_watch_loop, name='mp-job-control-watcher', daemon=True)
+        _WATCHER.start()
+
+
+def _watch_loop() -> None:
+    while True:
+        time.sleep(JOB_CONTROL_POLL_SECONDS)
+        with _TOKENS_LOCK:
+            tokens = dict(_TOKENS)
+        if not tokens or _APP is None:
+            continue
+        try:
+            with _APP.app_context():
+                _poll_states(tokens)
+        except Exception as e:
+            logger.error(f"Job control watcher error: {e}")
+
+
+def _poll_states(tokens: Dict[str, JobToken]) -> None:
+    from app import db
+    from app.models import PersistentJob
+
+    rows = db.session.query(PersistentJob.id, PersistentJob.status, PersistentJob.cancel_requested) \
+        .filter(PersistentJob.id.in_(list(tokens))).all()
+    db.session.rollback()  # read-only; do not keep the snapshot open until the next poll
+    for job_id, status, cancel_requested in rows:
+        token = tokens[job_id]
+        if cancel_requested or status == 'cancelled':
+            token.cancel()
+        elif status == 'pausing':
+            token.pause()
+        elif token.paused:
+            token.resume()
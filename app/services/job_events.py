@@ -0,0 +1,218 @@
+"""
+Pazaryeri işleri için canlı olay akışı (Server-Sent Events).
+Arayüz /api/mp_jobs/<id>'yi birkaç saniyede bir yokluyordu. /api/mp_jobs/<id>/events bağlantısı
+açık kalır ve yalnızca değişiklikleri gönderir: ilerleme ('progress'), yeni log satırları ('log',
+id = satırın seq'i), iş bitince 'end' (iş yoksa 'not_found'). Akış bir olay geldiğinde uyanır: aynı süreçteki log
+yazıcısı / ilerleme bildiricisi / durum değişiklikleri doğrudan, diğer worker'lardakiler
+PostgreSQL LISTEN/NOTIFY (JOB_EVENTS_CHANNEL) üzerinden. NOTIFY yoksa (SQLite) kısa aralıkla
+yoklanır. Yeniden bağlanan istemci Last-Event-ID ile kaldığı satırdan devam eder.
+"""
+import os
+import json
+import logging
+import select
+import threading
+import time
+from typing import Dict, Iterable, Iterator, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+JOB_EVENTS_CHANNEL = 'mp_job_events'
+JOB_EVENTS_HEARTBEAT_SECONDS = float(os.environ.get('JOB_EVENTS_HEARTBEAT_SECONDS', '15'))
+# Wake-up interval when cross-worker events cannot arrive through LISTEN/NOTIFY
+JOB_EVENTS_POLL_SECONDS = float(os.environ.get('JOB_EVENTS_POLL_SECONDS', '2'))
+# A stream ends after this long and the browser reconnects (Last-Event-ID); keep it below
+# gunicorn --timeout so a worker is never killed mid-stream
+JOB_EVENTS_MAX_STREAM_SECONDS = float(os.environ.get('JOB_EVENTS_MAX_STREAM_SECONDS', '100'))
+# Each open stream holds a request thread (gthread) for up to JOB_EVENTS_MAX_STREAM_SECONDS; keep
+# this below gunicorn --threads so normal requests always have threads left. Over the cap the
+# route answers 503 and the widget falls back to polling.
+JOB_EVENTS_MAX_STREAMS = max(1, int(os.environ.get('JOB_EVENTS_MAX_STREAMS', '4')))
+
+TERMINAL_STATUSES = ('completed', 'failed', 'cancelled')
+
+
+class JobEventBus:
+    """Wakes the streams subscribed to a job; fed in-process and from a LISTEN connection."""
+
+    def __init__(self):
+        self._subs: Dict[str, Set[threading.Event]] = {}
+        self._lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+        self._listening = False
+
+    @property
+    def listening(self) -> bool:
+        """True while cross-worker events arrive through LISTEN (streams can wait for the heartbeat)."""
+        return self._listening
+
+    def subscribe(self, job_id: str, engine=None) -> threading.Event:
+        wake = threading.Event()
+        with self._lock:
+            self._subs.setdefault(job_id, set()).add(wake)
+            if engine is not None and engine.dialect.name == 'postgresql':
+                self._ensure_listener(engine)
+        return wake
+
+    def unsubscribe(self, job_id: str, wake: threading.Event) -> None:
+        with self._lock:
+            subs = self._subs.get(job_id)
+            if subs:
+                subs.discard(wake)
+                if not subs:
+                    del self._subs[job_id]
+
+    def publish(self, job_id: str) -> None:
+        """Wake this process's streams of a job."""
+        with self._lock:
+            subs = list(self._subs.get(job_id, ()))
+        for wake in subs:
+            wake.set()
+
+    def queue_notify(self, conn, job_ids: Iterable[str]) -> None:
+        """
+        On PostgreSQL queue a NOTIFY per job on conn; other workers get it when conn's transaction
+        commits. The writer publish()es for its own process after the commit.
+        """
+        if conn.dialect.name != 'postgresql':
+            return
+        from sqlalchemy import text
+        for job_id in job_ids:
+            conn.execute(text('SELECT pg_notify(:channel, :job_id)'), {'channel': JOB_EVENTS_CHANNEL, 'job_id': job_id})
+
+    def announce(self, engine, job_id: str) -> None:
+        """Wake the job's streams in every worker after a state change committed through the session."""
+        if engine.dialect.name == 'postgresql':
+            try:
+                with engine.begin() as conn:
+                    self.queue_notify(conn, [job_id])
+            except Exception as e:
+                logger.error(f"Job event notify failed: {e}")
+        self.publish(job_id)
+
+    def _ensure_listener(self, engine) -> None:
+        if self._listener is None or not self._listener.is_alive():
+            self._listener = threading.Thread(target=self._listen_loop, args=(engine,),
+                                              name='mp-job-events-listener', daemon=True)
+            self._listener.start()
+
+    def _listen_loop(self, engine) -> None:
+        while True:
+            raw = None
+            try:
+                raw = engine.raw_connection()
+                dbapi_conn = raw.driver_connection
+                dbapi_conn.autocommit = True
+                with dbapi_conn.cursor() as cur:
+                    cur.execute(f'LISTEN {JOB_EVENTS_CHANNEL}')
+                self._listening = True
+                while True:
+                    if select.select([dbapi_conn], [], [], JOB_EVENTS_HEARTBEAT_SECONDS) == ([], [], []):
+                        continue
+                    dbapi_conn.poll()
+                    while dbapi_conn.notifies:
+                        self.publish(dbapi_conn.notifies.pop(0).payload)
+            except Exception as e:
+                logger.error(f"Job event listener error, reconnecting: {e}")
+            finally:
+                self._listening = False
+                if raw is not None:
+                    try:
+                        raw.invalidate()
+                    except Exception:
+                        pass
+            time.sleep(JOB_EVENTS_POLL_SECONDS)
+
+
+JOB_EVENTS = JobEventBus()
+
+_STREAM_SLOTS = threading.BoundedSemaphore(JOB_EVENTS_MAX_STREAMS)
+
+
+def acquire_stream_slot() -> bool:
+    """Reserve one of this worker's stream slots; False when JOB_EVENTS_MAX_STREAMS are open."""
+    return _STREAM_SLOTS.acquire(blocking=False)
+
+
+def release_stream_slot() -> None:
+    _STREAM_SLOTS.release()
+
+
+def stream_busy_body() -> str:
+    """Body of the 503 answer when no slot is free: tells the client when to try again."""
+    return f'retry: {int(JOB_EVENTS_HEARTBEAT_SECONDS * 1000)}\n\n'
+
+
+def _sse(event: str, data, event_id: Optional[int] = None) -> str:
+    head = f'id: {event_id}\n' if event_id is not None else ''
+    return f'{head}event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+def stream_job_events(job_id: str, log_offset: Optional[int] = None,
+                      log_tail: Optional[int] = None) -> Iterator[str]:
+    """
+    SSE generator for one job (run under stream_with_context). With log_offset only lines after
+    that seq are sent; otherwise the stream starts with the last log_tail lines, or the whole log
+    when no tail is given. The caller owns the stream slot (acquire_stream_slot) and the
+    ownership check.
+    """
+    from app import db
+    from app.models import PersistentJob
+    from app.services.job_queue import get_job_logs, JOB_LOG_PAGE_SIZE
+    from app.services.job_progress import PROGRESS_REPORTER
+
+    engine = db.engine
+    wake = JOB_EVENTS.subscribe(job_id, engine)
+    started = last_sent = time.monotonic()
+    last_progress = None
+    try:
+        yield f'retry: {int(JOB_EVENTS_POLL_SECONDS * 1000)}\n\n'
+        while True:
+            wake.clear()
+            job = db.session.get(PersistentJob, job_id, populate_existing=True)
+            if job is None:
+                yield _sse('not_found', {'message': 'Job bulunamadı'})
+                return
+
+            if log_offset is None and log_tail is None:
+                log_offset = 0  # whole log, in pages
+            page = get_job_logs(job, log_offset=log_offset, log_tail=log_tail)
+            for line in page['logs']:
+                yield _sse('log', line, line.get('seq'))
+            if page['logs']:
+                last_sent = time.monotonic()
+            log_offset = page['log_offset']
+
+            live = PROGRESS_REPORTER.snapshot(job_id) or {}
+            progress = {
+                'status': job.status,
+                'current': live.get('current', job.progress_current),
+                'total': live.get('total', job.progress_total),
+                'message': live.get('message', job.progress_message),
+                'cancel_requested': job.cancel_requested,
+            }
+            db.session.close()  # do not hold a pooled connection while waiting
+
+            if progress != last_progress:
+                last_progress = progress
+                last_sent = time.monotonic()
+                yield _sse('progress', progress)
+            if len(page['logs']) >= JOB_LOG_PAGE_SIZE:
+                continue  # more history to send
+            if progress['status'] in TERMINAL_STATUSES:
+                yield _sse('end', {'status': progress['status'], 'log_offset': log_offset})
+                return
+            if time.monotonic() - started >= JOB_EVENTS_MAX_STREAM_SECONDS:
+                return  # browser reconnects with Last-Event-ID
+
+            timeout = JOB_EVENTS_HEARTBEAT_SECONDS if JOB_EVENTS.listening else JOB_EVENTS_POLL_SECONDS
+            while not wake.wait(timeout):
+                if time.monotonic() - started >= JOB_EVENTS_MAX_STREAM_SECONDS:
+                    return
+                if time.monotonic() - last_sent >= JOB_EVENTS_HEARTBEAT_SECONDS:
+                    last_sent = time.monotonic()
+                    yield ': keep-alive\n\n'
+                if not JOB_EVENTS.listening:
+                    break  # no NOTIFY: re-read on every poll interval
+    finally:
+        JOB_EVENTS.unsubscribe(job_id, wake)
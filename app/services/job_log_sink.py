@@ -0,0 +1,116 @@
+"""
+Pazaryeri işleri için tamponlu, yalnızca eklemeli (append-only) log yazıcısı.
+append_mp_job_logs her satırda PersistentJob.logs_json'u okuyup tamamını yeniden yazıyor ve
+BatchLog'u senkronluyordu; uzun işlerde bu O(n^2) yazım demekti. Satırlar artık süreç içinde
+iş bazında tamponlanır ve JOB_LOG_FLUSH_LINES satırda ya da en geç JOB_LOG_FLUSH_MS içinde
+job_logs tablosuna toplu INSERT ile eklenir. Satırın id'si iş içindeki sıra numarasıdır (seq);
+okuyucular log_offset ile yalnızca yeni satırları ister.
+"""
+import os
+import atexit
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from app.models import JobLog
+from app.services.job_events import JOB_EVENTS
+
+logger = logging.getLogger(__name__)
+
+JOB_LOG_FLUSH_LINES = int(os.environ.get('JOB_LOG_FLUSH_LINES', '100'))
+JOB_LOG_FLUSH_MS = int(os.environ.get('JOB_LOG_FLUSH_MS', '500'))
+# Lines a job may keep buffered while flushes fail (DB down); beyond that the oldest are dropped
+JOB_LOG_MAX_PENDING_LINES = int(os.environ.get('JOB_LOG_MAX_PENDING_LINES', '10000'))
+
+
+class JobLogSink:
+    """Per-process line buffer in front of the job_logs table."""
+
+    def __init__(self, flush_lines: int = JOB_LOG_FLUSH_LINES, flush_ms: int = JOB_LOG_FLUSH_MS,
+                 max_pending: int = JOB_LOG_MAX_PENDING_LINES):
+        self._flush_lines = flush_lines
+        self._max_pending = max_pending
+        self._interval = flush_ms / 1000.0
+        self._buffers: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        # Held from taking a buffer until its INSERT commits, so ids keep the append order of a job
+        self._flush_lock = threading.Lock()
+        self._engine = None
+        self._thread: Optional[threading.Thread] = None
+
+    def append(self, engine, job_id: str, entries: List[Dict[str, Any]]) -> None:
+        """Buffer entries ({'ts', 'level', 'message'}); flushes inline once the job's buffer is full."""
+        if not entries:
+            return
+        with self._lock:
+            self._engine = engine
+            buf = self._buffers.setdefault(job_id, [])
+            buf.extend({'job_id': job_id, **e} for e in entries)
+            full = len(buf) >= self._flush_lines
+            self._ensure_flusher()
+        if full:
+            self.flush(job_id)
+
+    def pending(self, job_id: str) -> int:
+        with self._lock:
+            return len(self._buffers.get(job_id, ()))
+
+    def flush(self, job_id: Optional[str] = None) -> int:
+        """Write buffered lines of one job (or all jobs) now; returns the number of lines written."""
+        with self._flush_lock:
+            with self._lock:
+                if job_id is None:
+                    rows = [r for buf in self._buffers.values() for r in buf]
+                    self._buffers.clear()
+                else:
+                    rows = self._buffers.pop(job_id, [])
+                engine = self._engine
+            if not rows or engine is None:
+                return 0
+            job_ids = {r['job_id'] for r in rows}
+            try:
+                # Own connection/transaction: never commits (or rolls back) the caller's session
+                with engine.begin() as conn:
+                    conn.execute(JobLog.__table__.insert(), rows)
+                    JOB_EVENTS.queue_notify(conn, job_ids)
+            except Exception as e:
+                dropped = self._requeue(rows)
+                logger.error(f"Job log flush failed, {len(rows) - dropped} lines kept for the next flush"
+                             f"{f', {dropped} oldest dropped' if dropped else ''}: {e}")
+                return 0
+        for jid in job_ids:
+            JOB_EVENTS.publish(jid)
+        return len(rows)
+
+    def _requeue(self, rows: List[Dict[str, Any]]) -> int:
+        """Put unwritten rows back in front of lines buffered meanwhile; returns the lines dropped over the cap."""
+        by_job: Dict[str, List[Dict[str, Any]]] = {}
+        for r in rows:
+            by_job.setdefault(r['job_id'], []).append(r)
+        dropped = 0
+        with self._lock:
+            for jid, failed in by_job.items():
+                buf = failed + self._buffers.get(jid, [])
+                if len(buf) > self._max_pending:
+                    dropped += len(buf) - self._max_pending
+                    buf = buf[-self._max_pending:]
+                self._buffers[jid] = buf
+        return dropped
+
+    def _ensure_flusher(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._flush_loop, name='job-log-flusher', daemon=True)
+            self._thread.start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self._interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Job log flusher error: {e}")
+
+
+JOB_LOG_SINK = JobLogSink()
+atexit.register(JOB_LOG_SINK.flush)
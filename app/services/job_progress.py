@@ -0,0 +1,129 @@
+"""
+Pazaryeri işleri için birleştirilmiş (coalesced) ilerleme bildirimi.
+update_job_progress / update_mp_job(progress=...) her çağrıda işi DB'den okuyup commit ediyor ve
+BatchLog'u yeniden serileştiriyordu; servisler bunu her sayfada ve her 100'lük grupta çağırır.
+İlerleme artık süreç belleğinde tutulur ve DB'ye iş başına en fazla JOB_PROGRESS_INTERVAL_MS'de
+bir yazılır (ilk bildirim, current == total ve iş bitişi hemen yazılır). Aynı worker'daki durum
+endpoint'leri snapshot() ile en güncel değeri okur.
+"""
+import os
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import update
+
+from app.models import PersistentJob
+from app.services.job_events import JOB_EVENTS
+
+logger = logging.getLogger(__name__)
+
+JOB_PROGRESS_INTERVAL_MS = int(os.environ.get('JOB_PROGRESS_INTERVAL_MS', '2000'))
+
+# In-memory field -> persistent_jobs column
+_COLUMNS = {'current': 'progress_current', 'total': 'progress_total', 'message': 'progress_message'}
+
+
+class _JobProgress:
+    __slots__ = ('values', 'dirty', 'written_at')
+
+    def __init__(self):
+        self.values: Dict[str, Any] = {}
+        self.dirty: Dict[str, Any] = {}
+        self.written_at = 0.0
+
+
+class ProgressReporter:
+    """Per-process progress state of running jobs with rate-limited write-behind."""
+
+    def __init__(self, interval_ms: int = JOB_PROGRESS_INTERVAL_MS):
+        self._interval = interval_ms / 1000.0
+        self._jobs: Dict[str, _JobProgress] = {}
+        self._lock = threading.Lock()
+        # One writer per job at a time, so an older value never lands after a newer one
+        self._write_lock = threading.Lock()
+        self._engine = None
+        self._thread: Optional[threading.Thread] = None
+
+    def report(self, engine, job_id: str, current: Optional[int] = None, total: Optional[int] = None,
+               message: Optional[str] = None, force: bool = False) -> None:
+        """Record progress; None leaves a field unchanged. Written now if due (or forced), otherwise later."""
+        changes = {k: v for k, v in (('current', current), ('total', total), ('message', message)) if v is not None}
+        if not changes:
+            return
+        with self._lock:
+            self._engine = engine
+            state = self._jobs.get(job_id)
+            first = state is None
+            if first:
+                state = self._jobs[job_id] = _JobProgress()
+            state.values.update(changes)
+            state.dirty.update(changes)
+            reached_total = state.values.get('current') is not None \
+                and state.values.get('current') == state.values.get('total')
+            due = first or force or reached_total or time.monotonic() - state.written_at >= self._interval
+            self._ensure_flusher()
+        # Streams in this worker read the snapshot; other workers hear about it when it is written
+        JOB_EVENTS.publish(job_id)
+        if due:
+            self.flush(job_id)
+
+    def snapshot(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Latest in-process progress of a job running in this worker (None if unknown here)."""
+        with self._lock:
+            state = self._jobs.get(job_id)
+            return dict(state.values) if state else None
+
+    def flush(self, job_id: Optional[str] = None, due_only: bool = False) -> None:
+        """Write pending progress of one job (or every job; with due_only only those past the interval)."""
+        with self._write_lock:
+            now = time.monotonic()
+            with self._lock:
+                ids = [job_id] if job_id is not None else list(self._jobs)
+                pending = []
+                for jid in ids:
+                    state = self._jobs.get(jid)
+                    if not state or not state.dirty:
+                        continue
+                    if due_only and now - state.written_at < self._interval:
+                        continue
+                    pending.append((jid, state.dirty))
+                    state.dirty = {}
+                    state.written_at = now
+                engine = self._engine
+            if not pending or engine is None:
+                return
+            try:
+                with engine.begin() as conn:
+                    for jid, values in pending:
+                        row = {_COLUMNS[k]: v for k, v in values.items()}
+                        row['updated_at'] = datetime.now()
+                        conn.execute(update(PersistentJob.__table__)
+                                     .where(PersistentJob.__table__.c.id == jid).values(**row))
+                    JOB_EVENTS.queue_notify(conn, [jid for jid, _ in pending])
+            except Exception as e:
+                logger.error(f"Job progress write failed: {e}")
+
+    def finish(self, job_id: str) -> None:
+        """Write what is pending and forget the job (call before the job's final state is saved)."""
+        self.flush(job_id)
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def _ensure_flusher(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._flush_loop, name='job-progress-flusher', daemon=True)
+            self._thread.start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self._interval / 2)
+            try:
+                self.flush(due_only=True)
+            except Exception as e:
+                logger.error(f"Job progress flusher error: {e}")
+
+
+PROGRESS_REPORTER = ProgressReporter()
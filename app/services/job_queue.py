@@ -8,12 +8,28 @@ from typing import Dict, Any, Optional, List
 from flask import current_app
 from config import Config
 from app import db
-from app.models import BatchLog, PersistentJob
+from app.models import BatchLog, PersistentJob, JobLog
+from app.services.job_scheduler import JobScheduler, PRIORITY_NORMAL
+from app.services.job_log_sink import JOB_LOG_SINK
+from app.services.job_control import job_token, release_job_token, signal_job
+from app.services.job_progress import PROGRESS_REPORTER
+from app.services.job_events import JOB_EVENTS
 
 from flask_login import current_user
 
 # Max memory workers for actual execution
-MP_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=30)
+MP_EXECUTOR_WORKERS = 30
+MP_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=MP_EXECUTOR_WORKERS)
+# Admission in front of MP_EXECUTOR: queued jobs wait here, not in executor threads
+MP_SCHEDULER = JobScheduler(MP_EXECUTOR, local_slots=MP_EXECUTOR_WORKERS)
+
+# Max lines per offset page
+JOB_LOG_PAGE_SIZE = 1000
+# Lines kept in BatchLog.details_json; the full log is read from job_logs on the batch page
+BATCH_LOG_TAIL = 50
+
+# job_id -> " (User: ...)" tag for console logging, so appending a line needs no job query
+_JOB_USER_TAGS: Dict[str, str] = {}
 
 
 def is_job_running_for_user(user_id: int, job_type: str = None) -> bool:
@@ -64,11 +80,11 @@ def _sync_with_batch_log(job: PersistentJob):
                 job_type=job.job_type,
                 user_id=job.user_id,
                 product_count=job.progress_total,
-                details_json=json.dumps(serialize_job(job))
+                details_json=json.dumps(serialize_job(job, log_tail=BATCH_LOG_TAIL))
             )
             db.session.add(log)
         else:
-            log.details_json = json.dumps(serialize_job(job))
+            log.details_json = json.dumps(serialize_job(job, log_tail=BATCH_LOG_TAIL))
             log.job_type = job.job_type
             log.marketplace = job.marketplace
             
@@ -92,13 +108,21 @@ def _sync_with_batch_log(job: PersistentJob):
         logging.error(f"Failed to sync batch log: {e}")
         db.session.rollback()
 
-def register_mp_job(job_type: str, marketplace: str, params: Optional[Dict[str, Any]] = None) -> str:
+def _job_owner(params: Optional[Dict[str, Any]]) -> Optional[int]:
+    """User a job is scheduled for; background jobs (auto sync) carry it in params['user_id']."""
+    params = params or {}
+    return params.get('_user_id') or params.get('user_id')
+
+def register_mp_job(job_type: str, marketplace: str, params: Optional[Dict[str, Any]] = None,
+                    priority: int = PRIORITY_NORMAL) -> str:
     job_id = str(uuid.uuid4())
     user_id = params.get('_user_id') if params else None
     
     job = PersistentJob(
         id=job_id,
         user_id=user_id,
+        owner_id=_job_owner(params),
+        priority=priority,
         marketplace=marketplace,
         job_type=job_type,
         status='pending',
@@ -115,36 +139,72 @@ def register_mp_job(job_type: str, marketplace: str, params: Optional[Dict[str,
     
     return job_id
 
-def serialize_job(job: PersistentJob) -> Dict[str, Any]:
+def get_job_logs(job: PersistentJob, log_offset: Optional[int] = None,
+                 log_tail: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Log lines of a job as {'logs': [...], 'log_offset': int}.
+    log_offset: only lines after that seq (0 = from the start; pages of at most JOB_LOG_PAGE_SIZE);
+    otherwise the last log_tail lines, or the whole log when neither is given.
+    The returned log_offset is passed back to get the next lines.
+    Jobs written before job_logs existed fall back to logs_json.
+    """
+    if log_offset is None and log_tail is not None and log_tail <= 0:
+        return {'logs': [], 'log_offset': 0}
+
+    query = JobLog.query.filter(JobLog.job_id == job.id)
+    if log_offset is not None:
+        rows = query.filter(JobLog.id > log_offset).order_by(JobLog.id.asc()).limit(JOB_LOG_PAGE_SIZE).all()
+    elif log_tail is not None:
+        rows = query.order_by(JobLog.id.desc()).limit(log_tail).all()[::-1]
+    else:
+        rows = query.order_by(JobLog.id.asc()).all()
+
+    if rows:
+        return {'logs': [r.to_dict() for r in rows], 'log_offset': rows[-1].id}
+    if log_offset is None:
+        legacy = job.get_logs()
+        return {'logs': legacy[-log_tail:] if log_tail is not None else legacy, 'log_offset': 0}
+    return {'logs': [], 'log_offset': log_offset}
+
+def serialize_job(job: PersistentJob, log_offset: Optional[int] = None,
+                  log_tail: Optional[int] = None) -> Dict[str, Any]:
     if not job: return {}
+    logs = get_job_logs(job, log_offset=log_offset, log_tail=log_tail)
+    # Job running in this worker: progress not yet written to the DB is newer than the row
+    live = PROGRESS_REPORTER.snapshot(job.id) or {}
+    progress_current = live.get('current', job.progress_current)
+    progress_total = live.get('total', job.progress_total)
+    progress_message = live.get('message', job.progress_message)
     return {
         'id': job.id,
         'user_id': job.user_id,
         'marketplace': job.marketplace,
         'job_type': job.job_type,
         'status': job.status,
-        'progress_current': job.progress_current,
-        'progress_total': job.progress_total,
-        'progress_message': job.progress_message,
+        'progress_current': progress_current,
+        'progress_total': progress_total,
+        'progress_message': progress_message,
         # Frontend compatibility layer
         'progress': {
-            'current': job.progress_current,
-            'total': job.progress_total,
-            'message': job.progress_message
+            'current': progress_current,
+            'total': progress_total,
+            'message': progress_message
         },
         'params': job.get_params(),
         'result': json.loads(job.result_json) if job.result_json else None,
-        'logs': job.get_logs(),
+        'logs': logs['logs'],
+        'log_offset': logs['log_offset'],
         'cancel_requested': job.cancel_requested,
         'created_at': job.created_at.isoformat() if job.created_at else None,
         'updated_at': job.updated_at.isoformat() if job.updated_at else None
     }
 
-def get_mp_job(job_id: str) -> Optional[Dict[str, Any]]:
+def get_mp_job(job_id: str, log_offset: Optional[int] = None,
+               log_tail: Optional[int] = None) -> Optional[Dict[str, Any]]:
     # Force expire session to get fresh data from other workers
     db.session.expire_all()
     job = PersistentJob.query.get(job_id)
-    return serialize_job(job) if job else None
+    return serialize_job(job, log_offset=log_offset, log_tail=log_tail) if job else None
 
 def get_all_jobs() -> list:
     jobs = PersistentJob.query.order_by(PersistentJob.created_at.desc()).limit(100).all()
@@ -174,10 +234,28 @@ def control_mp_job(job_id: str, action: str) -> bool:
         return False
         
     db.session.commit()
+    # Running in this worker: the job loop sees it at its next check (other workers via the watcher)
+    signal_job(job_id, action)
+    JOB_EVENTS.announce(db.engine, job_id)
     _sync_with_batch_log(job)
     return True
 
+_PROGRESS_FIELDS = {'progress_current': 'current', 'progress_total': 'total', 'progress_message': 'message'}
+
 def update_mp_job(job_id: str, **fields: Any) -> Optional[Dict[str, Any]]:
+    if fields and all(key == 'progress' and isinstance(value, dict) or key in _PROGRESS_FIELDS
+                      for key, value in fields.items()):
+        # Progress-only update: coalesced in memory, written by PROGRESS_REPORTER (returns None)
+        progress = dict(fields.get('progress') or {})
+        for key, name in _PROGRESS_FIELDS.items():
+            if key in fields:
+                progress[name] = fields[key]
+        PROGRESS_REPORTER.report(db.engine, job_id, current=progress.get('current'),
+                                 total=progress.get('total'), message=progress.get('message'))
+        return None
+
+    # State change: write pending coalesced progress first so it cannot land after this update
+    PROGRESS_REPORTER.flush(job_id)
     # Force expire to get updates from actual running thread
     db.session.expire_all()
     job = PersistentJob.query.get(job_id)
@@ -199,8 +277,9 @@ def update_mp_job(job_id: str, **fields: Any) -> Optional[Dict[str, Any]]:
             pass
             
     db.session.commit()
+    JOB_EVENTS.announce(db.engine, job_id)
     _sync_with_batch_log(job)
-    return serialize_job(job)
+    return serialize_job(job, log_tail=0)
 
 def append_mp_job_log(job_id: str, message: str, level: str = 'info') -> None:
     append_mp_job_logs(job_id, [message], level=level)
@@ -220,48 +299,43 @@ def append_mp_job_logs(job_id: str, messages: List[str], level: str = 'info') ->
             'message': msg,
         })
     
-    job = PersistentJob.query.get(job_id)
-    if not job:
-        return
-        
-    logs = job.get_logs()
-    logs.extend(new_entries)
-    job.logs_json = json.dumps(logs)
-    db.session.commit()
-    
-    # Still persist to BatchLog details
-    _sync_with_batch_log(job)
+    # Buffered append to job_logs (flushed in batches); the job row and BatchLog are not rewritten
+    JOB_LOG_SINK.append(db.engine, job_id, new_entries)
 
     # Log to system console (just the last one or summary if too many)
-    params = job.get_params()
-    u_email = params.get('_user_email')
-    u_id = job.user_id
-    
-    user_tag = ""
-    if u_email:
-        user_tag = f" (User: {u_email})"
-    elif u_id:
-        user_tag = f" (User ID: {u_id})"
+    user_tag = _job_user_tag(job_id)
         
     if len(messages) == 1:
         logging.log(getattr(logging, level_normalized, logging.INFO), "[%s]%s %s", job_id, user_tag, messages[0])
     else:
         logging.log(getattr(logging, level_normalized, logging.INFO), "[%s]%s Added %d logs (Last: %s)", job_id, user_tag, len(messages), messages[-1])
 
+def _job_user_tag(job_id: str) -> str:
+    tag = _JOB_USER_TAGS.get(job_id)
+    if tag is None:
+        job = PersistentJob.query.get(job_id)
+        params = job.get_params() if job else {}
+        u_email = params.get('_user_email')
+        u_id = job.user_id if job else None
+        tag = ""
+        if u_email:
+            tag = f" (User: {u_email})"
+        elif u_id:
+            tag = f" (User ID: {u_id})"
+        _JOB_USER_TAGS[job_id] = tag
+    return tag
+
+def finish_job_logs(job_id: str) -> None:
+    """Write the job's buffered log lines and drop its cached state (call when the job ends)."""
+    JOB_LOG_SINK.flush(job_id)
+    _JOB_USER_TAGS.pop(job_id, None)
+
 def update_job_progress(job_id: str, current: int, total: int = None, message: str = None):
-    """Accurate progress update helper."""
-    db.session.expire_all() # Ensure fresh session
-    job = PersistentJob.query.get(job_id)
-    if job:
-        job.progress_current = current
-        if total is not None:
-            job.progress_total = total
-        if message:
-            job.progress_message = message
-        db.session.commit()
-        _sync_with_batch_log(job)
+    """Accurate progress update helper (coalesced; see job_progress.ProgressReporter)."""
+    PROGRESS_REPORTER.report(db.engine, job_id, current=current, total=total, message=message or None)
 
-def submit_mp_job(job_type: str, marketplace: str, func, params: Optional[Dict[str, Any]] = None) -> str:
+def submit_mp_job(job_type: str, marketplace: str, func, params: Optional[Dict[str, Any]] = None,
+                  priority: int = PRIORITY_NORMAL) -> str:
     # Capture user_id if authenticated
     try:
         if current_user and current_user.is_authenticated:
@@ -272,43 +346,28 @@ def submit_mp_job(job_type: str, marketplace: str, func, params: Optional[Dict[s
     except Exception:
         pass # Ignore auth errors in submission if any
 
-    job_id = register_mp_job(job_type, marketplace, params=params)
+    job_id = register_mp_job(job_type, marketplace, params=params, priority=priority)
     
     app = current_app._get_current_object()
 
     def _runner():
+        # Admitted by MP_SCHEDULER: the job is already 'running' (claimed) in DB
         with app.app_context():
-            # Wait/Queue Management: Limit to max 3 concurrent running jobs
-            import random
-            while True:
-                db.session.expire_all()
-                job = PersistentJob.query.get(job_id)
-                if not job or job.cancel_requested:
-                    if job:
-                        job.status = 'cancelled'
-                        db.session.commit()
-                    return
-
-                # Check current running jobs (Global across all workers via DB)
-                running_count = PersistentJob.query.filter_by(status='running').count()
-                if running_count < 10:
-                    break # Slot available!
-                
-                # Wait for a slot
-                time.sleep(10 + random.random() * 5)
-
-            job.status = 'running'
-            job.started_at = datetime.now()
-            db.session.commit()
+            job = PersistentJob.query.get(job_id)
+            if not job:
+                return
             
+            # Job functions check job_token(job_id).cancelled / .wait_if_paused() instead of polling the DB
+            token = job_token(job_id)
             append_mp_job_log(job_id, "Başladı", level='info')
             
             try:
                 result = func(job_id)
+                PROGRESS_REPORTER.finish(job_id)
                 
                 # Check for cancellation
                 db.session.refresh(job)
-                if job.cancel_requested:
+                if job.cancel_requested or token.cancelled:
                     append_mp_job_log(job_id, "İptal edildi", level='warning')
                     job.status = 'cancelled'
                 else:
@@ -318,21 +377,28 @@ def submit_mp_job(job_type: str, marketplace: str, func, params: Optional[Dict[s
                 job.result_json = json.dumps(result)
                 job.completed_at = datetime.now()
                 job.progress_current = job.progress_total
+                # Logs first: a reader that sees the final status already has every line
+                finish_job_logs(job_id)
                 db.session.commit()
+                JOB_EVENTS.announce(db.engine, job_id)
                 _sync_with_batch_log(job)
                 
             except Exception as exc:
                 logging.exception("Job failed: %s", job_id)
                 db.session.rollback()
+                PROGRESS_REPORTER.finish(job_id)
                 
                 # Reload job to save error state
                 job = PersistentJob.query.get(job_id)
                 job.status = 'failed'
                 job.completed_at = datetime.now()
-                db.session.commit()
-                
                 append_mp_job_log(job_id, f"Hata: {exc}", level='error')
+                finish_job_logs(job_id)
+                db.session.commit()
+                JOB_EVENTS.announce(db.engine, job_id)
                 _sync_with_batch_log(job)
+            finally:
+                release_job_token(job_id)
 
-    MP_EXECUTOR.submit(_runner)
+    MP_SCHEDULER.submit(app, job_id, _job_owner(params), marketplace, _runner, priority=priority)
     return job_id
@@ -0,0 +1,182 @@
+"""
+Pazaryeri işleri için sınırlı (bounded) iş zamanlayıcı.
+submit_mp_job ile gelen işler önce bu süreçteki öncelik kuyruğuna girer; tek bir dağıtıcı
+thread, global / kullanıcı başına / pazaryeri başına çalışma limitleri boşaldığında işi
+DB'de 'pending' -> 'running' olarak sahiplenir (claim) ve ancak o zaman MP_EXECUTOR'a verir.
+Kuyrukta bekleyen iş thread tutmaz. Limitler tüm worker'lar için DB'deki çalışan işlerden
+hesaplanır; PostgreSQL'de sahiplenme kararı pg_advisory_xact_lock ile worker'lar arasında
+sıraya sokulur. Adil paylaşım: aynı öncelikteki uygun işler arasında en az çalışan işi olan
+kullanıcı önce seçilir.
+"""
+import heapq
+import itertools
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, text
+
+from config import Config
+from app import db
+from app.models import PersistentJob
+from app.services.job_events import JOB_EVENTS
+
+logger = logging.getLogger(__name__)
+
+# Lower number runs first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 9  # scheduled/background jobs (auto sync)
+
+RUNNING_STATUSES = ('running', 'pausing')
+ADVISORY_LOCK_KEY = 0x4D504A42  # 'MPJB', serialises admission across workers on PostgreSQL
+# Re-check interval while jobs wait on slots held by other workers
+CLAIM_RETRY_SECONDS = 2.0
+
+
+class _QueuedJob:
+    __slots__ = ('job_id', 'owner_id', 'marketplace', 'priority', 'seq', 'run')
+
+    def __init__(self, job_id: str, owner_id: Optional[int], marketplace: Optional[str],
+                 priority: int, seq: int, run: Callable[[], Any]):
+        self.job_id = job_id
+        self.owner_id = owner_id
+        self.marketplace = marketplace
+        self.priority = priority
+        self.seq = seq
+        self.run = run
+
+    def sort_key(self) -> Tuple[int, int]:
+        return (self.priority, self.seq)
+
+
+class JobScheduler:
+    """Per-process admission queue in front of an executor; see module docstring."""
+
+    def __init__(self, executor, local_slots: int):
+        self._executor = executor
+        self._local_slots = local_slots
+        self._heap: List[Tuple[Tuple[int, int], _QueuedJob]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._local_running = 0
+        self._thread: Optional[threading.Thread] = None
+        self._app = None
+
+    @property
+    def limits(self) -> Dict[str, int]:
+        return {
+            'global': Config.MP_MAX_RUNNING_JOBS,
+            'per_user': Config.MP_MAX_JOBS_PER_USER,
+            'per_marketplace': Config.MP_MAX_JOBS_PER_MARKETPLACE,
+        }
+
+    def submit(self, app, job_id: str, owner_id: Optional[int], marketplace: Optional[str],
+               run: Callable[[], Any], priority: int = PRIORITY_NORMAL) -> None:
+        """Queue a registered (status='pending') job; run() is called in an executor thread once admitted."""
+        entry = _QueuedJob(job_id, owner_id, marketplace, priority, next(self._seq), run)
+        with self._cond:
+            self._app = self._app or app
+            heapq.heappush(self._heap, (entry.sort_key(), entry))
+            self._ensure_dispatcher()
+            self._cond.notify()
+
+    def queued_count(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    def _ensure_dispatcher(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._dispatch_loop, name='mp-job-scheduler', daemon=True)
+            self._thread.start()
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._heap or self._local_running >= self._local_slots:
+                    self._cond.wait()
+                candidates = [entry for _, entry in sorted(self._heap)]
+                app = self._app
+
+            try:
+                with app.app_context():
+                    admitted, dropped = self._claim(candidates)
+            except Exception as e:
+                logger.error(f"Job scheduler claim failed: {e}")
+                admitted, dropped = None, []
+
+            with self._cond:
+                gone = {e.job_id for e in dropped}
+                if admitted is not None:
+                    gone.add(admitted.job_id)
+                    self._local_running += 1
+                if gone:
+                    self._heap = [item for item in self._heap if item[1].job_id not in gone]
+                    heapq.heapify(self._heap)
+                if admitted is None and self._heap:
+                    # Blocked by limits (slots held here or in other workers): wait for a local
+                    # release or re-check shortly
+                    self._cond.wait(CLAIM_RETRY_SECONDS)
+
+            if admitted is not None:
+                self._executor.submit(self._run, admitted)
+
+    def _run(self, entry: _QueuedJob) -> None:
+        try:
+            entry.run()
+        finally:
+            with self._cond:
+                self._local_running -= 1
+                self._cond.notify()
+
+    def _claim(self, candidates: List[_QueuedJob]) -> Tuple[Optional[_QueuedJob], List[_QueuedJob]]:
+        """
+        Pick the next admissible job and flip it to running in one transaction.
+        Returns (admitted entry or None, entries to drop because they are no longer pending).
+        """
+        limits = self.limits
+        dropped: List[_QueuedJob] = []
+        try:
+            if db.engine.dialect.name == 'postgresql':
+                db.session.execute(text('SELECT pg_advisory_xact_lock(:k)'), {'k': ADVISORY_LOCK_KEY})
+
+            stale_cutoff = datetime.now() - timedelta(seconds=Config.MP_JOB_STALE_SECONDS)
+            rows = db.session.query(PersistentJob.owner_id, PersistentJob.marketplace, func.count(PersistentJob.id)) \
+                .filter(PersistentJob.status.in_(RUNNING_STATUSES), PersistentJob.updated_at >= stale_cutoff) \
+                .group_by(PersistentJob.owner_id, PersistentJob.marketplace).all()
+            total = 0
+            per_user: Dict[Any, int] = {}
+            per_marketplace: Dict[Any, int] = {}
+            for owner_id, marketplace, count in rows:
+                total += count
+                per_user[owner_id] = per_user.get(owner_id, 0) + count
+                per_marketplace[marketplace] = per_marketplace.get(marketplace, 0) + count
+
+            if total >= limits['global']:
+                db.session.rollback()
+                return None, dropped
+
+            eligible = [e for e in candidates
+                        if (e.owner_id is None or per_user.get(e.owner_id, 0) < limits['per_user'])
+                        and per_marketplace.get(e.marketplace, 0) < limits['per_marketplace']]
+            # Priority class first; inside a class fair share (owner with fewest running jobs), then FIFO
+            eligible.sort(key=lambda e: (e.priority, per_user.get(e.owner_id, 0), e.seq))
+
+            for entry in eligible:
+                claimed = db.session.query(PersistentJob) \
+                    .filter(PersistentJob.id == entry.job_id, PersistentJob.status == 'pending',
+                            PersistentJob.cancel_requested.isnot(True)) \
+                    .update({'status': 'running', 'started_at': datetime.now(), 'updated_at': datetime.now()},
+                            synchronize_session=False)
+                if claimed:
+                    db.session.commit()
+                    JOB_EVENTS.announce(db.engine, entry.job_id)
+                    return entry, dropped
+                # Cancelled (or otherwise moved on) while queued
+                dropped.append(entry)
+            db.session.commit()
+            return None, dropped
+        except Exception:
+            db.session.rollback()
+            raise
@@ -5,7 +5,8 @@ import json
 import time
 from typing import Dict, Any, List, Optional
 from datetime import datetime
-from app.utils.rate_limiter import n11_limiter
+from app.utils.rate_limiter import n11_limiter, credential_key
+from app.utils.pagination import fetch_pages, PagedFetch
 
 class N11Client:
     """
@@ -41,11 +42,14 @@ class N11Client:
         self.session.headers.clear()
         self.session.headers.update(self.headers)
         
-        # Patch session.request
+        # Patch session.request (one limiter bucket per appKey, 429s slow that bucket down)
+        self._limiter_key = credential_key(self.api_key)
         original_request = self.session.request
         def rate_limited_request(method, url, *args, **kwargs):
-            n11_limiter.wait()
-            return original_request(method, url, *args, **kwargs)
+            n11_limiter.wait(self._limiter_key)
+            response = original_request(method, url, *args, **kwargs)
+            n11_limiter.feedback(self._limiter_key, response)
+            return response
         self.session.request = rate_limited_request
 
     def request(self, method, url, **kwargs):
@@ -147,6 +151,20 @@ class N11Client:
                 logging.error(f"[N11Client] Error Body: {e.response.text}")
             raise
 
+    def get_all_products(self, size: int = 100, sale_status: str = None, concurrency: Optional[int] = None,
+                         on_progress=None, should_stop=None) -> PagedFetch:
+        """Every page of get_products; pages after the first are fetched concurrently once totalElements is known."""
+        return fetch_pages(
+            lambda page: self.get_products(page=page, size=size, sale_status=sale_status),
+            lambda resp: resp.get('content') or [],
+            page_size=size,
+            first_page=0,
+            total_of=lambda resp: resp.get('totalElements'),
+            concurrency=concurrency,
+            on_progress=on_progress,
+            should_stop=should_stop,
+        )
+
     def get_product_count(self) -> int:
         """Get total count of products. Raises on auth error."""
         res = self.get_products(page=0, size=1)
@@ -730,4 +748,5 @@ def get_n11_client(user_id: int = None):
     if not api_key or not api_secret:
         return None
         
-    return N11Client(api_key, api_secret)
+    from app.services.client_registry import CLIENT_REGISTRY
+    return CLIENT_REGISTRY.get('n11', user_id, (api_key, api_secret), lambda: N11Client(api_key, api_secret))
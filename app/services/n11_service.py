@@ -19,7 +19,8 @@ from app.models import Product, Setting, MarketplaceProduct
 from flask_login import current_user
 from app.services.n11_client import get_n11_client
 from app.services.job_queue import append_mp_job_log
-from app.utils.helpers import clean_forbidden_words, to_int, to_float, is_product_forbidden, calculate_price, chunked
+from app.services.job_control import job_token
+from app.utils.helpers import clean_forbidden_words, to_int, to_float, is_product_forbidden, calculate_price, calculate_prices, chunked
 
 # ---------------------------------------------------
 # N11 Category Caching & Auto Match Globals
@@ -278,49 +279,20 @@ def fetch_all_n11_products(job_id: Optional[str] = None, user_id: int = None) ->
     if not client:
         return []
 
-    all_products = []
-    page = 0
     size = 100
-    total_elements = -1
-    total_pages = -1
-    
-    while True:
-        try:
-            response = client.get_products(page=page, size=size)
-            if not response or 'content' not in response:
-                logger.warning(f"[N11] Sayfa {page} cevabında 'content' bulunamadı.")
-                break
-                
-            products = response['content']
-            
-            # First page: capture totals
-            if page == 0:
-                total_elements = int(response.get('totalElements', -1))
-                total_pages = int(response.get('totalPages', -1))
-                if job_id: append_mp_job_log(job_id, f"N11'de toplam {total_elements} ürün bulundu ({total_pages} sayfa).")
-                logger.info(f"[N11] Total items: {total_elements}, Pages: {total_pages}")
-
-            if not products:
-                logger.info(f"[N11] Sayfa {page} boş, döngü sonlandırılıyor.")
-                break
-                
-            all_products.extend(products)
-            logger.info(f"[N11] Page {page} fetched: {len(products)} items. Total so far: {len(all_products)}")
-            
-            if len(products) < size: 
-                break
-                
-            page += 1
-            if total_pages > 0 and page >= total_pages:
-                break
-                
-            time.sleep(0.2)
-        except Exception as e:
-            msg = f"N11 ürün çekme hatası (Sayfa {page}): {str(e)}"
-            logger.error(msg)
-            if job_id: append_mp_job_log(job_id, msg, level='error')
-            # If it's the first page, we stop. If later, we might have partial results.
-            break
+
+    # Pages after the first are fetched concurrently (bounded by the appKey's rate limit bucket)
+    fetched = client.get_all_products(size=size, should_stop=job_token(job_id).should_stop)
+    all_products = fetched.items
+    total_elements = fetched.total or -1
+    total_pages = (total_elements + size - 1) // size if total_elements > 0 else -1
+    if job_id: append_mp_job_log(job_id, f"N11'de toplam {total_elements} ürün bulundu ({total_pages} sayfa).")
+    logger.info(f"[N11] Total items: {total_elements}, Pages: {total_pages}, fetched: {len(all_products)} items in {fetched.pages} pages")
+
+    for page, error in sorted(fetched.failed_pages.items()):
+        msg = f"N11 ürün çekme hatası (Sayfa {page}): {error}"
+        logger.error(msg)
+        if job_id: append_mp_job_log(job_id, msg, level='error')
             
     # Verification
     if total_elements > 0 and len(all_products) < total_elements:
@@ -1181,23 +1153,24 @@ def sync_n11_with_xml_diff(job_id: str, xml_source_id: Any, user_id: int = None,
     updated_count = 0
     if final_matched:
         items_to_update = []
+        matched_infos = []
         for sc in final_matched:
             # Try Primary Match
             xml_info = xml_map.get(sc)
-            
+
             # Try Fallback Match
             if not xml_info:
                 xml_info = xml_barcode_map.get(sc)
-            
+
             if not xml_info: continue
-            
+            matched_infos.append((sc, xml_info))
+
+        # Price (whole batch at once)
+        final_prices = calculate_prices([to_float(info.get('price'), 0.0) for _, info in matched_infos], 'n11', user_id=user_id)
+        for (sc, xml_info), final_price in zip(matched_infos, final_prices.tolist()):
             # Stock
             qty = to_int(xml_info.get('quantity'), 0)
-            
-            # Price
-            base_price = to_float(xml_info.get('price'), 0.0)
-            final_price = calculate_price(base_price, 'n11', user_id=user_id)
-            
+
             items_to_update.append({
                 'barcode': sc, # Using Stock Code as Identifier for N11 Update
                 'stock': qty,
@@ -1418,6 +1391,8 @@ def sync_n11_products(user_id: int, job_id: Optional[str] = None) -> Dict[str, A
             append_mp_job_log(job_id, f"N11 API'den {len(products)} ürün çekildi. Veritabanına işleniyor...")
 
         remote_barcodes = []
+        rows = []
+        now = datetime.now()
         for p in products:
             barcode = p.get('sellerCode') or p.get('barcode')
             if not barcode:
@@ -1425,12 +1400,6 @@ def sync_n11_products(user_id: int, job_id: Optional[str] = None) -> Dict[str, A
                 barcode = f"N11-{p.get('n11ProductId') or p.get('id')}"
             remote_barcodes.append(barcode)
             
-            existing = db.session.query(MarketplaceProduct).filter_by(
-                user_id=user_id, 
-                marketplace='n11', 
-                barcode=barcode
-            ).first()
-            
             qty = 0
             price = 0.0
             stock_items = p.get('stockItems', [])
@@ -1442,42 +1411,31 @@ def sync_n11_products(user_id: int, job_id: Optional[str] = None) -> Dict[str, A
                  qty = int(p.get('quantity', 0))
                  price = float(p.get('salePrice') or p.get('listPrice', 0))
 
-            if not existing:
-                existing = MarketplaceProduct(
-                    user_id=user_id,
-                    marketplace='n11',
-                    barcode=barcode
-                )
-                db.session.add(existing)
-
-            existing.title = p.get('title', 'İsimsiz Ürün')
-            existing.quantity = qty
-            existing.price = price
-            existing.sale_price = price
-            existing.stock_code = p.get('sellerCode')
-            
             n11_status = p.get('productStatus')
-            existing.status = 'Aktif' if n11_status == 'Active' else 'Pasif'
-            existing.on_sale = (n11_status == 'Active')
-            
-            if hasattr(existing, 'brand'):
-                brand_data = p.get('brand')
-                if isinstance(brand_data, dict):
-                    existing.brand = brand_data.get('name')
-                else:
-                    existing.brand = str(brand_data) if brand_data else None
-
-            if hasattr(existing, 'category_name'):
-                cat_data = p.get('category')
-                if isinstance(cat_data, dict):
-                    existing.category_name = cat_data.get('name')
-                else:
-                    existing.category_name = str(cat_data) if cat_data else None
-            
-            images = p.get('images', [])
-            if images and isinstance(images, list):
-                 existing.image_url = images[0].get('url') if isinstance(images[0], dict) else images[0]
+            brand_data = p.get('brand')
+            if isinstance(brand_data, dict):
+                brand = brand_data.get('name')
+            else:
+                brand = str(brand_data) if brand_data else None
+
+            rows.append({
+                'user_id': user_id,
+                'marketplace': 'n11',
+                'barcode': barcode,
+                'title': p.get('title', 'İsimsiz Ürün'),
+                'quantity': qty,
+                'price': price,
+                'sale_price': price,
+                'stock_code': p.get('sellerCode'),
+                'status': 'Aktif' if n11_status == 'Active' else 'Pasif',
+                'on_sale': (n11_status == 'Active'),
+                'brand': brand,
+                'last_sync_at': now,
+            })
 
+        # Single set-based upsert (COPY + merge on PostgreSQL) instead of a SELECT per product
+        from app.services.bulk_loader import bulk_upsert
+        bulk_upsert(MarketplaceProduct, rows, conflict_cols=('user_id', 'marketplace', 'barcode'))
         db.session.commit()
         
         # Safe Cleanup: Only delete if we didn't have a massive failure during fetch
@@ -1521,7 +1479,7 @@ def perform_n11_direct_push_actions(user_id: int, to_update: List[Any], to_creat
     N11 için Direct Push aksiyonlarını gerçekleştirir.
     """
     from app.services.job_queue import append_mp_job_log, append_mp_job_logs, get_mp_job, update_mp_job, update_job_progress
-    from app.utils.helpers import calculate_price, chunked
+    from app.utils.helpers import calculate_prices, chunked
     from app.models import MarketplaceProduct
     from app import db
     import json
@@ -1553,15 +1511,14 @@ def perform_n11_direct_push_actions(user_id: int, to_update: List[Any], to_creat
         db_mappings = []
         batch_logs = []
         
-        for xml_item, local_item in to_update:
+        update_prices, update_rules = calculate_prices([x.price for x, _ in to_update], 'n11', user_id=user_id, return_details=True)
+        for (xml_item, local_item), final_price, rule_desc in zip(to_update, update_prices.tolist(), update_rules):
             # Periodic cancel check
             if len(db_mappings) % 50 == 0 and job_id:
-                js = get_mp_job(job_id)
-                if js and js.get('cancel_requested'):
+                if job_token(job_id).cancelled:
                     append_mp_job_log(job_id, "İşlem kullanıcı tarafından iptal edildi.", level='warning')
                     return res
             
-            final_price, rule_desc = calculate_price(xml_item.price, 'n11', user_id=user_id, return_details=True)
             final_price = round(final_price, 2)
             
             update_payloads.append({
@@ -1588,8 +1545,7 @@ def perform_n11_direct_push_actions(user_id: int, to_update: List[Any], to_creat
         try:
             for i, batch in enumerate(chunked(update_payloads, 100)):
                 if job_id and i % 5 == 0:
-                    js = get_mp_job(job_id)
-                    if js and js.get('cancel_requested'):
+                    if job_token(job_id).cancelled:
                         append_mp_job_log(job_id, "İptal edildi (Batch sırasında)", level='warning')
                         return res
                 
@@ -1644,14 +1600,14 @@ def perform_n11_direct_push_actions(user_id: int, to_update: List[Any], to_creat
         from app.services.xml_service import generate_random_barcode
         
         valid_creates = []
-        for i, xml_item in enumerate(to_create):
+        create_prices, create_rules = calculate_prices([x.price for x in to_create], 'n11', user_id=user_id, return_details=True)
+        for i, (xml_item, final_price, rule_desc) in enumerate(zip(to_create, create_prices.tolist(), create_rules)):
             # Progress Update & Cancel Check (Every 5 items)
             if job_id and i % 5 == 0:
                 update_job_progress(job_id, completed_ops, total_ops, f'Yeni ürünler hazırlanıyor ({i}/{len(to_create)})...')
                 
                 # Check cancellation more frequently
-                js = get_mp_job(job_id)
-                if js and js.get('cancel_requested'):
+                if job_token(job_id).cancelled:
                     append_mp_job_log(job_id, "İşlem kullanıcı tarafından iptal edildi (Hazırlık aşaması).", level='warning')
                     return res
             
@@ -1664,7 +1620,6 @@ def perform_n11_direct_push_actions(user_id: int, to_update: List[Any], to_creat
                 barcode = generate_random_barcode()
             
             raw = json.loads(xml_item.raw_data)
-            final_price, rule_desc = calculate_price(xml_item.price, 'n11', user_id=user_id, return_details=True)
             
             safe_title = (xml_item.title or "").strip()
             if len(safe_title) < 5: safe_title = f"{safe_title} - Ürün"
@@ -1706,11 +1661,13 @@ def perform_n11_direct_push_actions(user_id: int, to_update: List[Any], to_creat
 
             valid_creates.append((item_payload, xml_item, rule_desc))
 
+        # Left out above (no match / invalid barcode), reported apart from failed batches
+        res['skipped_count'] = len(to_create) - len(valid_creates)
+
         # API Chunks
         for batch in chunked(valid_creates, 50):
             if job_id:
-                js = get_mp_job(job_id)
-                if js and js.get('cancel_requested'):
+                if job_token(job_id).cancelled:
                     append_mp_job_log(job_id, "İptal edildi (Create sırasında)", level='warning')
                     return res
  
@@ -1832,8 +1789,7 @@ def perform_n11_direct_push_actions(user_id: int, to_update: List[Any], to_creat
         for local_item in to_zero:
             # Periodic cancel check
             if len(zero_payloads) % 50 == 0 and job_id:
-                js = get_mp_job(job_id)
-                if js and js.get('cancel_requested'):
+                if job_token(job_id).cancelled:
                     append_mp_job_log(job_id, "İşlem kullanıcı tarafından iptal edildi.", level='warning')
                     return res
             
@@ -1847,8 +1803,7 @@ def perform_n11_direct_push_actions(user_id: int, to_update: List[Any], to_creat
         try:
             for i, batch in enumerate(chunked(zero_payloads, 100)):
                 if job_id and i % 5 == 0:
-                    js = get_mp_job(job_id)
-                    if js and js.get('cancel_requested'):
+                    if job_token(job_id).cancelled:
                         append_mp_job_log(job_id, "İptal edildi (Zero sırasında)", level='warning')
                         return res
                 
@@ -7,7 +7,9 @@ import requests
 from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
 from urllib3.util import Retry
-from app.utils.rate_limiter import pazarama_limiter
+from app.utils.rate_limiter import pazarama_limiter, credential_key
+from app.services.token_cache import TOKEN_CACHE
+from app.utils.pagination import fetch_pages, PagedFetch
 
 DEFAULT_TIMEOUT = 20
 TOKEN_URL = "https://isortagimgiris.pazarama.com/connect/token"
@@ -48,14 +50,14 @@ class PazaramaClient:
             }
         )
         self._token: Optional[str] = None
-        self._token_expire: float = 0
+        # Tokens are shared by every client with these credentials (TOKEN_CACHE)
+        self._token_key = 'pazarama:' + credential_key(client_id, client_secret)
+        # One limiter bucket per API client (seller)
+        self._limiter_key = credential_key(client_id)
 
     # ------------------------------------------------------------------
     # Token helpers
     # ------------------------------------------------------------------
-    def _token_valid(self) -> bool:
-        return bool(self._token) and time.time() < self._token_expire
-
     def _auth_headers(
         self,
         *,
@@ -84,7 +86,7 @@ class PazaramaClient:
         last_exc: Optional[Exception] = None
         for attempt in range(retry + 1):
             try:
-                pazarama_limiter.wait()
+                pazarama_limiter.wait(self._limiter_key)
                 self.ensure_token()
                 hdrs = self.session.headers.copy()
                 # Allow caller to override injection of auth header (e.g. token refresh request)
@@ -96,6 +98,7 @@ class PazaramaClient:
                 if headers:
                     hdrs.update(headers)
                 response = self.session.request(method, url, headers=hdrs, timeout=self.timeout, **kwargs)
+                pazarama_limiter.feedback(self._limiter_key, response)
                 if response.status_code == 401 and attempt < retry:
                     self.get_token()
                     continue
@@ -104,9 +107,12 @@ class PazaramaClient:
                     if raise_for_status:
                         response.raise_for_status()
                     return response
-                if response.status_code in {403, 429} and attempt < retry:
+                if response.status_code == 429 and attempt < retry:
+                    # The limiter bucket is paused (Retry-After / backoff); the next wait() sleeps it out
+                    continue
+                if response.status_code == 403 and attempt < retry:
                     wait_time = 2 * (attempt + 1)  # 2, 4, 6 seconds
-                    logging.warning("Pazarama rate limit (429). Waiting %ds...", wait_time)
+                    logging.warning("Pazarama rate limit (403). Waiting %ds...", wait_time)
                     time.sleep(wait_time)
                     continue
                 if raise_for_status and response.status_code >= 400:
@@ -121,7 +127,7 @@ class PazaramaClient:
             raise last_exc
         raise RuntimeError("Pazarama request failed without exception.")
 
-    def get_token(self) -> str:
+    def _fetch_token(self):
         body = {"grant_type": "client_credentials", "scope": "merchantgatewayapi.fullaccess"}
         resp = self.session.post(
             TOKEN_URL,
@@ -137,14 +143,17 @@ class PazaramaClient:
         if not token:
             raise RuntimeError("Pazarama token alınamadı.")
         expires_in = int(data.get("expiresIn") or data.get("expires_in") or 3600)
-        # Renew one minute early to be safe
-        self._token = token
-        self._token_expire = time.time() + max(60, expires_in - 60)
-        return token
+        return token, expires_in
+
+    def get_token(self) -> str:
+        """Fresh token (after a 401): drops the one this client used and fetches a new one once."""
+        TOKEN_CACHE.invalidate(self._token_key, self._token)
+        self._token = TOKEN_CACHE.get(self._token_key, self._fetch_token)
+        return self._token
 
     def ensure_token(self) -> None:
-        if not self._token_valid():
-            self.get_token()
+        # Refreshed ahead of expiry by the cache; a dict lookup otherwise
+        self._token = TOKEN_CACHE.get(self._token_key, self._fetch_token)
 
     # ------------------------------------------------------------------
     # Brand helpers
@@ -379,6 +388,21 @@ class PazaramaClient:
         
         return result
 
+    def list_all_products(self, approved: Optional[bool] = None, size: int = 200, concurrency: Optional[int] = None,
+                          on_progress=None, should_stop=None, max_pages: int = 500) -> PagedFetch:
+        """Every page of list_products (1-based); pages after the first are fetched concurrently once totalCount is known."""
+        return fetch_pages(
+            lambda page: self.list_products(approved=approved, page=page, size=size),
+            lambda resp: resp.get('data') or [],
+            page_size=size,
+            first_page=1,
+            total_of=lambda resp: resp.get('totalCount') or resp.get('total'),
+            concurrency=concurrency,
+            on_progress=on_progress,
+            should_stop=should_stop,
+            max_pages=max_pages,
+        )
+
     def get_product_detail(self, code: str) -> Dict[str, Any]:
         if not code:
             return {}
@@ -17,8 +17,11 @@ except ImportError:
 
 from app.models import Setting
 from app.services.pazarama_client import PazaramaClient
+from app.services.client_registry import CLIENT_REGISTRY
+from app.utils.pagination import fetch_partitions, PagedFetch
 from app.services.xml_service import load_xml_source_index, lookup_xml_record
 from app.services.job_queue import append_mp_job_log
+from app.services.job_control import job_token
 from app.utils.helpers import to_int, to_float, chunked, get_marketplace_multiplier, clean_forbidden_words, is_product_forbidden, calculate_price
 
 # Category cache for basic operations
@@ -194,7 +197,8 @@ def get_pazarama_client(user_id: int = None) -> PazaramaClient:
     client_secret = (Setting.get("PAZARAMA_API_SECRET", "", user_id=user_id) or "").strip()
     if not client_id or not client_secret:
         raise ValueError("Pazarama API bilgileri eksik. Ayarlar sayfasindan PAZARAMA_API_KEY ve PAZARAMA_API_SECRET giriniz.")
-    return PazaramaClient(client_id=client_id, client_secret=client_secret)
+    return CLIENT_REGISTRY.get('pazarama', user_id, (client_id, client_secret),
+                               lambda: PazaramaClient(client_id=client_id, client_secret=client_secret))
 
 def get_cached_pazarama_detail(client: PazaramaClient, code: str) -> Dict[str, Any]:
     if not code:
@@ -451,6 +455,17 @@ def resolve_pazarama_brand(client: PazaramaClient, brand_name: str, log_callback
     fallback = "3fa85f64-5717-4562-b3fc-2c963f66afa6" 
     return fallback
 
+# Dedup key fields of pazarama_fetch_all_products, in priority order
+PAZARAMA_ROW_KEY_FIELDS = (
+    'code', 'stockCode', 'productCode', 'productId', 'id',
+    'barcode', 'sku', 'groupCode', 'listingId', 'listingCode'
+)
+
+
+def _pass_label(approved_flag: Optional[bool]) -> str:
+    return 'all' if approved_flag is None else ('approved' if approved_flag else 'unapproved')
+
+
 def pazarama_fetch_all_products(client: PazaramaClient, page_size: int = 250, force_refresh: bool = False) -> List[Dict[str, Any]]:
     logging.info(f"[Pazarama] Fetching all products: page_size={page_size}, force_refresh={force_refresh}")
     snapshot_items: Optional[List[Dict[str, Any]]] = None
@@ -487,93 +502,78 @@ def pazarama_fetch_all_products(client: PazaramaClient, page_size: int = 250, fo
 
     last_error: Optional[Exception] = None
 
-    aggregated_map: Dict[str, Dict[str, Any]] = {}
+    aggregated_map: Dict[Tuple, Dict[str, Any]] = {}
     total_reported = 0
 
-    def _row_key(row: Dict[str, Any], label: str) -> str:
-        priority_fields = (
-            'code', 'stockCode', 'productCode', 'productId', 'id',
-            'barcode', 'sku', 'groupCode', 'listingId', 'listingCode'
-        )
-        for field in priority_fields:
+    def _row_key(row: Dict[str, Any], label: str) -> Tuple:
+        # (slot, value): the first identifying field wins; name/date keys stay per pass
+        for slot, field in enumerate(PAZARAMA_ROW_KEY_FIELDS):
             val = row.get(field)
-            if val is not None and str(val).strip():
-                return f"{field}:{str(val).strip().lower()}"
+            if val is not None:
+                val = val.strip() if isinstance(val, str) else str(val)
+                if val:
+                    return (slot, val.lower())
         name = str(row.get('displayName') or row.get('name') or '').strip()
         if name:
-            return f"{label}:{name.lower()}"
+            return (-1, label, name.lower())
         created = str(row.get('createdDate') or row.get('createdAt') or '').strip()
         if created:
-            return f"{label}:{created.lower()}"
-        return f"{label}:anon:{hash(str(sorted(row.items())))}"
+            return (-2, label, created.lower())
+        return (-3, label, hash(str(sorted(row.items()))))
 
-    def _fetch_for_status(approved_flag: Optional[bool]) -> bool:
-        nonlocal total_reported, last_error, aggregated_map
-        label = 'all' if approved_flag is None else ('approved' if approved_flag else 'unapproved')
+    def _fetch_for_status(approved_flag: Optional[bool]) -> Optional[PagedFetch]:
+        nonlocal last_error
+        label = _pass_label(approved_flag)
         for size in sizes_to_try:
-            page = 1
-            max_pages = None
-            stagnant_pages = 0
-            try:
-                while True:
-                    resp = client.list_products(page=page, size=size, approved=approved_flag)
-                    data = resp.get('data') or []
-                    if not data:
-                        break
-                    appended = 0
-                    for row in data:
-                        key = _row_key(row, label)
-                        if key in aggregated_map:
-                            continue
-                        aggregated_map[key] = row
-                        appended += 1
-                    if appended == 0:
-                        stagnant_pages += 1
-                    else:
-                        stagnant_pages = 0
-                    total = int(resp.get('totalCount') or resp.get('total') or 0)
-                    total_reported = max(total_reported, total)
-                    total_pages = resp.get('totalPages') or resp.get('totalPage')
-                    if isinstance(total_pages, (int, float, str)):
-                        try:
-                            max_pages = int(total_pages)
-                        except Exception:
-                            pass
-                    if len(data) < size:
-                        break
-                    if max_pages and max_pages > 0 and page >= max_pages:
-                        break
-                    if stagnant_pages >= 2:
-                        break
-                    if page >= 500:
-                        break
-                    page += 1
-                if stagnant_pages < 2 or aggregated_map:
-                    return True
-            except Exception as exc:
-                last_error = exc
-                continue
-        return False
+            # Pages after the first are fetched concurrently once totalCount is known
+            fetched = client.list_all_products(approved=approved_flag, size=size)
+            if fetched.failed_pages and not fetched.items:
+                last_error = Exception(next(iter(fetched.failed_pages.values())))
+                continue  # retry with a smaller page size
+            if fetched.failed_pages:
+                logging.warning(f"[Pazarama] {label}: {len(fetched.failed_pages)} page(s) failed: {sorted(fetched.failed_pages)}")
+            return fetched
+        return None
 
-    fetched_any = False
-    approved_count = 0
-    unapproved_count = 0
-    
-    for approved_flag in (None, True, False):
+    def _merge(approved_flag: Optional[bool], fetched: Optional[PagedFetch]) -> int:
+        nonlocal total_reported
+        if fetched is None:
+            return 0
+        label = _pass_label(approved_flag)
         before_count = len(aggregated_map)
-        success = _fetch_for_status(approved_flag)
-        after_count = len(aggregated_map)
-        added = after_count - before_count
-        
-        status_label = 'all' if approved_flag is None else ('approved' if approved_flag else 'unapproved')
-        logging.info(f"[Pazarama] Fetched {status_label}: +{added} products (total so far: {after_count})")
-        
-        if approved_flag is True:
-            approved_count = added
-        elif approved_flag is False:
-            unapproved_count = added
-            
-        fetched_any = fetched_any or success
+        total_reported = max(total_reported, fetched.total or 0)
+        for row in fetched.items:
+            aggregated_map.setdefault(_row_key(row, label), row)
+        added = len(aggregated_map) - before_count
+        logging.info(f"[Pazarama] Fetched {label}: +{added} products (total so far: {len(aggregated_map)})")
+        return added
+
+    def _count(approved_flag: bool) -> Optional[int]:
+        # None (unknown) unless the response carries a total: a missing total must not skip the filtered passes
+        try:
+            resp = client.list_products(approved=approved_flag, page=1, size=1)
+            for key in ('totalCount', 'total'):
+                if resp.get(key) is not None:
+                    return int(resp[key])
+            return None
+        except Exception:
+            return None
+
+    # The 'all' pass usually covers approved + unapproved; the filtered passes run (side by side)
+    # only when the per-state counts say it missed something
+    all_pass = _fetch_for_status(None)
+    fetched_any = all_pass is not None
+    _merge(None, all_pass)
+    approved_total, unapproved_total = _count(True), _count(False)
+    approved_count, unapproved_count = approved_total or 0, unapproved_total or 0
+    if all_pass is not None and approved_total is not None and unapproved_total is not None \
+            and len(aggregated_map) >= approved_total + unapproved_total:
+        logging.info(f"[Pazarama] 'all' pass covers approved ({approved_total}) + unapproved ({unapproved_total}); filtered passes skipped")
+    else:
+        passes = fetch_partitions({flag: (lambda flag=flag: _fetch_for_status(flag)) for flag in (True, False)})
+        approved_count = _merge(True, passes[True])
+        unapproved_count = _merge(False, passes[False])
+        fetched_any = fetched_any or passes[True] is not None or passes[False] is not None
 
     logging.info(f"[Pazarama] Final counts - Approved: {approved_count}, Unapproved: {unapproved_count}, Total: {len(aggregated_map)}")
 
@@ -681,23 +681,15 @@ def perform_pazarama_sync_stock(job_id: str, xml_source_id: Any, user_id: int =
     
     for idx, chunk in enumerate(chunked(updates, chunk_size), start=1):
         # Check for cancel/pause
-        job_state = get_mp_job(job_id)
-        if job_state:
-            if job_state.get('cancel_requested'):
-                append_mp_job_log(job_id, "İşlem kullanıcı tarafından iptal edildi.", level='warning')
-                summary['message'] = f'İptal edildi. {processed_items}/{total_items} işlendi.'
-                summary['cancelled'] = True
-                return summary
-            
-            while job_state.get('pause_requested'):
-                append_mp_job_log(job_id, "Duraklatıldı. Devam etmesi bekleniyor...", level='info')
-                time.sleep(3)
-                job_state = get_mp_job(job_id)
-                if job_state.get('cancel_requested'):
-                    append_mp_job_log(job_id, "İşlem iptal edildi.", level='warning')
-                    summary['message'] = f'İptal edildi. {processed_items}/{total_items} işlendi.'
-                    summary['cancelled'] = True
-                    return summary
+        token = job_token(job_id)
+        if token.paused:
+            append_mp_job_log(job_id, "Duraklatıldı. Devam etmesi bekleniyor...", level='info')
+            token.wait_if_paused()
+        if token.cancelled:
+            append_mp_job_log(job_id, "İşlem kullanıcı tarafından iptal edildi.", level='warning')
+            summary['message'] = f'İptal edildi. {processed_items}/{total_items} işlendi.'
+            summary['cancelled'] = True
+            return summary
         
         # Update progress
         update_mp_job(job_id, progress={'current': processed_items, 'total': total_items, 'batch': f'{idx}/{total_chunks}'})
@@ -815,23 +807,15 @@ def perform_pazarama_sync_prices(job_id: str, xml_source_id: Any, user_id: int =
     
     for idx, chunk in enumerate(chunked(updates, chunk_size), start=1):
         # Check for cancel/pause
-        job_state = get_mp_job(job_id)
-        if job_state:
-            if job_state.get('cancel_requested'):
-                append_mp_job_log(job_id, "İşlem kullanıcı tarafından iptal edildi.", level='warning')
-                summary['message'] = f'İptal edildi. {processed_items}/{total_items} işlendi.'
-                summary['cancelled'] = True
-                return summary
-            
-            while job_state.get('pause_requested'):
-                append_mp_job_log(job_id, "Duraklatıldı. Devam etmesi bekleniyor...", level='info')
-                time.sleep(3)
-                job_state = get_mp_job(job_id)
-                if job_state.get('cancel_requested'):
-                    append_mp_job_log(job_id, "İşlem iptal edildi.", level='warning')
-                    summary['message'] = f'İptal edildi. {processed_items}/{total_items} işlendi.'
-                    summary['cancelled'] = True
-                    return summary
+        token = job_token(job_id)
+        if token.paused:
+            append_mp_job_log(job_id, "Duraklatıldı. Devam etmesi bekleniyor...", level='info')
+            token.wait_if_paused()
+        if token.cancelled:
+            append_mp_job_log(job_id, "İşlem kullanıcı tarafından iptal edildi.", level='warning')
+            summary['message'] = f'İptal edildi. {processed_items}/{total_items} işlendi.'
+            summary['cancelled'] = True
+            return summary
         
         # Update progress
         update_mp_job(job_id, progress={'current': processed_items, 'total': total_items, 'batch': f'{idx}/{total_chunks}'})
@@ -879,8 +863,7 @@ def perform_pazarama_sync_all(job_id: str, xml_source_id: Any, user_id: int = No
     append_mp_job_log(job_id, "Stok ve fiyat eşitleme başlatılıyor...")
     
     # Check cancel at start
-    job_state = get_mp_job(job_id)
-    if job_state and job_state.get('cancel_requested'):
+    if job_token(job_id).cancelled:
         append_mp_job_log(job_id, "İşlem iptal edildi.", level='warning')
         return {'success': False, 'message': 'İptal edildi.', 'cancelled': True}
     
@@ -888,8 +871,7 @@ def perform_pazarama_sync_all(job_id: str, xml_source_id: Any, user_id: int = No
         return stock_result
     
     # Check cancel again before price sync
-    job_state = get_mp_job(job_id)
-    if job_state and job_state.get('cancel_requested'):
+    if job_token(job_id).cancelled:
         append_mp_job_log(job_id, "İşlem iptal edildi (fiyat öncesi).", level='warning')
         stock_result['cancelled'] = True
         stock_result['message'] = 'İptal edildi. Sadece stok güncellendi.'
@@ -1033,18 +1015,13 @@ def perform_pazarama_send_products(job_id: str, barcodes: List[str], xml_source_
     
     for idx, barcode in enumerate(barcodes, 1):
         # Check for pause/cancel
-        job_state = get_mp_job(job_id)
-        if job_state:
-            if job_state.get('cancel_requested'):
-                append_mp_job_log(job_id, "Islem iptal edildi", level='warning')
-                break
-            
-            while job_state.get('pause_requested'):
-                append_mp_job_log(job_id, "Islem duraklatildi...", level='info')
-                time.sleep(5)
-                job_state = get_mp_job(job_id)
-                if job_state.get('cancel_requested'):
-                    break
+        token = job_token(job_id)
+        if token.paused:
+            append_mp_job_log(job_id, "Islem duraklatildi...", level='info')
+            token.wait_if_paused()
+        if token.cancelled:
+            append_mp_job_log(job_id, "Islem iptal edildi", level='warning')
+            break
         
         product = mp_map.get(barcode)
         if not product:
@@ -1336,22 +1313,13 @@ def perform_pazarama_send_products(job_id: str, barcodes: List[str], xml_source_
     
     for i in range(0, len(products_to_send), batch_size):
         # Check Job Status for Cancel/Pause
-        job_state = get_mp_job(job_id)
-        if job_state:
-            if job_state.get('cancel_requested'):
-                append_mp_job_log(job_id, "Islem kullanici tarafindan iptal edildi.", level='warning')
-                break
-            
-            while job_state.get('pause_requested'):
-                append_mp_job_log(job_id, "Islem duraklatildi. Devam etmesi bekleniyor...", level='info')
-                time.sleep(5)
-                job_state = get_mp_job(job_id)
-                if job_state.get('cancel_requested'):
-                    break
-            
-            if job_state.get('cancel_requested'):
-                append_mp_job_log(job_id, "Islem kullanici tarafindan iptal edildi.", level='warning')
-                break
+        token = job_token(job_id)
+        if token.paused:
+            append_mp_job_log(job_id, "Islem duraklatildi. Devam etmesi bekleniyor...", level='info')
+            token.wait_if_paused()
+        if token.cancelled:
+            append_mp_job_log(job_id, "Islem kullanici tarafindan iptal edildi.", level='warning')
+            break
         
         current_batch_num = (i // batch_size) + 1
         update_mp_job(job_id, progress={'current': success_count + fail_count, 'total': len(products_to_send), 'batch': f"{current_batch_num}/{total_batches}"})
@@ -1670,41 +1638,32 @@ def sync_pazarama_products(user_id: int, job_id: Optional[str] = None) -> Dict[s
             append_mp_job_log(job_id, f"Pazarama API'den {len(products)} ürün çekildi. Veritabanına işleniyor...")
 
         remote_barcodes = []
+        rows = []
+        now = datetime.now()
         for p in products:
             # Pazarama fields: 'code' is usually barcode/SellerCode
             barcode = p.get('code') or p.get('barcode', 'N/A')
             remote_barcodes.append(barcode)
             
-            existing = db.session.query(MarketplaceProduct).filter_by(
-                user_id=user_id, 
-                marketplace='pazarama', 
-                barcode=barcode
-            ).first()
-            
-            if not existing:
-                existing = MarketplaceProduct(
-                    user_id=user_id,
-                    marketplace='pazarama',
-                    barcode=barcode
-                )
-                db.session.add(existing)
-
-            existing.title = p.get('name', 'İsimsiz Ürün')
-            existing.quantity = int(p.get('stockCount', 0))
-            existing.price = float(p.get('listPrice', 0.0) or p.get('salePrice', 0.0))
-            existing.sale_price = float(p.get('salePrice', 0.0) or p.get('listPrice', 0.0))
-            existing.stock_code = p.get('code')
-            
             # Durum Eşitleme: Aktif / Pasif (1: Yayında, 2: Yayında Değil)
             state = p.get('state')
-            existing.status = 'Aktif' if state == 1 else 'Pasif'
-            existing.on_sale = (state == 1)
-            
-            # Images
-            imgs = p.get('images', [])
-            if imgs and isinstance(imgs, list):
-                 existing.image_url = imgs[0].get('url') if isinstance(imgs[0], dict) else imgs[0]
+            rows.append({
+                'user_id': user_id,
+                'marketplace': 'pazarama',
+                'barcode': barcode,
+                'title': p.get('name', 'İsimsiz Ürün'),
+                'quantity': int(p.get('stockCount', 0)),
+                'price': float(p.get('listPrice', 0.0) or p.get('salePrice', 0.0)),
+                'sale_price': float(p.get('salePrice', 0.0) or p.get('listPrice', 0.0)),
+                'stock_code': p.get('code'),
+                'status': 'Aktif' if state == 1 else 'Pasif',
+                'on_sale': (state == 1),
+                'last_sync_at': now,
+            })
 
+        # Single set-based upsert (COPY + merge on PostgreSQL) instead of a SELECT per product
+        from app.services.bulk_loader import bulk_upsert
+        bulk_upsert(MarketplaceProduct, rows, conflict_cols=('user_id', 'marketplace', 'barcode'))
         db.session.commit()
         
         # Cleanup
@@ -1783,7 +1742,7 @@ def perform_pazarama_direct_push_actions(user_id: int, to_update: List[Any], to_
     import json
     from datetime import datetime
     from app.services.job_queue import append_mp_job_log, append_mp_job_logs, get_mp_job, update_mp_job, update_job_progress
-    from app.utils.helpers import calculate_price, chunked
+    from app.utils.helpers import calculate_prices, chunked
     from app.models import MarketplaceProduct, db
     
     client = get_pazarama_client(user_id=user_id)
@@ -1803,15 +1762,14 @@ def perform_pazarama_direct_push_actions(user_id: int, to_update: List[Any], to_
         db_mappings = []
         batch_logs = []
         
-        for xml_item, local_item in to_update:
+        update_prices, update_rules = calculate_prices([x.price for x, _ in to_update], 'pazarama', user_id=user_id, return_details=True)
+        for (xml_item, local_item), final_price, rule_desc in zip(to_update, update_prices.tolist(), update_rules):
             # Periodic cancel check
             if len(db_mappings) % 50 == 0 and job_id:
-                js = get_mp_job(job_id)
-                if js and js.get('cancel_requested'):
+                if job_token(job_id).cancelled:
                     append_mp_job_log(job_id, "İşlem kullanıcı tarafından iptal edildi.", level='warning')
                     return res
             
-            final_price, rule_desc = calculate_price(xml_item.price, 'pazarama', user_id=user_id, return_details=True)
             
             update_payloads_stock.append({"code": local_item.stock_code, "stockCount": xml_item.quantity})
             update_payloads_price.append({"code": local_item.stock_code, "listPrice": final_price, "salePrice": final_price})
@@ -1832,8 +1790,7 @@ def perform_pazarama_direct_push_actions(user_id: int, to_update: List[Any], to_
         try:
             for i, batch_stock in enumerate(chunked(update_payloads_stock, 100)):
                 if job_id and i % 5 == 0:
-                    js = get_mp_job(job_id)
-                    if js and js.get('cancel_requested'):
+                    if job_token(job_id).cancelled:
                         append_mp_job_log(job_id, "İptal edildi (Batch sırasında)", level='warning')
                         return res
                 
@@ -1872,10 +1829,10 @@ def perform_pazarama_direct_push_actions(user_id: int, to_update: List[Any], to_
         default_brand_id = Setting.get("PAZARAMA_BRAND_ID", user_id=user_id)
  
         valid_creates = []
-        for xml_item in to_create:
+        create_prices, create_rules = calculate_prices([x.price for x in to_create], 'pazarama', user_id=user_id, return_details=True)
+        for xml_item, final_price, rule_desc in zip(to_create, create_prices.tolist(), create_rules):
             if len(valid_creates) % 50 == 0 and job_id:
-                js = get_mp_job(job_id)
-                if js and js.get('cancel_requested'):
+                if job_token(job_id).cancelled:
                     append_mp_job_log(job_id, "İşlem kullanıcı tarafından iptal edildi.", level='warning')
                     return res
             
@@ -1894,7 +1851,6 @@ def perform_pazarama_direct_push_actions(user_id: int, to_update: List[Any], to_
             if not brand_id or not cat_id:
                 continue # Silent skip
  
-            final_price, rule_desc = calculate_price(xml_item.price, 'pazarama', user_id=user_id, return_details=True)
             final_price = round(final_price, 2)
             
             item_payload = {
@@ -1913,11 +1869,13 @@ def perform_pazarama_direct_push_actions(user_id: int, to_update: List[Any], to_
             }
             valid_creates.append((item_payload, xml_item, rule_desc))
 
+        # Left out above (no match / invalid barcode), reported apart from failed batches
+        res['skipped_count'] = len(to_create) - len(valid_creates)
+
         # API Chunks
         for batch in chunked(valid_creates, 20):
             if job_id:
-                js = get_mp_job(job_id)
-                if js and js.get('cancel_requested'):
+                if job_token(job_id).cancelled:
                     append_mp_job_log(job_id, "İptal edildi (Create sırasında)", level='warning')
                     return res
  
@@ -1966,8 +1924,7 @@ def perform_pazarama_direct_push_actions(user_id: int, to_update: List[Any], to_
         for local_item in to_zero:
             # Periodic cancel check
             if len(zero_payloads) % 50 == 0 and job_id:
-                js = get_mp_job(job_id)
-                if js and js.get('cancel_requested'):
+                if job_token(job_id).cancelled:
                     append_mp_job_log(job_id, "İşlem kullanıcı tarafından iptal edildi.", level='warning')
                     return res
             
@@ -1981,8 +1938,7 @@ def perform_pazarama_direct_push_actions(user_id: int, to_update: List[Any], to_
         try:
             for i, batch in enumerate(chunked(zero_payloads, 100)):
                 if job_id and i % 5 == 0:
-                    js = get_mp_job(job_id)
-                    if js and js.get('cancel_requested'):
+                    if job_token(job_id).cancelled:
                         append_mp_job_log(job_id, "İptal edildi (Zero sırasında)", level='warning')
                         return res
                 
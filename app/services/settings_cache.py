@@ -0,0 +1,178 @@
+"""
+Setting.get için süreç içi önbellek.
+Setting.get her çağrıda bir sorgu atıyordu; sıcak döngülerde (ürün başına barkod ayarları, satır
+başına Excel eşlemeleri, her get_*_client çağrısında kimlik bilgileri) bu binlerce sorgu demekti.
+Bir kullanıcının ayarları artık tek sorguda belleğe alınır ve setting_versions tablosundaki sürüm
+numarasıyla doğrulanır:
+- sürüm en fazla SETTINGS_CACHE_REVALIDATE_SECONDS aralıkla (web isteğinde istek başına bir kez)
+  tek satırlık bir sorguyla kontrol edilir; değişmişse ayarlar yeniden yüklenir,
+- Setting.set sürümü artırır (diğer worker'lar bir sonraki kontrolde görür) ve bu süreçteki
+  kopyayı hemen düşürür,
+- SETTINGS_CACHE_MAX_VALUE_BYTES'tan büyük değerler (marka / kategori önbellekleri) belleğe
+  alınmaz, eskisi gibi istendiğinde okunur.
+Sorgular oturumdan bağımsız kısa bir bağlantıyla yapılır; hata olursa (ör. tablo henüz yok)
+SETTINGS_CACHE_RETRY_SECONDS boyunca eski doğrudan sorguya dönülür.
+"""
+import os
+import time
+import logging
+import threading
+from typing import Any, Dict, Optional, Set
+
+from sqlalchemy import func, or_, select, update
+
+logger = logging.getLogger(__name__)
+
+SETTINGS_CACHE_ENABLED = os.environ.get('SETTINGS_CACHE', '1').lower() in ('1', 'true', 'yes')
+SETTINGS_CACHE_REVALIDATE_SECONDS = float(os.environ.get('SETTINGS_CACHE_REVALIDATE_SECONDS', '2'))
+SETTINGS_CACHE_MAX_VALUE_BYTES = int(os.environ.get('SETTINGS_CACHE_MAX_VALUE_BYTES', '65536'))
+SETTINGS_CACHE_RETRY_SECONDS = 60  # after an error (e.g. table not created yet) plain queries are used meanwhile
+
+_MISSING = object()
+
+
+def _scope(user_id: Optional[int]) -> int:
+    return int(user_id) if user_id is not None else 0  # 0: global settings (user_id NULL)
+
+
+class _Snapshot:
+    __slots__ = ('version', 'checked_at', 'values', 'large')
+
+    def __init__(self, version: int, values: Dict[str, Any], large: Set[str]):
+        self.version = version
+        self.checked_at = time.monotonic()
+        self.values = values
+        self.large = large
+
+
+class SettingsCache:
+    """Settings of each user in memory, validated against the setting_versions counter."""
+
+    def __init__(self, enabled: bool = SETTINGS_CACHE_ENABLED):
+        self.enabled = enabled
+        self._snapshots: Dict[int, _Snapshot] = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'loads': 0, 'checks': 0}
+        self._suspended_until = 0.0
+
+    def usable(self) -> bool:
+        return self.enabled and time.monotonic() >= self._suspended_until
+
+    def suspend(self, error: Exception) -> None:
+        self._suspended_until = time.monotonic() + SETTINGS_CACHE_RETRY_SECONDS
+        logger.warning("Settings cache unavailable for %ss: %s", SETTINGS_CACHE_RETRY_SECONDS, error)
+
+    def get(self, key: str, default: Any = None, user_id: Optional[int] = None) -> Any:
+        """Value of key for user_id (default if unset); raises if the cache is unusable."""
+        snap = self._snapshot(user_id)
+        value = snap.values.get(key, _MISSING)
+        if value is not _MISSING:
+            self._stats['hits'] += 1
+            return value
+        if key in snap.large:
+            return self._read_one(key, user_id, default)
+        return default
+
+    def written(self, user_id: Optional[int]) -> None:
+        """After Setting.set / bulk changes: bump the shared version and drop the local copy."""
+        scope = _scope(user_id)
+        with self._lock:
+            self._snapshots.pop(scope, None)
+        try:
+            self._bump(scope)
+        except Exception as e:
+            logger.warning("Setting version bump failed (%s): %s", scope, e)
+
+    def invalidate(self, user_id: Optional[int] = None, all_users: bool = False) -> None:
+        with self._lock:
+            if all_users:
+                self._snapshots.clear()
+            else:
+                self._snapshots.pop(_scope(user_id), None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, cached=len(self._snapshots))
+
+    def _snapshot(self, user_id: Optional[int]) -> _Snapshot:
+        scope = _scope(user_id)
+        with self._lock:
+            snap = self._snapshots.get(scope)
+        now = time.monotonic()
+        if snap is not None and (now - snap.checked_at < SETTINGS_CACHE_REVALIDATE_SECONDS or _seen_in_request(scope)):
+            return snap
+        # Version first: a write committed after this read makes the next check reload again
+        version = self._read_version(scope)
+        self._stats['checks'] += 1
+        if snap is None or snap.version != version:
+            snap = self._load(user_id, version)
+            self._stats['loads'] += 1
+        else:
+            snap.checked_at = now
+        with self._lock:
+            self._snapshots[scope] = snap
+        _mark_request(scope)
+        return snap
+
+    def _read_version(self, scope: int) -> int:
+        from app import db
+        from app.models.settings import SettingVersion
+
+        with db.engine.connect() as conn:
+            version = conn.execute(select(SettingVersion.version).where(SettingVersion.scope == scope)).scalar()
+        return int(version or 0)
+
+    def _load(self, user_id: Optional[int], version: int) -> _Snapshot:
+        from app import db
+        from app.models.settings import Setting
+
+        table = Setting.__table__
+        small = or_(table.c.value.is_(None), func.length(table.c.value) <= SETTINGS_CACHE_MAX_VALUE_BYTES)
+        owner = table.c.user_id.is_(None) if user_id is None else table.c.user_id == user_id
+        with db.engine.connect() as conn:
+            values = dict(conn.execute(select(table.c.key, table.c.value).where(owner, small)).all())
+            large = set(conn.execute(select(table.c.key).where(owner, ~small)).scalars())
+        return _Snapshot(version, values, large)
+
+    def _read_one(self, key: str, user_id: Optional[int], default: Any) -> Any:
+        from app.models.settings import Setting
+
+        s = Setting.query.filter_by(key=key, user_id=user_id).first()
+        return s.value if s else default
+
+    def _bump(self, scope: int) -> None:
+        from app import db
+        from app.models.settings import SettingVersion
+
+        table = SettingVersion.__table__
+        with db.engine.begin() as conn:
+            dialect = conn.dialect.name
+            if dialect in ('postgresql', 'sqlite'):
+                if dialect == 'postgresql':
+                    from sqlalchemy.dialects.postgresql import insert
+                else:
+                    from sqlalchemy.dialects.sqlite import insert
+                conn.execute(insert(table).values(scope=scope, version=1).on_conflict_do_update(
+                    index_elements=[table.c.scope], set_={'version': table.c.version + 1}))
+            elif not conn.execute(update(table).where(table.c.scope == scope)
+                                  .values(version=table.c.version + 1)).rowcount:
+                conn.execute(table.insert().values(scope=scope, version=1))
+
+
+def _seen_in_request(scope: int) -> bool:
+    """Already validated during the current web request (one consistent view per request)."""
+    from flask import g, has_request_context
+
+    return has_request_context() and scope in g.get('_settings_cache_seen', ())
+
+
+def _mark_request(scope: int) -> None:
+    from flask import g, has_request_context
+
+    if has_request_context():
+        if '_settings_cache_seen' not in g:
+            g._settings_cache_seen = set()
+        g._settings_cache_seen.add(scope)
+
+
+SETTINGS_CACHE = SettingsCache()
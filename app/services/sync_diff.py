@@ -0,0 +1,315 @@
+"""
+Direct Push senkronizasyonu için sütunsal fark (diff) motoru.
+perform_sync her CachedXmlProduct satırını raw_data ile birlikte çekip json.loads + SimpleNamespace
+ile açıyor, ardından sözlükler üzerinde Python döngüsüyle fiyat/stok karşılaştırıyordu.
+compute_diff yalnızca stock_code / price / quantity / xml_source_id sütunlarını NumPy dizilerine
+alır. Stok kodları 64 bit özetlerle sıralanıp searchsorted ile eşlenir (eşleşmeler metin olarak
+doğrulanır). Güncelleme / yeni / sıfırlama kümeleri vektörel hesaplanır. raw_data yalnızca yeni
+oluşturulacak (to_create) satırlar için, parça parça yüklenir (hydrate_xml_items).
+DIRECT_SYNC_DIFF_BACKEND='sql' ise fark veritabanında hesaplanır (compute_diff_sql): iki tablo
+(user_id, marketplace, stock_code) üzerinden birleştirilir ve worker'a yalnızca farklı satırlar gelir.
+PostgreSQL'de FULL OUTER JOIN, SQLite'ta LEFT JOIN + UNION ALL kullanılır.
+"""
+import json
+import logging
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from sqlalchemy import text
+
+from app import db
+from app.models import CachedXmlProduct, MarketplaceProduct
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+HYDRATE_CHUNK_SIZE = 500
+SQL_DIFF_FETCH_SIZE = 1000
+DIFF_BACKENDS = ('columnar', 'sql')
+
+
+class SyncDiff:
+    """update / create / zero sets of one marketplace against one XML source."""
+
+    def __init__(self, to_update: List[Tuple[Any, Any]], to_create: List[Any], to_zero: List[Any], xml_count: int):
+        self.to_update = to_update  # (xml_item, local_item); xml_item carries stock_code/price/quantity
+        self.to_create = to_create  # xml_item with every raw_data field (hydrated)
+        self.to_zero = to_zero      # local_item
+        self.xml_count = xml_count
+
+
+def _floats(values: Sequence[Any]) -> np.ndarray:
+    """Column -> float64 with NaN for NULL (quantities stay exact up to 2**53)."""
+    return np.fromiter((np.nan if v is None else v for v in values), dtype=np.float64, count=len(values))
+
+
+def _differs(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # Python `!=` semantics: None == None, None != 0
+    return ~((a == b) | (np.isnan(a) & np.isnan(b)))
+
+
+def _key_hashes(codes: Sequence[str]) -> np.ndarray:
+    return np.fromiter((hash(c) for c in codes), dtype=np.int64, count=len(codes))
+
+
+def diff_columns(
+    xml_codes: Sequence[str], xml_price: np.ndarray, xml_qty: np.ndarray,
+    local_codes: Sequence[str], local_price: np.ndarray, local_qty: np.ndarray, local_source: np.ndarray,
+    xml_source_id: int,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Vectorised diff on columns. Returns (update_xml_idx, update_local_idx, create_xml_idx, zero_local_idx),
+    each in input order. XML stock codes are unique per source; for duplicated local codes the last row wins.
+    """
+    n_local = len(local_codes)
+    local_hash = _key_hashes(local_codes)
+    # Last occurrence of every local code (dict semantics of the previous implementation)
+    _, first_in_reversed = np.unique(local_hash[::-1], return_index=True)
+    local_keep = np.sort(n_local - 1 - first_in_reversed)
+
+    xml_hash = _key_hashes(xml_codes)
+    xml_order = np.argsort(xml_hash, kind='stable')
+    xml_sorted = xml_hash[xml_order]
+
+    kept_hash = local_hash[local_keep]
+    pos = np.searchsorted(xml_sorted, kept_hash)
+    pos_clipped = np.minimum(pos, max(len(xml_sorted) - 1, 0))
+    found = (pos < len(xml_sorted)) & (xml_sorted[pos_clipped] == kept_hash) if len(xml_sorted) else np.zeros(len(kept_hash), bool)
+    match_xml = np.where(found, xml_order[pos_clipped] if len(xml_order) else 0, -1)
+    # Hash matches are confirmed on the codes themselves
+    hit = np.flatnonzero(found)
+    if len(hit):
+        xml_keys = np.asarray(xml_codes, dtype=object)
+        local_keys = np.asarray(local_codes, dtype=object)
+        found[hit[xml_keys[match_xml[hit]] != local_keys[local_keep[hit]]]] = False
+
+    m_local = local_keep[found]
+    m_xml = match_xml[found]
+    changed = (_differs(xml_qty[m_xml], local_qty[m_local])
+               | _differs(xml_price[m_xml], local_price[m_local])
+               | (local_source[m_local] != xml_source_id))  # NaN (no owner) counts as a change
+    order = np.argsort(m_xml[changed], kind='stable')
+    update_xml = m_xml[changed][order]
+    update_local = m_local[changed][order]
+
+    has_local = np.zeros(len(xml_codes), dtype=bool)
+    has_local[m_xml] = True
+    create_xml = np.flatnonzero(~has_local)
+
+    unmatched = local_keep[~found]
+    # Only rows owned by this source are zeroed; NULL owner is legacy data and left alone
+    zero_mask = (np.nan_to_num(local_qty[unmatched], nan=0.0) > 0) & (local_source[unmatched] == xml_source_id)
+    zero_local = unmatched[zero_mask]
+    return update_xml, update_local, create_xml, zero_local
+
+
+def compute_diff(marketplace: str, user_id: int, xml_source_id: int, backend: Optional[str] = None,
+                 stock_codes: Optional[Iterable[str]] = None) -> SyncDiff:
+    """
+    Diff the XML cache of a source against the user's local marketplace rows.
+    With stock_codes only those codes are compared (incremental sync; always columnar, the set is small).
+    """
+    if stock_codes is not None:
+        return compute_diff_columnar(marketplace, user_id, xml_source_id, stock_codes=stock_codes)
+    backend = (backend or Config.DIRECT_SYNC_DIFF_BACKEND or 'columnar').lower()
+    if backend == 'sql':
+        return compute_diff_sql(marketplace, user_id, xml_source_id)
+    if backend != 'columnar':
+        logger.warning("Unknown diff backend %r, using columnar", backend)
+    return compute_diff_columnar(marketplace, user_id, xml_source_id)
+
+
+def compute_diff_columnar(marketplace: str, user_id: int, xml_source_id: int,
+                          stock_codes: Optional[Iterable[str]] = None) -> SyncDiff:
+    """Diff with NumPy on the narrow columns of both sides (optionally only for stock_codes)."""
+    xml_query = db.session.query(
+        CachedXmlProduct.stock_code,
+        CachedXmlProduct.price,
+        CachedXmlProduct.quantity,
+    ).filter(CachedXmlProduct.xml_source_id == xml_source_id)
+
+    local_query = db.session.query(
+        MarketplaceProduct.id,
+        MarketplaceProduct.stock_code,
+        MarketplaceProduct.barcode,
+        MarketplaceProduct.quantity,
+        MarketplaceProduct.price,
+        MarketplaceProduct.sale_price,
+        MarketplaceProduct.xml_source_id
+    ).filter_by(user_id=user_id, marketplace=marketplace)
+
+    if stock_codes is None:
+        xml_rows = xml_query.all()
+        local_rows = local_query.all()
+        xml_count = None
+    else:
+        xml_rows, local_rows = [], []
+        codes = sorted({sc for sc in stock_codes if sc})
+        for start in range(0, len(codes), HYDRATE_CHUNK_SIZE):
+            chunk = codes[start:start + HYDRATE_CHUNK_SIZE]
+            xml_rows.extend(xml_query.filter(CachedXmlProduct.stock_code.in_(chunk)).all())
+            # Duplicated codes fall in the same chunk; by id so the newest row wins
+            local_rows.extend(local_query.filter(MarketplaceProduct.stock_code.in_(chunk))
+                              .order_by(MarketplaceProduct.id).all())
+        xml_count = _xml_count(xml_source_id)
+    xml_rows = [r for r in xml_rows if r.stock_code]
+    local_rows = [r for r in local_rows if r.stock_code]
+    if xml_count is None:
+        xml_count = len(xml_rows)
+
+    if not xml_count or not (xml_rows or local_rows):
+        return SyncDiff([], [], [], xml_count)
+
+    xml_codes, xml_price, xml_qty = zip(*xml_rows) if xml_rows else ((), (), ())
+    if local_rows:
+        _, local_codes, _, local_qty, local_price, _, local_source = zip(*local_rows)
+    else:
+        local_codes = local_qty = local_price = local_source = ()
+
+    update_xml, update_local, create_xml, zero_local = diff_columns(
+        xml_codes, _floats(xml_price), _floats(xml_qty),
+        local_codes, _floats(local_price), _floats(local_qty), _floats(local_source),
+        xml_source_id,
+    )
+
+    to_update = [
+        (SimpleNamespace(stock_code=xml_codes[x], price=xml_price[x], quantity=xml_qty[x]), local_rows[l])
+        for x, l in zip(update_xml.tolist(), update_local.tolist())
+    ]
+    to_create = hydrate_xml_items(xml_source_id, [xml_codes[x] for x in create_xml.tolist()])
+    to_zero = [local_rows[l] for l in zero_local.tolist()]
+    return SyncDiff(to_update, to_create, to_zero, xml_count)
+
+
+_SQL_XML_ROWS = """(
+    SELECT id, stock_code, price, quantity
+    FROM cached_xml_products
+    WHERE xml_source_id = :src AND stock_code <> ''
+)"""
+
+# One row per stock code (highest id wins for duplicates), same filters as the columnar diff
+_SQL_LOCAL_ROWS = """(
+    SELECT m.id, m.stock_code, m.barcode, m.quantity, m.price, m.sale_price, m.xml_source_id
+    FROM marketplace_products m
+    JOIN (
+        SELECT MAX(id) AS id FROM marketplace_products
+        WHERE user_id = :uid AND marketplace = :mp AND stock_code IS NOT NULL AND stock_code <> ''
+        GROUP BY stock_code
+    ) latest ON latest.id = m.id
+)"""
+
+_SQL_DIFF_COLUMNS = """
+    x.id AS x_id, x.stock_code AS x_code, x.price AS x_price, x.quantity AS x_qty,
+    l.id AS l_id, l.stock_code AS l_code, l.barcode AS l_barcode, l.quantity AS l_qty,
+    l.price AS l_price, l.sale_price AS l_sale_price, l.xml_source_id AS l_source
+"""
+
+# Changed: NULL-safe inequality on price / quantity / owner (Python `!=` semantics)
+_SQL_DIFF_QUERY_POSTGRES = f"""
+SELECT {_SQL_DIFF_COLUMNS}
+FROM {_SQL_XML_ROWS} x FULL OUTER JOIN {_SQL_LOCAL_ROWS} l ON l.stock_code = x.stock_code
+WHERE l.id IS NULL
+   OR (x.id IS NULL AND l.quantity > 0 AND l.xml_source_id = :src)
+   OR (x.id IS NOT NULL AND l.id IS NOT NULL AND (
+        x.quantity IS DISTINCT FROM l.quantity
+        OR x.price IS DISTINCT FROM l.price
+        OR l.xml_source_id IS DISTINCT FROM :src))
+"""
+
+# SQLite before 3.39 has no FULL OUTER JOIN; `IS NOT` is its NULL-safe inequality. The row sets are
+# repeated per branch rather than shared through a CTE, which SQLite would scan without an index.
+_SQL_DIFF_QUERY_SQLITE = f"""
+SELECT {_SQL_DIFF_COLUMNS}
+FROM {_SQL_XML_ROWS} x LEFT JOIN {_SQL_LOCAL_ROWS} l ON l.stock_code = x.stock_code
+WHERE l.id IS NULL
+   OR x.quantity IS NOT l.quantity
+   OR x.price IS NOT l.price
+   OR l.xml_source_id IS NOT :src
+UNION ALL
+SELECT {_SQL_DIFF_COLUMNS}
+FROM {_SQL_LOCAL_ROWS} l LEFT JOIN {_SQL_XML_ROWS} x ON x.stock_code = l.stock_code
+WHERE x.id IS NULL AND l.quantity > 0 AND l.xml_source_id = :src
+"""
+
+
+def _xml_count(xml_source_id: int) -> int:
+    return db.session.query(db.func.count(CachedXmlProduct.id)).filter(
+        CachedXmlProduct.xml_source_id == xml_source_id,
+        CachedXmlProduct.stock_code != '',
+    ).scalar() or 0
+
+
+def compute_diff_sql(marketplace: str, user_id: int, xml_source_id: int) -> SyncDiff:
+    """Diff inside the database; only differing rows are streamed back."""
+    xml_count = _xml_count(xml_source_id)
+    if not xml_count:
+        return SyncDiff([], [], [], 0)
+
+    dialect = db.session.get_bind().dialect.name
+    query = _SQL_DIFF_QUERY_POSTGRES if dialect == 'postgresql' else _SQL_DIFF_QUERY_SQLITE
+    result = db.session.execute(
+        text(query).execution_options(stream_results=True),
+        {'src': xml_source_id, 'uid': user_id, 'mp': marketplace},
+    )
+    updates, creates, zeros = [], [], []
+    for rows in result.partitions(SQL_DIFF_FETCH_SIZE):
+        for r in rows:
+            if r.l_id is None:
+                creates.append((r.x_id, r.x_code))
+                continue
+            local_item = SimpleNamespace(id=r.l_id, stock_code=r.l_code, barcode=r.l_barcode, quantity=r.l_qty,
+                                         price=r.l_price, sale_price=r.l_sale_price, xml_source_id=r.l_source)
+            if r.x_id is None:
+                zeros.append(local_item)
+            else:
+                xml_item = SimpleNamespace(stock_code=r.x_code, price=r.x_price, quantity=r.x_qty)
+                updates.append((r.x_id, xml_item, local_item))
+
+    # Same order as the columnar diff: XML rows by id, local rows by id
+    updates.sort(key=lambda u: u[0])
+    creates.sort()
+    zeros.sort(key=lambda z: z.id)
+    to_create = hydrate_xml_items(xml_source_id, [code for _, code in creates])
+    return SyncDiff([(x, l) for _, x, l in updates], to_create, zeros, xml_count)
+
+
+def hydrate_xml_items(xml_source_id: int, stock_codes: Iterable[str]) -> List[SimpleNamespace]:
+    """Full XML items (raw_data fields as attributes) for the given codes, in the given order."""
+    stock_codes = list(stock_codes)
+    items: Dict[str, SimpleNamespace] = {}
+    for start in range(0, len(stock_codes), HYDRATE_CHUNK_SIZE):
+        chunk = stock_codes[start:start + HYDRATE_CHUNK_SIZE]
+        rows = db.session.query(
+            CachedXmlProduct.stock_code,
+            CachedXmlProduct.price,
+            CachedXmlProduct.quantity,
+            CachedXmlProduct.barcode,
+            CachedXmlProduct.title,
+            CachedXmlProduct.raw_data
+        ).filter(CachedXmlProduct.xml_source_id == xml_source_id,
+                 CachedXmlProduct.stock_code.in_(chunk)).all()
+        for p in rows:
+            item = _xml_item(p)
+            if item is not None:
+                items[p.stock_code] = item
+    return [items[sc] for sc in stock_codes if sc in items]
+
+
+def _xml_item(p) -> Optional[SimpleNamespace]:
+    try:
+        # Raw data as attributes (p.images etc.) for the marketplace services
+        raw_dict = json.loads(p.raw_data) if p.raw_data else {}
+        ns = SimpleNamespace(**raw_dict)
+        # The cleaned column values win over raw_data
+        ns.stock_code = p.stock_code
+        ns.price = p.price
+        ns.quantity = p.quantity
+        ns.barcode = p.barcode
+        ns.title = p.title
+        ns.raw_data = p.raw_data  # services re-parse it
+        return ns
+    except Exception as e:
+        logger.warning(f"XML data parse error for {p.stock_code}: {e}")
+        return None
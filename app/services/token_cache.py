@@ -0,0 +1,157 @@
+"""
+Pazaryeri OAuth token'ları için süreç geneli önbellek.
+PazaramaClient token'ı yalnızca kendi örneğinde tutuyordu; her yeni istemci işe bir token isteğiyle
+başlıyordu. Token'lar artık kimlik bilgisi özetine göre süreç genelinde tutulur:
+- süresi dolmadan TOKEN_REFRESH_AHEAD_SECONDS (kısa ömürlü token'da ömrünün yarısı) önce tek bir
+  thread yeniler, diğerleri eski (hâlâ geçerli) token'la devam eder; süresi dolmuşsa hepsi aynı yenilemeyi bekler (single-flight),
+- 401 alan istemci invalidate() ile yalnızca elindeki token'ı düşürür,
+- TOKEN_CACHE_BACKEND='file' ise token TOKEN_CACHE_DIR altındaki (0600) dosyada worker'lar arasında
+  paylaşılır ve yenileme flock ile süreçler arasında da tekilleştirilir.
+"""
+import os
+import re
+import json
+import time
+import logging
+import tempfile
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: per-process cache only
+    fcntl = None
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+TOKEN_REFRESH_AHEAD_SECONDS = float(os.environ.get('TOKEN_REFRESH_AHEAD_SECONDS', '120'))
+
+# fetch() -> (token, expires_in seconds)
+TokenFetcher = Callable[[], Tuple[str, float]]
+
+
+class _Entry:
+    __slots__ = ('token', 'expires_at', 'refresh_at')
+
+    def __init__(self, token: str, expires_at: float, refresh_at: float):
+        self.token = token
+        self.expires_at = expires_at  # wall clock (shared through the file backend)
+        self.refresh_at = refresh_at
+
+
+class TokenCache:
+    """Tokens by credential key with proactive, single-flight refresh."""
+
+    def __init__(self, backend: str = Config.TOKEN_CACHE_BACKEND, directory: Optional[str] = None):
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self._refresh_locks: Dict[str, threading.Lock] = {}
+        self._directory = None
+        if backend == 'file' and fcntl is not None:
+            self._directory = directory or Config.TOKEN_CACHE_DIR or os.path.join(tempfile.gettempdir(), 'vidos_tokens')
+            os.makedirs(self._directory, mode=0o700, exist_ok=True)
+
+    def get(self, key: str, fetch: TokenFetcher) -> str:
+        """Valid token for key, fetching (once, for all waiting threads) when missing or about to expire."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            refresh_lock = self._refresh_locks.setdefault(key, threading.Lock())
+        if entry is None:
+            entry = self._load(key)
+        if entry is not None and now < entry.refresh_at:
+            return entry.token
+
+        if entry is not None and now < entry.expires_at:
+            # Still valid: one thread refreshes ahead of expiry, the others keep using this token
+            if not refresh_lock.acquire(blocking=False):
+                return entry.token
+        else:
+            refresh_lock.acquire()
+        try:
+            # Another thread (or worker) may have refreshed while we waited
+            current = self._entries.get(key) or self._load(key)
+            if current is not None and current is not entry and time.time() < current.refresh_at:
+                return current.token
+            return self._refresh(key, fetch, entry).token
+        finally:
+            refresh_lock.release()
+
+    def invalidate(self, key: str, token: Optional[str] = None) -> None:
+        """Drop the cached token (only if it is still `token`, so a 401 on a stale token keeps a fresh one)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (token is None or entry.token == token):
+                del self._entries[key]
+        if self._directory is not None:
+            stored = self._load(key)
+            if stored is not None and (token is None or stored.token == token):
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+
+    def _refresh(self, key: str, fetch: TokenFetcher, stale: Optional[_Entry]) -> _Entry:
+        if self._directory is None:
+            return self._store(key, fetch())
+        # Cross-worker single flight: the first worker fetches, the others find its token on disk
+        with open(self._path(key) + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                stored = self._load(key)
+                if stored is not None and (stale is None or stored.token != stale.token) \
+                        and time.time() < stored.refresh_at:
+                    with self._lock:
+                        self._entries[key] = stored
+                    return stored
+                entry = self._store(key, fetch())
+                self._save(key, entry)
+                return entry
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _store(self, key: str, fetched: Tuple[str, float]) -> _Entry:
+        token, expires_in = fetched
+        now = time.time()
+        lifetime = float(expires_in)
+        # Short-lived tokens would be "about to expire" from the start: refresh at half-life at the earliest
+        entry = _Entry(token, now + lifetime, now + lifetime - min(TOKEN_REFRESH_AHEAD_SECONDS, lifetime / 2))
+        with self._lock:
+            self._entries[key] = entry
+        return entry
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory, re.sub(r'[^A-Za-z0-9_.-]', '_', key) + '.token')
+
+    def _load(self, key: str) -> Optional[_Entry]:
+        if self._directory is None:
+            return None
+        try:
+            with open(self._path(key)) as f:
+                data = json.load(f)
+            expires_at = float(data['expires_at'])
+            entry = _Entry(data['token'], expires_at,
+                           float(data.get('refresh_at', expires_at - TOKEN_REFRESH_AHEAD_SECONDS)))
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        if time.time() >= entry.expires_at:
+            return None
+        with self._lock:
+            self._entries[key] = entry
+        return entry
+
+    def _save(self, key: str, entry: _Entry) -> None:
+        path = self._path(key)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        try:
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'token': entry.token, 'expires_at': entry.expires_at, 'refresh_at': entry.refresh_at}, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning("Token cache write failed (%s): %s", key, e)
+
+
+TOKEN_CACHE = TokenCache()
@@ -6,9 +6,12 @@ import requests
 from typing import List, Dict, Any, Optional
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
-from app.utils.rate_limiter import trendyol_limiter
+from app.utils.rate_limiter import trendyol_limiter, credential_key
+from app.utils.pagination import fetch_pages, PagedFetch
 
 DEFAULT_TIMEOUT = 20
+# 429s are retried here, after the limiter bucket has paused (urllib3 must not retry them itself)
+RATE_LIMIT_RETRIES = 4
 BATCH_SLEEP_SECONDS = 5
 
 class TrendyolClient:
@@ -18,11 +21,19 @@ class TrendyolClient:
         self.timeout = timeout
         self.session = requests.Session()
         
-        # Patch session.request to use rate limiter
+        # Patch session.request to use rate limiter (one bucket per seller, 429s slow that bucket down)
+        self._limiter_key = credential_key(self.seller_id)
         original_request = self.session.request
         def rate_limited_request(method, url, *args, **kwargs):
-            trendyol_limiter.wait()
-            return original_request(method, url, *args, **kwargs)
+            for attempt in range(RATE_LIMIT_RETRIES + 1):
+                trendyol_limiter.wait(self._limiter_key)
+                response = original_request(method, url, *args, **kwargs)
+                trendyol_limiter.feedback(self._limiter_key, response)
+                if response.status_code != 429 or attempt == RATE_LIMIT_RETRIES:
+                    return response
+                # The bucket is paused now (Retry-After or backoff); wait() above sleeps it out
+                response.close()
+            return response
         self.session.request = rate_limited_request
 
         # Default headers (browser-like) to reduce WAF friction
@@ -41,7 +52,8 @@ class TrendyolClient:
             "Origin": "https://partner.trendyol.com",
             "Referer": "https://partner.trendyol.com/"
         })
-        retry = Retry(total=5, backoff_factor=1, status_forcelist=(500, 502, 503, 504, 429))
+        # No 429 here: it has to reach trendyol_limiter.feedback() so the seller's bucket pauses
+        retry = Retry(total=5, backoff_factor=1, status_forcelist=(500, 502, 503, 504))
         adapter = HTTPAdapter(max_retries=retry)
         self.session.mount("http://", adapter)
         self.session.mount("https://", adapter)
@@ -315,6 +327,20 @@ class TrendyolClient:
                 print(f"[TRENDYOL AUTH ERROR] Response: {e.response.text}")
             raise e
 
+    def list_all_products(self, size: int = 100, concurrency: Optional[int] = None, on_progress=None,
+                          should_stop=None, **filters: Any) -> PagedFetch:
+        """Every page of list_products; pages after the first are fetched concurrently once totalElements is known."""
+        return fetch_pages(
+            lambda page: self.list_products(page=page, size=size, **filters),
+            lambda resp: resp.get('content') or [],
+            page_size=size,
+            first_page=0,
+            total_of=lambda resp: resp.get('totalElements'),
+            concurrency=concurrency,
+            on_progress=on_progress,
+            should_stop=should_stop,
+        )
+
     def get_shipment_packages(self, status: Optional[str] = None, page: int = 0, size: int = 50, order_number: Optional[str] = None, start_date: Optional[int] = None, end_date: Optional[int] = None) -> Dict[str, Any]:
         """
         Fetch shipment packages (orders) from Trendyol.
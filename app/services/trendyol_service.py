@@ -11,9 +11,12 @@ from sklearn.metrics.pairwise import cosine_similarity
 
 from app.models import Setting, Product, SupplierXML
 from app.services.trendyol_client import TrendyolClient, build_attributes_payload
+from app.services.client_registry import CLIENT_REGISTRY
 from app.services.xml_service import load_xml_source_index
 from app.services.job_queue import append_mp_job_log, get_mp_job, update_mp_job
-from app.utils.helpers import to_int, to_float, chunked, get_marketplace_multiplier, clean_forbidden_words, calculate_price, is_product_forbidden
+from app.services.job_control import job_token
+from app.utils.helpers import to_int, to_float, chunked, get_marketplace_multiplier, clean_forbidden_words, calculate_price, calculate_prices, is_product_forbidden
+from app.utils.brand_index import BRAND_INDEX_VERSION, BrandIndex, normalize_brand_name
 
 _CAT_TFIDF = {
     "leaf": [],
@@ -33,7 +36,8 @@ _BRAND_TFIDF = {
 _BRAND_CACHE = {
     "by_name": {},  # name.lower() -> {id, name}
     "count": 0,
-    "loaded": False
+    "loaded": False,
+    "index": None,  # BrandIndex over by_name (built on load / save, rebuilt when by_name changes)
 }
 
 # Category cache - stores Trendyol category tree
@@ -54,6 +58,9 @@ def load_brand_cache_from_db() -> bool:
             data = json.loads(cached_json)
             _BRAND_CACHE["by_name"] = {k.lower(): v for k, v in data.get("by_name", {}).items()}
             _BRAND_CACHE["count"] = data.get("count", 0)
+            # Normalized names saved with the cache; BrandIndex ignores them if the list no longer lines up
+            normalized = data.get("normalized") if data.get("index_version") == BRAND_INDEX_VERSION else None
+            _BRAND_CACHE["index"] = BrandIndex(_BRAND_CACHE["by_name"], normalized)
             _BRAND_CACHE["loaded"] = True
             logging.info(f"Brand cache loaded: {_BRAND_CACHE['count']} brands")
             return True
@@ -68,7 +75,9 @@ def save_brand_cache_to_db() -> bool:
     try:
         data = {
             "by_name": _BRAND_CACHE["by_name"],
-            "count": _BRAND_CACHE["count"]
+            "count": _BRAND_CACHE["count"],
+            "normalized": _brand_index().normalized,
+            "index_version": BRAND_INDEX_VERSION,
         }
         json_data = json.dumps(data, ensure_ascii=False)
         logging.info(f"Saving brand cache to DB: {_BRAND_CACHE['count']} brands, {len(json_data)} chars")
@@ -295,77 +304,25 @@ def get_category_cache_stats() -> Dict[str, Any]:
     }
 
 
-def normalize_brand_name(name: str) -> str:
-    """
-    Normalize brand name for cache key (Legacy Style).
-    1. Turkish chars -> English
-    2. Lowercase
-    3. Remove punctuation but KEEP SPACES
-    Result: "Mavi Jeans" -> "mavi jeans"
-    """
-    if not name:
-        return ""
-    
-    # 1. Turkish Map
-    table = str.maketrans({
-        "ğ": "g", "Ğ": "g",
-        "ü": "u", "Ü": "u",
-        "ş": "s", "Ş": "s",
-        "ı": "i", "İ": "i",
-        "ö": "o", "Ö": "o",
-        "ç": "c", "Ç": "c",
-        "I": "i" 
-    })
-    s = name.translate(table)
-    
-    # 2. Lowercase and Strip
-    s = s.lower().strip()
-    
-    # 3. Remove punctuation but keep spaces
-    import re
-    s = re.sub(r'[^\w\s]', '', s) # Keep word chars and spaces
-    s = re.sub(r'\s+', ' ', s)    # Collapse multiple spaces
-    
-    return s.strip()
-
-
-# Cache for normalized brand names to speed up fuzzy matching
-_NORMALIZED_BRAND_CACHE = {
-    "list": [],
-    "map": {}, # normalized -> original_key
-    "loaded": False
-}
-
-def _refresh_normalized_cache():
-    if not _BRAND_CACHE.get("loaded"):
-        load_brand_cache_from_db()
-    
-    # Only rebuild if brand cache count changed or not loaded
-    current_count = len(_BRAND_CACHE.get("by_name", {}))
-    if _NORMALIZED_BRAND_CACHE["loaded"] and len(_NORMALIZED_BRAND_CACHE["list"]) == current_count:
-        return
-
-    logging.info(f"Building normalized brand cache for {current_count} brands...")
-    norm_list = []
-    norm_map = {}
-    for key in _BRAND_CACHE.get("by_name", {}).keys():
-        n = normalize_brand_name(key)
-        norm_list.append(n)
-        norm_map[n] = key
-    
-    _NORMALIZED_BRAND_CACHE["list"] = norm_list
-    _NORMALIZED_BRAND_CACHE["map"] = norm_map
-    _NORMALIZED_BRAND_CACHE["loaded"] = True
-    logging.info("Normalized brand cache built.")
+def _brand_index() -> BrandIndex:
+    """Index of the current by_name dict; rebuilt when the dict was replaced or brands were added."""
+    by_name = _BRAND_CACHE.get("by_name") or {}
+    index = _BRAND_CACHE.get("index")
+    if index is None or not index.covers(by_name):
+        logging.info(f"Building brand index for {len(by_name)} brands...")
+        index = BrandIndex(by_name)
+        _BRAND_CACHE["index"] = index
+    return index
 
 def match_brand_from_cache(brand_name: str) -> Optional[Dict[str, Any]]:
     """
-    Find brand in cache using LEGACY logic (Exhaustive Search).
+    Find brand in cache using LEGACY logic (first brand in cache order wins).
     Strategies:
     1. Exact Match
     2. Exact Normalized Match
     3. Containment (Norm)
     4. Word Subset (Norm)
+    Strategies 2-4 are answered from BrandIndex instead of scanning every brand.
     """
     if not _BRAND_CACHE.get("loaded"):
         load_brand_cache_from_db()
@@ -383,44 +340,13 @@ def match_brand_from_cache(brand_name: str) -> Optional[Dict[str, Any]]:
     if cached:
         return cached
     
-    # Prepare normalized search
-    normalized_search = normalize_brand_name(brand_name)
-    search_words = set(normalized_search.split())
-    
-    # Iterate ALL brands (Legacy Style)
-    # This might be O(N) but guarantees finding "Adidas Turkey" -> "Adidas"
-    
-    for cache_key, cache_val in _BRAND_CACHE["by_name"].items():
-        normalized_cache = normalize_brand_name(cache_val["name"]) # Use actual name if possible or key
-        
-        # 2. Exact Normalized
-        if normalized_search == normalized_cache:
-            logging.info(f"Legacy Match (Exact Norm): '{brand_name}' -> '{cache_val['name']}'")
-            return cache_val
-            
-        # 3. Containment
-        # "Adidas" in "Adidas Türkiye"
-        if normalized_search in normalized_cache or normalized_cache in normalized_search:
-             # Sanity check: Don't match very short strings like "A" in "Apple"
-            if len(normalized_search) >= 3 and len(normalized_cache) >= 3:
-                logging.info(f"Legacy Match (Containment): '{brand_name}' <-> '{cache_val['name']}'")
-                return cache_val
-        
-        # 4. Word Subset
-        # "Adidas Sport" vs "Adidas"
-        if search_words:
-            cache_words = set(normalized_cache.split())
-            if cache_words:
-                 # Search words inside Cache words? ("Adidas" in "Adidas Sport")
-                if search_words.issubset(cache_words):
-                    logging.info(f"Legacy Match (Subset 1): '{brand_name}' -> '{cache_val['name']}'")
-                    return cache_val
-                # Cache words inside Search words? ("Adidas" in "Adidas Türkiye")
-                if cache_words.issubset(search_words):
-                    logging.info(f"Legacy Match (Subset 2): '{brand_name}' -> '{cache_val['name']}'")
-                    return cache_val
-
-    return None
+    found = _brand_index().match(brand_name)
+    if not found:
+        return None
+    cache_key, rule = found
+    cache_val = _BRAND_CACHE["by_name"][cache_key]
+    logging.info(f"Legacy Match ({rule}): '{brand_name}' -> '{cache_val['name']}'")
+    return cache_val
 
 def get_cached_brand_id(brand_name: str, default_id: int = 2770299) -> int:
     """Get brand ID from cache with legacy matching."""
@@ -453,7 +379,9 @@ def get_trendyol_client(user_id: int = None) -> TrendyolClient:
     cookies_str = (Setting.get("TRENDYOL_COOKIES", "", user_id=user_id) or "").strip()
     if not (seller_id and api_key and api_secret):
         raise ValueError("Trendyol API bilgileri eksik. Ayarlar sayfasından SELLER_ID, API_KEY ve API_SECRET giriniz.")
-    return TrendyolClient(seller_id=seller_id, api_key=api_key, api_secret=api_secret, cookies_str=cookies_str)
+    return CLIENT_REGISTRY.get(
+        'trendyol', user_id, (seller_id, api_key, api_secret, cookies_str),
+        lambda: TrendyolClient(seller_id=seller_id, api_key=api_key, api_secret=api_secret, cookies_str=cookies_str))
 
 def fetch_trendyol_categories_flat(auth):
     try:
@@ -676,68 +604,32 @@ def fetch_all_trendyol_products(user_id: int = None, job_id: Optional[str] = Non
         logging.warning(f"Trendyol credentials missing for user {user_id}: {str(e)}")
         return []
 
-    all_items = []
-    page = 0
     size = 100 # Safe batch size
-    total_elements = 0
+    token = job_token(job_id)
     
     if job_id:
         append_mp_job_log(job_id, "Trendyol'dan güncel ürün listesi çekiliyor...")
 
-    while True:
-        # Check for pause/cancel (if job_id is provided)
+    def _progress(count: int, total: Optional[int]):
         if job_id:
-            job_state = get_mp_job(job_id)
-            if job_state:
-                if job_state.get('cancel_requested'):
-                    append_mp_job_log(job_id, "İşlem kullanıcı tarafından iptal edildi.", level='warning')
-                    break
-                
-                while job_state.get('pause_requested'):
-                    append_mp_job_log(job_id, "İşlem duraklatıldı. Devam etmesi bekleniyor...", level='info')
-                    time.sleep(5)
-                    job_state = get_mp_job(job_id)
-                    if job_state.get('cancel_requested'):
-                        append_mp_job_log(job_id, "İşlem kullanıcı tarafından iptal edildi.", level='warning')
-                        break
-                
-                if job_state.get('cancel_requested'):
-                    break
-        
-        try:
-            # Note: Trendyol API uses 0-based index for some, 1-based for others. 
-            # list_products implementation in client seems to pass page directly.
-            # Let's assume 0-based as per test script usage.
-            resp = client.list_products(page=page, size=size)
-            items = resp.get('content', [])
-            if not items:
-                break
-            
-            all_items.extend(items)
-            total_elements = resp.get('totalElements', 0)
-            
-            # Update progress
-            if job_id:
-                update_mp_job(job_id, progress={
-                    'current': len(all_items), 
-                    'total': total_elements,
-                    'message': f'{len(all_items)} / {total_elements} ürün çekildi'
-                })
-                
-                if page % 5 == 0:
-                     append_mp_job_log(job_id, f"{len(all_items)} / {total_elements} ürün çekildi...")
+            update_mp_job(job_id, progress={
+                'current': count,
+                'total': total or count,
+                'message': f'{count} / {total or count} ürün çekildi'
+            })
 
-            if len(all_items) >= total_elements:
-                break
-                
-            page += 1
-            time.sleep(0.5) # Rate limit protection
-            
-        except Exception as e:
-            if job_id:
-                append_mp_job_log(job_id, f"Ürün çekme hatası (Sayfa {page}): {e}", level='error')
-            logging.error(f"Error fetching trendyol products page {page}: {e}")
-            break
+    # Pages after the first are fetched concurrently (bounded by the seller's rate limit bucket)
+    fetched = client.list_all_products(size=size, on_progress=_progress, should_stop=token.should_stop)
+    all_items = fetched.items
+
+    if fetched.cancelled and job_id:
+        append_mp_job_log(job_id, "İşlem kullanıcı tarafından iptal edildi.", level='warning')
+    if fetched.failed_pages:
+        msg = f"Ürün çekme hatası ({len(fetched.failed_pages)} sayfa alınamadı: {sorted(fetched.failed_pages)}): " \
+              f"{next(iter(fetched.failed_pages.values()))}"
+        if job_id:
+            append_mp_job_log(job_id, msg, level='error')
+        logging.error(f"Error fetching trendyol products: {msg}")
             
     if job_id:
         append_mp_job_log(job_id, f"Toplam {len(all_items)} ürün başarıyla çekildi.")
@@ -780,7 +672,6 @@ def refresh_trendyol_cache(job_id: Optional[str] = None, user_id: int = None) ->
              pass
 
         count = 0
-        batch_size = 100
         
         if job_id:
             append_mp_job_log(job_id, f"Veritabanına kaydediliyor ({len(items)} ürün)...")
@@ -789,86 +680,67 @@ def refresh_trendyol_cache(job_id: Optional[str] = None, user_id: int = None) ->
         # Or Just get all barcodes.
         
         remote_barcodes = set()
+        rows = []
+        now = datetime.now()
         
-        for chunk in chunked(items, batch_size):
-            for item in chunk:
-                barcode = item.get('barcode', '')
-                if not barcode: continue
-                remote_barcodes.add(barcode)
-                
-                # Basic fields
-                stock_code = item.get('stockCode') or item.get('productMainId') or ''
-                title = item.get('title') or ''
-                brand = item.get('brand') or ''
-                if isinstance(brand, dict): brand = brand.get('name', '')
-                category = item.get('categoryName') or ''
-                
-                # Status
-                on_sale = item.get('onSale')
-                approved = item.get('approved')
-                # Map to status string
-                # Status mapping: Standardize to Aktif/Pasif
-                status_str = "Aktif" if on_sale else "Pasif"
-                approval_str = "Onaylandı" if approved else ("Reddedildi" if item.get('rejected') else "Beklemede")
-                
-                if not on_sale and not approved:
-                    status_str = "Arşivlenmiş"
-                
-                # Price/Qty
-                list_price = float(item.get('listPrice', 0))
-                sale_price = float(item.get('salePrice', 0))
-                quantity = int(item.get('stock', 0) if 'stock' in item else item.get('quantity', 0))
-                
-                images = item.get('images', [])
-                img_json = json.dumps([img['url'] for img in images if isinstance(img, dict) and 'url' in img])
-                
-                if not user_id:
-                    continue
-                    
-                # Check existing
-                existing = MarketplaceProduct.query.filter_by(
-                    marketplace='trendyol', 
-                    barcode=barcode,
-                    user_id=user_id
-                ).first()
-                
-                if existing:
-                    existing.stock_code = stock_code
-                    existing.title = title
-                    existing.brand = brand
-                    existing.category = category
-                    existing.price = list_price
-                    existing.sale_price = sale_price
-                    existing.quantity = quantity
-                    existing.status = status_str
-                    existing.approval_status = approval_str
-                    existing.on_sale = bool(on_sale)
-                    existing.images_json = img_json
-                    existing.raw_data = json.dumps(item)
-                    existing.last_sync_at = datetime.now()
-                else:
-                    new_prod = MarketplaceProduct(
-                        user_id=user_id,
-                        marketplace='trendyol',
-                        barcode=barcode,
-                        stock_code=stock_code,
-                        title=title,
-                        price=list_price,
-                        sale_price=sale_price,
-                        quantity=quantity,
-                        brand=brand,
-                        category=category,
-                        status=status_str,
-                        approval_status=approval_str,
-                        on_sale=bool(on_sale),
-                        images_json=img_json,
-                        raw_data=json.dumps(item)
-                    )
-                    db.session.add(new_prod)
-                
-                count += 1
+        for item in items:
+            barcode = item.get('barcode', '')
+            if not barcode: continue
+            remote_barcodes.add(barcode)
+            
+            # Basic fields
+            stock_code = item.get('stockCode') or item.get('productMainId') or ''
+            title = item.get('title') or ''
+            brand = item.get('brand') or ''
+            if isinstance(brand, dict): brand = brand.get('name', '')
+            category = item.get('categoryName') or ''
+            
+            # Status
+            on_sale = item.get('onSale')
+            approved = item.get('approved')
+            # Map to status string
+            # Status mapping: Standardize to Aktif/Pasif
+            status_str = "Aktif" if on_sale else "Pasif"
+            approval_str = "Onaylandı" if approved else ("Reddedildi" if item.get('rejected') else "Beklemede")
+            
+            if not on_sale and not approved:
+                status_str = "Arşivlenmiş"
+            
+            # Price/Qty
+            list_price = float(item.get('listPrice', 0))
+            sale_price = float(item.get('salePrice', 0))
+            quantity = int(item.get('stock', 0) if 'stock' in item else item.get('quantity', 0))
             
-            db.session.commit()
+            images = item.get('images', [])
+            img_json = json.dumps([img['url'] for img in images if isinstance(img, dict) and 'url' in img])
+            
+            if not user_id:
+                continue
+                
+            rows.append({
+                'user_id': user_id,
+                'marketplace': 'trendyol',
+                'barcode': barcode,
+                'stock_code': stock_code,
+                'title': title,
+                'brand': brand,
+                'category': category,
+                'price': list_price,
+                'sale_price': sale_price,
+                'quantity': quantity,
+                'status': status_str,
+                'approval_status': approval_str,
+                'on_sale': bool(on_sale),
+                'images_json': img_json,
+                'raw_data': json.dumps(item),
+                'last_sync_at': now,
+            })
+            count += 1
+        
+        # Single set-based upsert (COPY + merge on PostgreSQL) instead of a SELECT per product
+        from app.services.bulk_loader import bulk_upsert
+        bulk_upsert(MarketplaceProduct, rows, conflict_cols=('user_id', 'marketplace', 'barcode'))
+        db.session.commit()
             
         # Delete items not in remote (Sync)
         # Only for this user and marketplace
@@ -1343,8 +1215,7 @@ def perform_trendyol_send_products(job_id: str, barcodes: List[str], xml_source_
 
     for barcode in barcodes:
         # Check for cancel request
-        job_state = get_mp_job(job_id)
-        if job_state and job_state.get('cancel_requested'):
+        if job_token(job_id).cancelled:
             append_mp_job_log(job_id, f"İşlem iptal edildi. {processed}/{total_items} ürün işlendi.", level='warning')
             break
         
@@ -1582,22 +1453,13 @@ def perform_trendyol_send_products(job_id: str, barcodes: List[str], xml_source_
     
     for i in range(0, len(items_to_send), batch_size):
         # Check Job Status for Cancel/Pause
-        job_state = get_mp_job(job_id)
-        if job_state:
-            if job_state.get('cancel_requested'):
-                append_mp_job_log(job_id, "İşlem kullanıcı tarafından iptal edildi.", level='warning')
-                break
-            
-            while job_state.get('pause_requested'):
-                append_mp_job_log(job_id, "İşlem duraklatıldı. Devam etmesi bekleniyor...", level='info')
-                time.sleep(5)
-                job_state = get_mp_job(job_id)
-                if job_state.get('cancel_requested'):
-                    break
-            
-            if job_state.get('cancel_requested'):
-                append_mp_job_log(job_id, "İşlem kullanıcı tarafından iptal edildi.", level='warning')
-                break
+        token = job_token(job_id)
+        if token.paused:
+            append_mp_job_log(job_id, "İşlem duraklatıldı. Devam etmesi bekleniyor...", level='info')
+            token.wait_if_paused()
+        if token.cancelled:
+            append_mp_job_log(job_id, "İşlem kullanıcı tarafından iptal edildi.", level='warning')
+            break
 
         current_batch_num = (i // batch_size) + 1
         update_mp_job(job_id, progress={'current': success_count + fail_count, 'total': len(items_to_send), 'batch': f"{current_batch_num}/{total_batches}"})
@@ -1913,23 +1775,24 @@ def sync_trendyol_with_xml_diff(job_id: str, xml_source_id: Any, user_id: int =
     updated_count = 0
     if final_matched:
         items_to_update = []
+        matched_infos = []
         for sc in final_matched:
             # Try Primary Match
             xml_info = xml_map.get(sc)
-            
+
             # Try Fallback Match
             if not xml_info:
                 xml_info = xml_barcode_map.get(sc)
-            
+
             if not xml_info: continue
-            
+            matched_infos.append((sc, xml_info))
+
+        # Price (whole batch at once; GLOBAL_PRICE_RULES)
+        final_prices = calculate_prices([to_float(info.get('price'), 0.0) for _, info in matched_infos], 'trendyol', user_id=user_id)
+        for (sc, xml_info), final_price in zip(matched_infos, final_prices.tolist()):
             # Stock
             qty = to_int(xml_info.get('quantity'), 0)
-            
-            # Price
-            base_price = to_float(xml_info.get('price'), 0.0)
-            final_price = calculate_price(base_price, 'trendyol', user_id=user_id) # Using trendyol specific price logic
-            
+
             # Get Remote Barcode (for API call)
             # Trendyol API needs "barcode" to update
             remote_item = remote_stock_map.get(sc)
@@ -1986,7 +1849,7 @@ def perform_trendyol_direct_push_actions(user_id: int, to_update: List[Any], to_
     Trendyol için Direct Push aksiyonlarını gerçekleştirir.
     """
     from app.services.job_queue import append_mp_job_log, append_mp_job_logs, get_mp_job, update_mp_job, update_job_progress
-    from app.utils.helpers import calculate_price
+    from app.utils.helpers import calculate_prices
     from app.models import MarketplaceProduct, Setting
     from app import db
     
@@ -2012,15 +1875,14 @@ def perform_trendyol_direct_push_actions(user_id: int, to_update: List[Any], to_
         db_mappings = []
         batch_logs = []
         
-        for xml_item, local_item in to_update:
+        update_prices, update_rules = calculate_prices([x.price for x, _ in to_update], 'trendyol', user_id=user_id, return_details=True)
+        for (xml_item, local_item), final_price, rule_desc in zip(to_update, update_prices.tolist(), update_rules):
             # Periodic cancel check
             if len(db_mappings) % 50 == 0 and job_id:
-                js = get_mp_job(job_id)
-                if js and js.get('cancel_requested'):
+                if job_token(job_id).cancelled:
                     append_mp_job_log(job_id, "İşlem kullanıcı tarafından iptal edildi.", level='warning')
                     return res
             
-            final_price, rule_desc = calculate_price(xml_item.price, 'trendyol', user_id=user_id, return_details=True)
             
             update_payloads.append({
                 "barcode": local_item.barcode,
@@ -2045,8 +1907,7 @@ def perform_trendyol_direct_push_actions(user_id: int, to_update: List[Any], to_
         try:
             for i, batch in enumerate(chunked(update_payloads, 100)):
                 if job_id and i % 5 == 0:
-                    js = get_mp_job(job_id)
-                    if js and js.get('cancel_requested'):
+                    if job_token(job_id).cancelled:
                         append_mp_job_log(job_id, "İptal edildi (Batch sırasında)", level='warning')
                         return res
                 
@@ -2084,10 +1945,10 @@ def perform_trendyol_direct_push_actions(user_id: int, to_update: List[Any], to_
             except: pass
  
         valid_creates = []
-        for xml_item in to_create:
+        create_prices, create_rules = calculate_prices([x.price for x in to_create], 'trendyol', user_id=user_id, return_details=True)
+        for xml_item, final_price, rule_desc in zip(to_create, create_prices.tolist(), create_rules):
             if len(valid_creates) % 50 == 0 and job_id:
-                js = get_mp_job(job_id)
-                if js and js.get('cancel_requested'):
+                if job_token(job_id).cancelled:
                     append_mp_job_log(job_id, "İşlem kullanıcı tarafından iptal edildi.", level='warning')
                     return res
             
@@ -2108,7 +1969,6 @@ def perform_trendyol_direct_push_actions(user_id: int, to_update: List[Any], to_
             if not brand_id or not cat_id:
                 continue # Silent skip to avoid log spamming if thousands
  
-            final_price, rule_desc = calculate_price(xml_item.price, 'trendyol', user_id=user_id, return_details=True)
             
             safe_title = (xml_item.title or "").strip()
             if len(safe_title) < 3: safe_title = f"{safe_title} - Ürün"
@@ -2137,11 +1997,13 @@ def perform_trendyol_direct_push_actions(user_id: int, to_update: List[Any], to_
             }
             valid_creates.append((item_payload, xml_item, rule_desc))
 
+        # Left out above (no match / invalid barcode), reported apart from failed batches
+        res['skipped_count'] = len(to_create) - len(valid_creates)
+
         # API Chunks
         for batch in chunked(valid_creates, 50):
             if job_id:
-                js = get_mp_job(job_id)
-                if js and js.get('cancel_requested'):
+                if job_token(job_id).cancelled:
                     append_mp_job_log(job_id, "İptal edildi (Create sırasında)", level='warning')
                     return res
  
@@ -2190,8 +2052,7 @@ def perform_trendyol_direct_push_actions(user_id: int, to_update: List[Any], to_
         for local_item in to_zero:
             # Periodic cancel check
             if len(zero_payloads) % 50 == 0 and job_id:
-                js = get_mp_job(job_id)
-                if js and js.get('cancel_requested'):
+                if job_token(job_id).cancelled:
                     append_mp_job_log(job_id, "İşlem kullanıcı tarafından iptal edildi.", level='warning')
                     return res
             
@@ -2206,8 +2067,7 @@ def perform_trendyol_direct_push_actions(user_id: int, to_update: List[Any], to_
         try:
             for i, batch in enumerate(chunked(zero_payloads, 100)):
                 if job_id and i % 5 == 0:
-                    js = get_mp_job(job_id)
-                    if js and js.get('cancel_requested'):
+                    if job_token(job_id).cancelled:
                         append_mp_job_log(job_id, "İptal edildi (Zero sırasında)", level='warning')
                         return res
                 
@@ -40,6 +40,9 @@ def create_admin_user_if_not_exists():
     migrate_existing_data_to_user(admin.id)
     
     db.session.commit()
+    from app.models import Setting
+    Setting.invalidate_cache(None)  # global settings moved to the admin
+    Setting.invalidate_cache(admin.id)
     print(f"✅ Admin kullanıcısı oluşturuldu: {admin_email}")
     return admin
 
@@ -0,0 +1,155 @@
+"""
+Tedarikçi XML satırları için öğrenilmiş alan çıkarma planı.
+_build_xml_index her alan için birçok alternatif anahtar yazımını (ör. barcode/Barkod/BARKOD...)
+sırayla dener. Plan, feed'in ilk satırlarında görülen anahtarlardan her alan için yalnızca
+gerçekten var olan yazımları (aynı öncelik sırasıyla) tutar; böylece sonraki satırlarda tek
+bir doğrudan erişim yeterli olur. Plana uymayan satır tam alias listesiyle işlenir ve plan genişletilir.
+Plan SupplierXML.extraction_plan sütununda JSON olarak saklanır.
+"""
+import json
+from itertools import chain, islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+PLAN_VERSION = 1
+PLAN_SAMPLE_ROWS = 50  # rows inspected before the plan is compiled
+
+# Field -> key spellings in priority order (the order _g probes them)
+ROW_FIELDS: Dict[str, Tuple[str, ...]] = {
+    'product_code': ('productCode', 'ProductCode', 'product_code', 'Product_Code', 'code', 'Code'),
+    'model_code': ('modelCode', 'ModelCode', 'model_code', 'Model_Code', 'groupCode', 'GroupCode'),
+    'barcode': ('barcode', 'barcod', 'Barkod', 'BARKOD', 'productBarcode', 'ProductBarcode', 'Barcode'),
+    'title': ('name', 'Name', 'productName', 'ProductName', 'title', 'Title'),
+    'description': ('detail', 'Detail', 'description', 'Description'),
+    'stock_code': ('stockCode', 'StockCode'),
+    'quantity': ('quantity', 'Quantity', 'stok', 'Stok', 'OnHand', 'stock'),
+    'price': ('price', 'Price', 'salePrice', 'SalePrice', 'unitPrice', 'UnitPrice', 'listPrice', 'ListPrice'),
+    'vat': ('tax', 'Tax', 'taxRate', 'TaxRate'),
+    'brand': ('brand', 'Brand', 'marka', 'Marka', 'manufacturer', 'Manufacturer'),
+    'link': ('link', 'Link', 'url', 'Url', 'LİNK', 'Linkler', 'web', 'Web', 'productUrl', 'ProductUrl'),
+    'details': ('detail', 'Detail', 'details', 'Details', 'detay', 'Detay', 'uzunaciklama', 'UzunAciklama'),
+    'category': ('category', 'Category', 'top_category', 'TopCategory'),
+    'image_single': ('Image', 'image', 'Resim', 'resim', 'picture', 'Picture'),
+    'images_node': ('Images', 'images', 'Resimler', 'resimler'),
+    'variants_node': ('variants', 'Variants', 'varyantlar', 'Varyantlar'),
+}
+ROW_FIELDS.update({f'image{k}': (f'image{k}', f'Image{k}', f'Resim{k}', f'resim{k}') for k in range(1, 10)})
+IMAGE_SLOTS = tuple(f'image{k}' for k in range(1, 10))
+
+VARIANT_FIELDS: Dict[str, Tuple[str, ...]] = {
+    'barcode': ('barcode', 'Barcode', 'barkod', 'Barkod'),
+    'quantity': ('stock', 'Stock', 'quantity', 'Quantity'),
+    'price': ('price', 'Price'),
+}
+for _k in range(1, 4):
+    VARIANT_FIELDS[f'name{_k}'] = (f'name{_k}', f'Name{_k}')
+    VARIANT_FIELDS[f'value{_k}'] = (f'value{_k}', f'Value{_k}')
+
+_ROW_ALIAS_KEYS = frozenset(chain.from_iterable(ROW_FIELDS.values()))
+_VARIANT_ALIAS_KEYS = frozenset(chain.from_iterable(VARIANT_FIELDS.values()))
+
+
+def _compile(fields: Dict[str, Tuple[str, ...]], keys: frozenset) -> Dict[str, Tuple[str, ...]]:
+    return {name: tuple(a for a in aliases if a in keys) for name, aliases in fields.items()}
+
+
+class _KeyPlan:
+    """Plan for one row shape (product rows or variant rows)."""
+
+    def __init__(self, fields: Dict[str, Tuple[str, ...]], alias_keys: frozenset, keys: Iterable[str] = ()):
+        self._all = fields
+        self._alias_keys = alias_keys
+        self.keys = set(keys)
+        self.alias_keys = frozenset(self.keys & alias_keys)
+        self.fields = _compile(fields, self.alias_keys)
+        self.changed = False
+
+    def fields_for(self, row: Dict[str, Any]) -> Dict[str, Tuple[str, ...]]:
+        """Compiled aliases when the row fits the plan, otherwise the full alias lists (and learn the row)."""
+        if row.keys() <= self.keys:
+            return self.fields
+        self.learn(row)
+        return self._all
+
+    def learn(self, row: Dict[str, Any]) -> None:
+        new = row.keys() - self.keys
+        self.keys |= new
+        new_alias = new & self._alias_keys
+        if new_alias:
+            self.alias_keys = self.alias_keys | new_alias
+            self.fields = _compile(self._all, self.alias_keys)
+            self.changed = True
+
+
+class XmlExtractionPlan:
+    """Per-source plan: which key spelling each field uses in product rows and variant rows."""
+
+    def __init__(self, row_keys: Iterable[str] = (), variant_keys: Iterable[str] = ()):
+        self.rows = _KeyPlan(ROW_FIELDS, _ROW_ALIAS_KEYS, row_keys)
+        self.variants = _KeyPlan(VARIANT_FIELDS, _VARIANT_ALIAS_KEYS, variant_keys)
+
+    @property
+    def changed(self) -> bool:
+        return self.rows.changed or self.variants.changed
+
+    def image_slots(self, fields: Dict[str, Tuple[str, ...]]) -> List[Tuple[str, ...]]:
+        return [fields[slot] for slot in IMAGE_SLOTS if fields[slot]]
+
+    def to_json(self) -> str:
+        return json.dumps({
+            'v': PLAN_VERSION,
+            'row_keys': sorted(self.rows.alias_keys),
+            'variant_keys': sorted(self.variants.alias_keys),
+        })
+
+    @classmethod
+    def from_json(cls, raw: Optional[str]) -> Optional['XmlExtractionPlan']:
+        if not raw:
+            return None
+        try:
+            data = json.loads(raw)
+        except Exception:
+            return None
+        if not isinstance(data, dict) or data.get('v') != PLAN_VERSION:
+            return None
+        return cls(data.get('row_keys') or (), data.get('variant_keys') or ())
+
+    @classmethod
+    def learn_from(cls, items: Iterable[Any], sample_size: int = PLAN_SAMPLE_ROWS,
+                   plan: Optional['XmlExtractionPlan'] = None) -> Tuple['XmlExtractionPlan', Iterator[Any]]:
+        """
+        Compile a plan from the first sample_size rows (extending plan if given).
+        Returns the plan and an iterator that still yields every row, sampled ones included.
+        """
+        it = iter(items)
+        sample = list(islice(it, sample_size))
+        plan = plan or cls()
+        for row in sample:
+            if not isinstance(row, dict):
+                continue
+            plan.rows.learn(row)
+            for v in iter_variant_rows(first_present(row, plan.rows.fields['variants_node'])):
+                plan.variants.learn(v)
+        return plan, chain(sample, it)
+
+
+def first_present(row: Dict[str, Any], aliases: Tuple[str, ...]) -> Any:
+    """First truthy value among aliases (row.get(a) or row.get(b) or ...)."""
+    for key in aliases:
+        value = row.get(key)
+        if value:
+            return value
+    return None
+
+
+def iter_variant_rows(variants_node: Any) -> Iterator[Dict[str, Any]]:
+    if not variants_node:
+        return
+    if isinstance(variants_node, dict):
+        variant_items = variants_node.get('variant') or variants_node.get('Variant') or variants_node
+    else:
+        variant_items = variants_node
+    if not isinstance(variant_items, list):
+        variant_items = [variant_items] if variant_items else []
+    for v in variant_items:
+        if isinstance(v, dict):
+            yield v
@@ -0,0 +1,137 @@
+"""
+XML kaynak indeksi için disk önbelleği.
+load_xml_source_index sonucunu (source id + içerik özeti) anahtarıyla pickle (protocol 5)
+olarak saklar; böylece aynı sunucudaki diğer gunicorn worker'ları aynı XML'i tekrar
+indirip ayrıştırmak yerine dosyadan yükler. Bellek paylaşımı yoktur: her worker indeksi
+kendi belleğinde tutar, kazanç indirme ve ayrıştırma süresindedir.
+"""
+import os
+import time
+import pickle
+import tempfile
+import logging
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+INDEX_CACHE_VERSION = 1  # index yapısı değişirse artırın, eski dosyalar okunmaz
+INDEX_CACHE_DIR = os.path.join(os.getcwd(), 'cache', 'xml_index')
+INDEX_CACHE_TTL_SECONDS = int(os.environ.get('XML_INDEX_CACHE_TTL', str(12 * 3600)))
+INDEX_CACHE_MAX_BYTES = int(os.environ.get('XML_INDEX_CACHE_MAX_BYTES', str(2 * 1024 ** 3)))
+
+_PREFIX = f'xml_index_v{INDEX_CACHE_VERSION}_'
+
+
+def _path(source_id: int, content_hash: str) -> str:
+    return os.path.join(INDEX_CACHE_DIR, f'{_PREFIX}{int(source_id)}_{content_hash}.pkl')
+
+
+def _source_prefix(source_id: int) -> str:
+    return f'{_PREFIX}{int(source_id)}_'
+
+
+def load_index(source_id: int, content_hash: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Return the cached index for this source/content or None (missing, expired or unreadable)."""
+    if not content_hash:
+        return None
+    path = _path(source_id, content_hash)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if INDEX_CACHE_TTL_SECONDS and time.time() - st.st_mtime > INDEX_CACHE_TTL_SECONDS:
+        _remove(path)
+        return None
+
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except Exception as e:
+        logger.warning(f"XML index cache unreadable, dropping {path}: {e}")
+        _remove(path)
+        return None
+
+
+def save_index(source_id: int, content_hash: Optional[str], index: Dict[str, Any]) -> bool:
+    """Atomically write the index (temp file + rename) and drop older versions of the source."""
+    if not content_hash or '_error' in index:
+        return False
+    try:
+        os.makedirs(INDEX_CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=INDEX_CACHE_DIR, prefix='.tmp_', suffix='.pkl')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(index, f, protocol=5)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, _path(source_id, content_hash))
+        except Exception:
+            _remove(tmp_path)
+            raise
+    except Exception as e:
+        logger.warning(f"XML index cache write failed for source {source_id}: {e}")
+        return False
+
+    invalidate(source_id, keep_hash=content_hash)
+    evict()
+    return True
+
+
+def invalidate(source_id: int, keep_hash: Optional[str] = None) -> int:
+    """Delete cached indexes of a source (except keep_hash). Returns the number of removed files."""
+    removed = 0
+    prefix = _source_prefix(source_id)
+    keep = os.path.basename(_path(source_id, keep_hash)) if keep_hash else None
+    try:
+        names = os.listdir(INDEX_CACHE_DIR)
+    except OSError:
+        return 0
+    for name in names:
+        if name.startswith(prefix) and name != keep:
+            if _remove(os.path.join(INDEX_CACHE_DIR, name)):
+                removed += 1
+    return removed
+
+
+def evict() -> int:
+    """Drop expired files, then the oldest ones until the directory fits INDEX_CACHE_MAX_BYTES."""
+    try:
+        entries = []
+        for name in os.listdir(INDEX_CACHE_DIR):
+            path = os.path.join(INDEX_CACHE_DIR, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path, name))
+    except OSError:
+        return 0
+
+    now = time.time()
+    removed = 0
+    kept = []
+    for mtime, size, path, name in entries:
+        stale_tmp = name.startswith('.tmp_') and now - mtime > 3600
+        foreign = not name.startswith('.tmp_') and not name.startswith(_PREFIX)  # older cache versions
+        expired = INDEX_CACHE_TTL_SECONDS and now - mtime > INDEX_CACHE_TTL_SECONDS
+        if stale_tmp or foreign or expired:
+            removed += int(_remove(path))
+        else:
+            kept.append((mtime, size, path))
+
+    total = sum(size for _, size, _ in kept)
+    for mtime, size, path in sorted(kept):
+        if total <= INDEX_CACHE_MAX_BYTES:
+            break
+        if _remove(path):
+            removed += 1
+            total -= size
+    return removed
+
+
+def _remove(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
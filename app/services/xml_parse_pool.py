@@ -0,0 +1,133 @@
+"""
+XML ayrıştırma için süreç havuzu ve kaynak bazlı tekil uçuş (single-flight).
+Farklı tedarikçi kaynakları ayrı çekirdeklerde paralel ayrıştırılır; aynı kaynak için eş zamanlı
+gelen istekler tek bir devam eden ayrıştırmanın sonucunu bekler (global kilit yerine).
+Havuz devre dışıysa (XML_PARSE_WORKERS=0) veya bozulursa iş çağıran thread'de yapılır; aynı anda
+thread'de çalışan ayrıştırma sayısı bir semaforla sınırlıdır (bellek kullanımı sınırsız büyümesin).
+"""
+import os
+import shutil
+import tempfile
+import threading
+import logging
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+# One core is left to the web/job threads; on a single-core host parsing stays in-thread
+XML_PARSE_WORKERS = int(os.environ.get('XML_PARSE_WORKERS', str(min(4, (os.cpu_count() or 1) - 1))))
+# Feeds smaller than this are parsed in-thread; pickling the index back would cost more than it saves
+XML_PARSE_POOL_MIN_BYTES = int(os.environ.get('XML_PARSE_POOL_MIN_BYTES', str(2 * 1024 * 1024)))
+# Module the workers run (parse_xml_feed); the only import the forkserver preloads
+XML_PARSE_MODULE = 'app.services.xml_service'
+
+# In-thread parses at once (pool off, broken, or small feeds); replaces the old global parse lock
+_IN_THREAD_SLOTS = threading.BoundedSemaphore(max(1, XML_PARSE_WORKERS))
+
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+_INFLIGHT: Dict[Hashable, Future] = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+
+def _init_worker() -> None:
+    """Pool worker initializer: import only the parse module."""
+    import importlib
+    importlib.import_module(XML_PARSE_MODULE)
+
+
+def get_parse_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Lazily start the pool. The caller runs in a gunicorn worker that already has request,
+    job and watcher threads, so workers are never forked from it (a lock held by another
+    thread would be copied into the child). They come from a forkserver, itself a fresh
+    interpreter that preloads only the parse module; spawn where forkserver is unavailable.
+    Workers only parse and index, they never open DB connections.
+    """
+    global _POOL
+    if XML_PARSE_WORKERS <= 0:
+        return None
+    with _POOL_LOCK:
+        if _POOL is None:
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                ctx = multiprocessing.get_context('forkserver')
+                ctx.set_forkserver_preload([XML_PARSE_MODULE])
+            else:
+                ctx = multiprocessing.get_context('spawn')
+            _POOL = ProcessPoolExecutor(max_workers=XML_PARSE_WORKERS, mp_context=ctx,
+                                        initializer=_init_worker)
+        return _POOL
+
+
+def _reset_pool(pool: ProcessPoolExecutor) -> None:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is pool:
+            _POOL = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run_in_thread(fn: Callable[..., Any], *args: Any) -> Any:
+    """Run fn(*args) in the calling thread, at most max(1, XML_PARSE_WORKERS) at a time per process."""
+    with _IN_THREAD_SLOTS:
+        return fn(*args)
+
+
+def run_in_pool(fn: Callable[..., Any], *args: Any, size: int = 0) -> Any:
+    """Run fn(*args) in the parse pool (module-level fn, picklable args) and wait for the result."""
+    pool = get_parse_pool() if size >= XML_PARSE_POOL_MIN_BYTES else None
+    if pool is None:
+        return run_in_thread(fn, *args)
+    try:
+        return pool.submit(fn, *args).result()
+    except BrokenProcessPool as e:
+        # A worker died (OOM kill etc.): drop the pool and parse here this time
+        logger.error(f"XML parse pool broken, falling back to in-process parsing: {e}")
+        _reset_pool(pool)
+        return run_in_thread(fn, *args)
+
+
+def single_flight(key: Optional[Hashable], fn: Callable[[], Any]) -> Any:
+    """
+    Run fn once per key at a time: concurrent callers with the same key wait for and share
+    the leader's result (or exception). key=None disables coalescing.
+    """
+    if key is None:
+        return fn()
+    with _INFLIGHT_LOCK:
+        future = _INFLIGHT.get(key)
+        leader = future is None
+        if leader:
+            future = Future()
+            _INFLIGHT[key] = future
+    if not leader:
+        return future.result()
+
+    try:
+        result = fn()
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with _INFLIGHT_LOCK:
+            _INFLIGHT.pop(key, None)
+
+
+def spool_to_path(fileobj: Any) -> str:
+    """Copy a (spooled) file object to a named temp file so a worker process can open it; caller removes it."""
+    fd, path = tempfile.mkstemp(prefix='xml_parse_', suffix='.xml')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            fileobj.seek(0)
+            shutil.copyfileobj(fileobj, out, 1024 * 1024)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
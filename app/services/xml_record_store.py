@@ -0,0 +1,172 @@
+"""
+XML kayıtları için sıkıştırılmış (sütun bazlı) bellek düzeni.
+load_xml_source_index her ürün için ~17 anahtarlı bir dict üretir; büyük feed'lerde worker
+belleğinin çoğu bu dict'lere gider. XmlRecordStore aynı alanları sütunlarda tutar
+(fiyat/stok array('d')/array('q'), tekrar eden metinler intern edilmiş, görseller url tuple'ı),
+XmlRecord ise satıra bakan salt __slots__ içeren bir Mapping görünümüdür.
+JSON gerektiğinde to_dict() / materialize_record() ile dict'e çevrilir.
+"""
+import sys
+from array import array
+from collections.abc import Mapping
+from typing import Any, Dict, Iterator, List, Optional
+
+# String columns kept as plain lists (one entry per row)
+_STR_COLUMNS = ('title', 'link', 'description', 'details', 'stockCode', 'brand', 'category',
+                'barcode', 'productCode', 'modelCode')
+# Low-cardinality columns whose values are interned (shared between rows)
+_INTERNED_COLUMNS = frozenset(('brand', 'category', 'modelCode', 'productCode', 'link'))
+_NUM_COLUMNS = {'quantity': 'q', 'price': 'd', 'vatRate': 'd'}
+_DERIVED_COLUMNS = ('images', 'title_normalized')
+# Key order of a materialised record (same as the dict built in _build_xml_index)
+RECORD_KEYS = ('title', 'link', 'description', 'details', 'stockCode', 'quantity', 'price', 'vatRate',
+               'brand', 'category', 'images', 'barcode', 'productCode', 'modelCode', 'title_normalized')
+
+
+class _SameAsDescription:
+    """details column marker: value equals description (pickles as the module singleton)."""
+
+    def __reduce__(self):
+        return '_SAME_AS_DESCRIPTION'
+
+
+_SAME_AS_DESCRIPTION = _SameAsDescription()
+
+
+class XmlRecordStore:
+    """Columnar storage for index records; rows are appended once and read through XmlRecord."""
+
+    def __init__(self):
+        self._str: Dict[str, List[Any]] = {name: [] for name in _STR_COLUMNS}
+        self._num: Dict[str, array] = {name: array(code) for name, code in _NUM_COLUMNS.items()}
+        self._images: List[Optional[tuple]] = []
+        self._extras: Dict[int, Dict[str, Any]] = {}  # sparse: variant fields, overrides
+        self._interned: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+    def _intern(self, value: Any) -> Any:
+        if not isinstance(value, str):
+            return value
+        return self._interned.setdefault(value, sys.intern(value) if len(value) < 64 else value)
+
+    def append(self, record: Dict[str, Any]) -> 'XmlRecord':
+        """Store a record dict and return its view; the dict itself is not kept."""
+        row = len(self._images)
+        extras = {}
+        for name in _STR_COLUMNS:
+            value = record.get(name)
+            if name == 'details' and value == record.get('description'):
+                value = _SAME_AS_DESCRIPTION
+            elif name in _INTERNED_COLUMNS:
+                value = self._intern(value)
+            self._str[name].append(value)
+        for name, code in _NUM_COLUMNS.items():
+            value = record.get(name, 0)
+            try:
+                self._num[name].append(int(value) if code == 'q' else float(value))
+            except (TypeError, ValueError, OverflowError):
+                self._num[name].append(0)
+                extras[name] = value
+        images = record.get('images') or []
+        if all(isinstance(img, dict) and set(img) == {'url'} for img in images):
+            self._images.append(tuple(img['url'] for img in images) or None)
+        else:
+            self._images.append(None)
+            extras['images'] = images
+        title = record.get('title')
+        if record.get('title_normalized') != (title.lower() if title else ""):
+            extras['title_normalized'] = record.get('title_normalized')
+        for key, value in record.items():
+            if key not in _NUM_COLUMNS and key not in _STR_COLUMNS and key not in _DERIVED_COLUMNS:
+                extras[key] = value
+        if extras:
+            self._extras[row] = extras
+        return XmlRecord(self, row)
+
+    def _has(self, row: int, key: str) -> bool:
+        return key in RECORD_KEYS or key in self._extras.get(row, ())
+
+    def _get(self, row: int, key: str) -> Any:
+        extras = self._extras.get(row)
+        if extras and key in extras:
+            return extras[key]
+        if key in self._str:
+            value = self._str[key][row]
+            if value is _SAME_AS_DESCRIPTION:
+                return self._str['description'][row]
+            return value
+        if key in self._num:
+            return self._num[key][row]
+        if key == 'images':
+            return [{'url': url} for url in (self._images[row] or ())]
+        if key == 'title_normalized':
+            title = self._str['title'][row]
+            return title.lower() if title else ""
+        raise KeyError(key)
+
+    def _set(self, row: int, key: str, value: Any) -> None:
+        self._extras.setdefault(row, {})[key] = value
+
+    def _keys(self, row: int) -> Iterator[str]:
+        yield from RECORD_KEYS
+        for key in self._extras.get(row, ()):
+            if key not in RECORD_KEYS:
+                yield key
+
+
+class XmlRecord(Mapping):
+    """Read-mostly dict-like view of one store row; writes go to a per-row overlay."""
+
+    __slots__ = ('_store', '_row')
+
+    def __init__(self, store: XmlRecordStore, row: int):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, key: str) -> Any:
+        if not self._store._has(self._row, key):
+            raise KeyError(key)
+        return self._store._get(self._row, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        # Hot path of filters/lookups: skip the Mapping.get -> __getitem__ -> _has chain
+        try:
+            return self._store._get(self._row, key)
+        except KeyError:
+            return default
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._store._set(self._row, key, value)
+
+    def __iter__(self) -> Iterator[str]:
+        return self._store._keys(self._row)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self._store._keys(self._row))
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self._store._has(self._row, key)
+
+    def __reduce__(self):
+        return (XmlRecord, (self._store, self._row))
+
+    def __repr__(self) -> str:
+        return f'XmlRecord({self.to_dict()!r})'
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {key: self._store._get(self._row, key) for key in self}
+
+    def copy(self) -> Dict[str, Any]:
+        """Same contract as dict.copy(): an independent, mutable dict."""
+        return self.to_dict()
+
+
+def materialize_record(rec: Any) -> Any:
+    """Return a JSON-serialisable copy of a record (dict records pass through, nested variants included)."""
+    if isinstance(rec, XmlRecord):
+        return rec.to_dict()
+    if isinstance(rec, dict) and any(isinstance(v, XmlRecord) for v in rec.get('variants') or ()):
+        return dict(rec, variants=[materialize_record(v) for v in rec['variants']])
+    return rec
@@ -1,12 +1,20 @@
 import os
+import io
+import hashlib
 from datetime import datetime
 import time
 import copy
 import json
 import xmltodict
-from typing import Dict, Any, List, Optional
+import xml.etree.ElementTree as ET
+from typing import Dict, Any, List, Optional, Iterable, Iterator
 from app.models import SupplierXML, Setting
-from app.utils.helpers import fetch_xml_from_url, to_int, to_float
+from app.utils.helpers import fetch_xml_from_url, download_xml_to_spool, to_int, to_float, chunked
+from app.services import xml_index_cache
+from app.services.xml_record_store import XmlRecordStore, materialize_record
+from app.services.xml_extraction_plan import XmlExtractionPlan, first_present, iter_variant_rows
+from app.services.xml_parse_pool import (XML_PARSE_POOL_MIN_BYTES, get_parse_pool, run_in_pool,
+                                         run_in_thread, single_flight, spool_to_path)
 
 _XML_SOURCE_CACHE: Dict[int, Any] = {}
 _XML_SOURCE_CACHE_LOCK = None # Will be initialized if needed, or just use dict (assuming single worker for now or handled by GIL)
@@ -15,10 +23,18 @@ import threading
 import logging
 logger = logging.getLogger(__name__)
 _XML_SOURCE_CACHE_LOCK = threading.Lock()
-_XML_PARSING_LOCK = threading.Lock() # Prevent concurrent heavy parsing
-XML_SOURCE_CACHE_TTL_SECONDS = 0  # Cache geçici olarak kapalı
+XML_SOURCE_CACHE_TTL_SECONDS = 0  # 0 = süresiz; content_hash değişince (refresh_xml_cache) geçersiz olur
 XML_SOURCE_CACHE_MAX = 5
 CACHE_DIR = os.path.join(os.getcwd(), 'cache')
+
+# SupplierXML.parse_mode values: 'dom' = xmltodict (whole document), 'stream' = iterparse (row by row)
+XML_PARSE_MODES = ('dom', 'stream')
+XML_PRODUCT_TAGS = ('product', 'Product', 'item', 'Item', 'urun', 'Urun')
+XML_PRODUCT_MAX_DEPTH = 3  # root -> products -> product
+# Index record layout: 'dict' = one dict per record, 'compact' = columnar XmlRecordStore (less memory)
+XML_RECORD_STORE = os.environ.get('XML_RECORD_STORE', 'dict')
+# XmlChangeJournal satırları bu kadar gün tutulur; daha eski filigranlar tam karşılaştırmaya düşer
+XML_CHANGE_JOURNAL_RETENTION_DAYS = int(os.environ.get('XML_CHANGE_JOURNAL_RETENTION_DAYS', '7'))
 os.makedirs(CACHE_DIR, exist_ok=True)
 
 def load_supplier_xml_map():
@@ -79,125 +95,129 @@ def load_supplier_xml_map():
         mp[str(barcode)] = { 'quantity': qty, 'price': price }
     return mp
 
-def load_xml_source_index(xml_source_id: Any, force: bool = False) -> Dict[str, Dict[str, Any]]:
-    """Build a lightweight index from SupplierXML source for quick overrides."""
-    index: Dict[str, Dict[str, Any]] = {}
-    if not xml_source_id:
-        return index
-    
-    # Handle Excel sources (format: "excel:{file_id}")
-    source_str = str(xml_source_id)
-    if source_str.startswith('excel:'):
-        try:
-            excel_data = Setting.get('_EXCEL_TEMP_INDEX', '')
-            if excel_data:
-                excel_index = json.loads(excel_data)
-                # Convert to standard format
-                by_barcode = excel_index.get('by_barcode', {})
-                items = excel_index.get('items', [])
-                index['by_barcode'] = by_barcode
-                index['__records__'] = items
-                # Also add direct barcode lookups
-                for bc, record in by_barcode.items():
-                    index[bc] = record
-                return index
-        except Exception as e:
-            import logging
-            logging.warning(f"Failed to load Excel index: {e}")
-        return index
-    
-    try:
-        cache_key = int(xml_source_id)
-    except Exception:
-        cache_key = None
+def get_xml_parse_mode(src: Optional[SupplierXML]) -> str:
+    """Return the configured parse mode of a source ('dom' by default)."""
+    mode = (getattr(src, 'parse_mode', None) or 'dom').strip().lower()
+    return mode if mode in XML_PARSE_MODES else 'dom'
+
+def _local_tag(tag: str) -> str:
+    # '{namespace}tag' -> 'tag'
+    return tag.rsplit('}', 1)[-1] if '}' in tag else tag
+
+def _element_to_dict(elem) -> Any:
+    """Convert an ElementTree element to the same shape xmltodict.parse produces."""
+    text = (elem.text or '').strip()
+    if not len(elem) and not elem.attrib:
+        return text or None
+
+    node: Dict[str, Any] = {f'@{_local_tag(k)}': v for k, v in elem.attrib.items()}
+    for child in elem:
+        key = _local_tag(child.tag)
+        value = _element_to_dict(child)
+        if key in node:
+            existing = node[key]
+            if isinstance(existing, list):
+                existing.append(value)
+            else:
+                node[key] = [existing, value]
+        else:
+            node[key] = value
+    if text:
+        node['#text'] = text
+    return node
 
-    now = time.time()
-    ttl = XML_SOURCE_CACHE_TTL_SECONDS
-    if cache_key is not None:
-        with _XML_SOURCE_CACHE_LOCK:
-            cached = _XML_SOURCE_CACHE.get(cache_key)
-            if cached:
-                ts, data = cached
-                if ttl == 0 or (now - ts) <= ttl:
-                    # Removed deepcopy for performance with large (30k+) XML datasets.
-                    # Callers must treat this as read-only.
-                    return data
-                _XML_SOURCE_CACHE.pop(cache_key, None)
-
-    # Disk Cache devre dışı (geçici)
-    # cache_path = os.path.join(CACHE_DIR, f'xml_index_{xml_source_id}.json')
-    # if not force and os.path.exists(cache_path):
-    #     ...
-
-    with _XML_PARSING_LOCK:
-        # Re-verify cache inside lock to avoid redundant work
-        if cache_key is not None:
-            with _XML_SOURCE_CACHE_LOCK:
-                cached = _XML_SOURCE_CACHE.get(cache_key)
-                if cached:
-                    ts, data = cached
-                    if (now - ts) <= ttl: return data
+def iter_xml_product_rows(source: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Stream product rows out of an XML feed with iterparse.
+    The first element named like a product (see XML_PRODUCT_TAGS) within the top
+    XML_PRODUCT_MAX_DEPTH levels fixes the product depth; every element at that
+    depth is yielded as an xmltodict-style dict and then detached from the tree,
+    so memory stays bounded by a single product instead of the whole feed.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    stack = []
+    product_depth = None
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            if product_depth is None and len(stack) <= XML_PRODUCT_MAX_DEPTH and _local_tag(elem.tag) in XML_PRODUCT_TAGS:
+                product_depth = len(stack)
+            continue
 
-        try:
-            src = SupplierXML.query.filter_by(id=int(xml_source_id)).first()
-        except Exception:
-            return index
-        if not src or not src.url:
-            return index
+        depth = len(stack)
+        stack.pop()
+        if depth != product_depth:
+            continue
 
-        try:
-            logger.info(f"XML Source {xml_source_id}: Downloading from {src.url}...")
-            raw_xml = fetch_xml_from_url(src.url)
-            logger.info(f"XML Source {xml_source_id}: Downloaded {len(raw_xml)} bytes. Parsing with xmltodict...")
-            xml_obj = xmltodict.parse(raw_xml)
-            logger.info(f"XML Source {xml_source_id}: Parse complete.")
-        except Exception as e:
-            logger.error(f"XML Source {xml_source_id}: Error downloading or parsing: {e}")
-            index['_error'] = f"İndirme/Parse Hatası: {str(e)}"
-            return index
-
-    def find_product_list(data):
-        # 1. Direct match for User's known structure (root -> product)
-        if isinstance(data, dict):
-            if 'root' in data:
-                root = data['root']
-                if isinstance(root, dict) and 'product' in root:
-                    return root['product']
-                    
-            # 2. Direct keys at top level
-            for key in ['products', 'product', 'Items', 'items', 'Urunler', 'urunler', 'Urun', 'urun']:
-                if key in data:
-                    val = data[key]
-                    # If it's a list, great
-                    if isinstance(val, list):
-                        return val
-                    # If it's a dict, check if it contains a sub-list (e.g. products -> product)
-                    if isinstance(val, dict):
-                        for sub in ['product', 'Product', 'item', 'Item', 'urun', 'Urun']:
-                            if sub in val:
-                                return val[sub]
-                    # If straightforward dict (single item or container), return it to be listified
-                    return val
+        row = _element_to_dict(elem)
+        elem.clear()
+        if stack:
+            stack[-1].remove(elem)
+        if isinstance(row, dict):
+            yield row
 
-        # 3. Fallback: Return original data to be wrapped in list
-        return data
+def find_product_list(data):
+    # 1. Direct match for User's known structure (root -> product)
+    if isinstance(data, dict):
+        if 'root' in data:
+            root = data['root']
+            if isinstance(root, dict) and 'product' in root:
+                return root['product']
+                
+        # 2. Direct keys at top level
+        for key in ['products', 'product', 'Items', 'items', 'Urunler', 'urunler', 'Urun', 'urun']:
+            if key in data:
+                val = data[key]
+                # If it's a list, great
+                if isinstance(val, list):
+                    return val
+                # If it's a dict, check if it contains a sub-list (e.g. products -> product)
+                if isinstance(val, dict):
+                    for sub in ['product', 'Product', 'item', 'Item', 'urun', 'Urun']:
+                        if sub in val:
+                            return val[sub]
+                # If straightforward dict (single item or container), return it to be listified
+                return val
+
+    # 3. Fallback: Return original data to be wrapped in list
+    return data
+
+def _load_brand_mapping(user_id: Optional[int]) -> Dict[str, str]:
+    # Pre-load brand mapping to avoid 37k DB queries
+    mapping_data = Setting.get('XML_BRAND_MAPPING', user_id=user_id)
+    brand_mapping = {}
+    if mapping_data:
+        try:
+            brand_mapping = json.loads(mapping_data)
+        except Exception: pass
+    return brand_mapping
 
-    node = find_product_list(xml_obj)
-    
-    if node is None:
-        index['_error'] = "XML formatı tanınamadı (Ürün listesi bulunamadı). Lütfen XML yapısını kontrol edin."
-        return index
+def _build_xml_index(items: Iterable[Any], src: SupplierXML, xml_source_id: Any) -> Dict[str, Any]:
+    """Turn parsed product rows (xmltodict-style dicts) into the source index.
 
-    # Updated Indexing for Stock Code Priority
-    start_time = time.time()
-    items = node if isinstance(node, list) else [node]
-    logger.info(f"XML Source {xml_source_id}: Processing {len(items)} items using Simple Lookup...")
+    ``items`` may be a list (DOM mode) or a generator (stream mode); it is consumed once.
+    Field keys come from the source's learned extraction plan (see xml_extraction_plan);
+    the plan is refined from this feed and saved back when it changed.
+    """
+    plan = XmlExtractionPlan.from_json(getattr(src, 'extraction_plan', None))
+    index, plan = _index_xml_rows(items, src.user_id, _load_brand_mapping(src.user_id), plan)
+    if plan.changed and getattr(src, 'id', None):
+        _save_extraction_plan(src, plan)
+    return index
 
+def _index_xml_rows(items: Iterable[Any], user_id: Optional[int], brand_mapping: Dict[str, str],
+                    plan: Optional[XmlExtractionPlan] = None):
+    """DB-free part of _build_xml_index (also runs in parse pool workers). Returns (index, plan)."""
+    index: Dict[str, Any] = {}
     records: List[Dict[str, Any]] = []
     by_barcode: Dict[str, Dict[str, Any]] = {}
     by_stock_code: Dict[str, Dict[str, Any]] = {}
+    # Compact mode: each finished record dict is moved into the store and replaced by its view
+    store = XmlRecordStore() if XML_RECORD_STORE == 'compact' else None
 
-    def _g(row, *names):
+    def _g(row, names):
         for n in names:
             if isinstance(row, dict) and n in row and row[n] is not None:
                 val = str(row[n]).strip()
@@ -205,14 +225,8 @@ def load_xml_source_index(xml_source_id: Any, force: bool = False) -> Dict[str,
                     return val
         return ''
 
-    # Pre-load brand mapping to avoid 37k DB queries
-    mapping_data = Setting.get('XML_BRAND_MAPPING', user_id=src.user_id)
-    brand_mapping = {}
-    if mapping_data:
-        try:
-            brand_mapping = json.loads(mapping_data)
-        except Exception: pass
-    
+    plan, items = XmlExtractionPlan.learn_from(items, plan=plan)
+
     for i, row in enumerate(items):
         if not isinstance(row, dict):
             continue
@@ -221,9 +235,11 @@ def load_xml_source_index(xml_source_id: Any, force: bool = False) -> Dict[str,
         if i < 3:
             logger.info(f"Processing XML Item #{i}. Keys: {list(row.keys())[:10]}")
         
-        product_code = _g(row, 'productCode', 'ProductCode', 'product_code', 'Product_Code', 'code', 'Code')
-        model_code = _g(row, 'modelCode', 'ModelCode', 'model_code', 'Model_Code', 'groupCode', 'GroupCode')
-        barcode = _g(row, 'barcode', 'barcod', 'Barkod', 'BARKOD', 'productBarcode', 'ProductBarcode', 'Barcode')
+        # Learned key for each field; rows that don't fit the plan get the full alias lists
+        f = plan.rows.fields_for(row)
+        product_code = _g(row, f['product_code'])
+        model_code = _g(row, f['model_code'])
+        barcode = _g(row, f['barcode'])
 
         # DEBUG: Log extracted identifiers
         if i < 3:
@@ -243,21 +259,21 @@ def load_xml_source_index(xml_source_id: Any, force: bool = False) -> Dict[str,
         barcode = unique_id # Use the chosen ID as the effective barcode
         
         # Extract fields
-        title = _g(row, 'name', 'Name', 'productName', 'ProductName', 'title', 'Title')
-        description = _g(row, 'detail', 'Detail', 'description', 'Description')
+        title = _g(row, f['title'])
+        description = _g(row, f['description'])
         
         # Stock Code Priority: 
         # 1. Explicit stockCode field
         # 2. productCode field
         # 3. barcode (fallback)
-        stock_code = _g(row, 'stockCode', 'StockCode')
+        stock_code = _g(row, f['stock_code'])
         if not stock_code: stock_code = product_code
         if not stock_code: stock_code = barcode
         
-        quantity_str = _g(row, 'quantity', 'Quantity', 'stok', 'Stok', 'OnHand', 'stock') or '0'
-        price_str = _g(row, 'price', 'Price', 'salePrice', 'SalePrice', 'unitPrice', 'UnitPrice', 'listPrice', 'ListPrice') or '0'
-        vat_raw = _g(row, 'tax', 'Tax', 'taxRate', 'TaxRate')
-        brand_raw = _g(row, 'brand', 'Brand', 'marka', 'Marka', 'manufacturer', 'Manufacturer')
+        quantity_str = _g(row, f['quantity']) or '0'
+        price_str = _g(row, f['price']) or '0'
+        vat_raw = _g(row, f['vat'])
+        brand_raw = _g(row, f['brand'])
         
         quantity = to_int(quantity_str, 0)
         price = to_float(price_str, 0.0)
@@ -268,19 +284,19 @@ def load_xml_source_index(xml_source_id: Any, force: bool = False) -> Dict[str,
             vat_rate = 20.0
             
         # Apply Brand Mapping (Pre-loaded to avoid N queries)
-        brand = apply_brand_mapping(brand_raw, src.user_id, mapping_dict=brand_mapping)
+        brand = apply_brand_mapping(brand_raw, user_id, mapping_dict=brand_mapping)
 
         # Images extraction (Simplified for brevity, assuming helper or same logic)
         images: List[Dict[str, str]] = []
         # 1. Try standard Image1, Image2...
-        for k in range(1, 10):
-            img_val = _g(row, f'image{k}', f'Image{k}', f'Resim{k}', f'resim{k}')
+        for slot in plan.image_slots(f):
+            img_val = _g(row, slot)
             if img_val:
                 images.append({'url': img_val})
         
         # 2. Try 'Images' or 'Resimler' list/dict
         if not images:
-            img_node = row.get('Images') or row.get('images') or row.get('Resimler') or row.get('resimler')
+            img_node = first_present(row, f['images_node'])
             if img_node:
                 # If it's a list of strings or dicts
                 if isinstance(img_node, list):
@@ -304,23 +320,23 @@ def load_xml_source_index(xml_source_id: Any, force: bool = False) -> Dict[str,
         
         # 3. Try single 'Image' or 'Resim'
         if not images:
-             img_val = _g(row, 'Image', 'image', 'Resim', 'resim', 'picture', 'Picture')
+             img_val = _g(row, f['image_single'])
              if img_val:
                  images.append({'url': img_val})
 
-        link = _g(row, 'link', 'Link', 'url', 'Url', 'LİNK', 'Linkler', 'web', 'Web', 'productUrl', 'ProductUrl')
+        link = _g(row, f['link'])
         
         record = {
             'title': title,
             'link': link,
             'description': description,
-            'details': _g(row, 'detail', 'Detail', 'details', 'Details', 'detay', 'Detay', 'uzunaciklama', 'UzunAciklama'),
+            'details': _g(row, f['details']),
             'stockCode': stock_code,
             'quantity': quantity,
             'price': price,
             'vatRate': vat_rate,
             'brand': brand,
-            'category': _g(row, 'category', 'Category', 'top_category', 'TopCategory'),
+            'category': _g(row, f['category']),
             'images': images,
             'barcode': barcode,
             'productCode': product_code,
@@ -329,18 +345,12 @@ def load_xml_source_index(xml_source_id: Any, force: bool = False) -> Dict[str,
         }
         
         # Varyant bilgilerini cek (XML'de variants etiketi varsa)
-        variants_node = row.get('variants') or row.get('Variants') or row.get('varyantlar') or row.get('Varyantlar')
+        variants_node = first_present(row, f['variants_node'])
         if variants_node:
             # variants icerisindeki variant etiketlerini bul
-            variant_items = variants_node.get('variant') or variants_node.get('Variant') or variants_node
-            if not isinstance(variant_items, list):
-                variant_items = [variant_items] if variant_items else []
-            
-            for v in variant_items:
-                if not isinstance(v, dict):
-                    continue
-                
-                v_barcode = _g(v, 'barcode', 'Barcode', 'barkod', 'Barkod')
+            for v in iter_variant_rows(variants_node):
+                vf = plan.variants.fields_for(v)
+                v_barcode = _g(v, vf['barcode'])
                 if not v_barcode:
                     continue
 
@@ -352,14 +362,14 @@ def load_xml_source_index(xml_source_id: Any, force: bool = False) -> Dict[str,
                 v_record['productCode'] = product_code # Carry model level productCode
                 v_record['modelCode'] = model_code # Carry model level modelCode
                 v_record['details'] = record.get('details') # Carry HTML description
-                v_record['quantity'] = to_int(_g(v, 'stock', 'Stock', 'quantity', 'Quantity') or '0')
-                v_record['price'] = to_float(_g(v, 'price', 'Price') or str(price))
+                v_record['quantity'] = to_int(_g(v, vf['quantity']) or '0')
+                v_record['price'] = to_float(_g(v, vf['price']) or str(price))
                 
                 # Varyant ozelliklerini sakla (Eslesme icin kritik)
                 v_attrs = []
                 for k_attr in range(1, 4): # support name1..name3
-                    v_n = _g(v, f'name{k_attr}', f'Name{k_attr}')
-                    v_v = _g(v, f'value{k_attr}', f'Value{k_attr}')
+                    v_n = _g(v, vf[f'name{k_attr}'])
+                    v_v = _g(v, vf[f'value{k_attr}'])
                     if v_n and v_v:
                         v_attrs.append({'name': v_n, 'value': v_v})
                 
@@ -369,6 +379,8 @@ def load_xml_source_index(xml_source_id: Any, force: bool = False) -> Dict[str,
                     v_record['title'] = f"{title} ({', '.join([a['value'] for a in v_attrs])})"
                     v_record['title_normalized'] = v_record['title'].lower() if v_record['title'] else ""
                 
+                if store is not None:
+                    v_record = store.append(v_record)
                 records.append(v_record)
                 index[str(v_barcode)] = v_record
                 by_barcode[str(v_barcode)] = v_record
@@ -376,6 +388,8 @@ def load_xml_source_index(xml_source_id: Any, force: bool = False) -> Dict[str,
                     by_stock_code[str(stock_code).strip()] = v_record # Use parent's stock code for variant if no specific variant stock code
         else:
             # Varyant yoksa sadece ana urunu ekle (Zaten eklenmisti, sadece mantiksal ayrim)
+            if store is not None:
+                record = store.append(record)
             records.append(record)
             index[str(barcode)] = record
             by_barcode[str(barcode)] = record
@@ -389,35 +403,343 @@ def load_xml_source_index(xml_source_id: Any, force: bool = False) -> Dict[str,
     index['__records__'] = records
     index['by_barcode'] = by_barcode
     index['by_stock_code'] = by_stock_code # New Index
+
+    return index, plan
+
+
+def _save_extraction_plan(src: SupplierXML, plan: XmlExtractionPlan) -> None:
+    """Persist the learned plan on its own connection so the caller's session is left untouched."""
+    from app import db
+    from sqlalchemy.orm.attributes import set_committed_value
+    raw = plan.to_json()
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(SupplierXML.__table__.update()
+                         .where(SupplierXML.__table__.c.id == src.id)
+                         .values(extraction_plan=raw))
+        # Keep the loaded instance in sync without marking it dirty
+        set_committed_value(src, 'extraction_plan', raw)
+    except Exception as e:
+        logger.warning(f"XML Source {src.id}: extraction plan could not be saved: {e}")
+
+
+def _get_source_content_hash(xml_source_id: int) -> Optional[str]:
+    from app import db
+    try:
+        return db.session.query(SupplierXML.content_hash).filter(SupplierXML.id == xml_source_id).scalar()
+    except Exception:
+        return None
+
+def _cache_get(cache_key: int, current_hash: Optional[str], now: float) -> Optional[Dict[str, Any]]:
+    """
+    In-process cache lookup. Entries are keyed by the hash of the parsed feed and served while it
+    equals the source's content_hash (a source never refreshed, content_hash NULL, has nothing
+    to compare with and keeps its entry).
+    """
+    ttl = XML_SOURCE_CACHE_TTL_SECONDS
+    with _XML_SOURCE_CACHE_LOCK:
+        cached = _XML_SOURCE_CACHE.get(cache_key)
+        if not cached:
+            return None
+        ts, data, parsed_hash = cached
+        if (ttl == 0 or (now - ts) <= ttl) and (current_hash is None or parsed_hash == current_hash):
+            return data
+        _XML_SOURCE_CACHE.pop(cache_key, None)
+    return None
+
+def _cache_put(cache_key: int, index: Dict[str, Any], parsed_hash: Optional[str]) -> None:
+    with _XML_SOURCE_CACHE_LOCK:
+        if cache_key not in _XML_SOURCE_CACHE and len(_XML_SOURCE_CACHE) >= XML_SOURCE_CACHE_MAX:
+            oldest_key = min(_XML_SOURCE_CACHE.items(), key=lambda item: item[1][0])[0]
+            _XML_SOURCE_CACHE.pop(oldest_key, None)
+        _XML_SOURCE_CACHE[cache_key] = (time.time(), index, parsed_hash)
+
+def invalidate_xml_source_cache(xml_source_id: int, keep_hash: Optional[str] = None) -> None:
+    """Drop the in-process entry and every on-disk index of the source except keep_hash."""
+    with _XML_SOURCE_CACHE_LOCK:
+        _XML_SOURCE_CACHE.pop(int(xml_source_id), None)
+    xml_index_cache.invalidate(xml_source_id, keep_hash=keep_hash)
+
+def fetch_supplier_xml(src: SupplierXML, conditional: bool = False) -> Dict[str, Any]:
+    """
+    Download a source feed to a spool file (see download_xml_to_spool).
+    With conditional=True the validators stored on the source are sent, and a 304
+    or a body whose sha256 equals src.content_hash is reported as not_modified
+    (the file is closed and set to None in that case).
+    """
+    etag = src.etag if conditional else None
+    last_modified = src.last_modified if conditional else None
+    download = download_xml_to_spool(src.url, etag=etag, last_modified=last_modified)
+    if conditional and not download['not_modified'] and src.content_hash and download['content_hash'] == src.content_hash:
+        download['file'].close()
+        download['file'] = None
+        download['not_modified'] = True
+    return download
+
+def load_xml_source_index(xml_source_id: Any, force: bool = False, download: Optional[Dict[str, Any]] = None) -> Dict[str, Dict[str, Any]]:
+    """Build a lightweight index from SupplierXML source for quick overrides.
+
+    force skips the in-process cache; download is an already fetched feed
+    (fetch_supplier_xml result) to parse instead of downloading again.
+    """
+    index: Dict[str, Dict[str, Any]] = {}
+    if not xml_source_id:
+        return index
     
+    # Handle Excel sources (format: "excel:{file_id}")
+    source_str = str(xml_source_id)
+    if source_str.startswith('excel:'):
+        try:
+            excel_data = Setting.get('_EXCEL_TEMP_INDEX', '')
+            if excel_data:
+                excel_index = json.loads(excel_data)
+                # Convert to standard format
+                by_barcode = excel_index.get('by_barcode', {})
+                items = excel_index.get('items', [])
+                index['by_barcode'] = by_barcode
+                index['__records__'] = items
+                # Also add direct barcode lookups
+                for bc, record in by_barcode.items():
+                    index[bc] = record
+                return index
+        except Exception as e:
+            import logging
+            logging.warning(f"Failed to load Excel index: {e}")
+        return index
+    
+    try:
+        cache_key = int(xml_source_id)
+    except Exception:
+        cache_key = None
+
+    now = time.time()
+    current_hash = None
+    if cache_key is not None and not force:
+        # content_hash changes whenever refresh_xml_cache stores a new feed (in any worker)
+        current_hash = _get_source_content_hash(cache_key)
+        data = _cache_get(cache_key, current_hash, now)
+        if data is not None:
+            # Removed deepcopy for performance with large (30k+) XML datasets.
+            # Callers must treat this as read-only.
+            return data
+
+    # Same source (and same downloaded content) -> one load; other sources parse concurrently
+    flight_key = None if cache_key is None else (cache_key, force, download['content_hash'] if download else None)
+    return single_flight(flight_key, lambda: _load_xml_source_index(xml_source_id, cache_key, force, current_hash, download))
+
+def _load_xml_source_index(xml_source_id: Any, cache_key: Optional[int], force: bool,
+                           current_hash: Optional[str], download: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Single-flight body of load_xml_source_index: disk cache, else download (unless given) and parse.
+    The parse itself runs in the parse pool for large feeds."""
+    index: Dict[str, Any] = {}
+    if cache_key is not None and not force:
+        # Shared disk cache written by another worker (or an earlier run)
+        data = xml_index_cache.load_index(cache_key, current_hash)
+        if data is not None:
+            logger.info(f"XML Source {xml_source_id}: Loaded index from disk cache.")
+            _cache_put(cache_key, data, current_hash)
+            return data
+
+    try:
+        src = SupplierXML.query.filter_by(id=int(xml_source_id)).first()
+    except Exception:
+        return index
+    if not src or not src.url:
+        return index
+
+    parse_mode = get_xml_parse_mode(src)
+    owns_download = download is None
+    start_time = time.time()
+    try:
+        if owns_download:
+            logger.info(f"XML Source {xml_source_id}: Downloading from {src.url}...")
+            download = fetch_supplier_xml(src)
+        logger.info(f"XML Source {xml_source_id}: Downloaded {download['size']} bytes. Parsing ({parse_mode})...")
+        start_time = time.time()
+        args = (parse_mode, src.user_id, _load_brand_mapping(src.user_id), src.extraction_plan)
+        if download['size'] >= XML_PARSE_POOL_MIN_BYTES and get_parse_pool() is not None:
+            path = spool_to_path(download['file'])
+            try:
+                index, plan_json = run_in_pool(parse_xml_feed, path, *args, size=download['size'])
+            finally:
+                os.remove(path)
+        else:
+            download['file'].seek(0)
+            index, plan_json = run_in_thread(parse_xml_feed, download['file'], *args)
+    except Exception as e:
+        logger.error(f"XML Source {xml_source_id}: Error downloading or parsing: {e}")
+        index['_error'] = f"İndirme/Parse Hatası: {str(e)}"
+        return index
+    finally:
+        if owns_download and download and download.get('file'):
+            download['file'].close()
+
+    if '_error' in index:
+        return index
+    if plan_json:
+        _save_extraction_plan(src, XmlExtractionPlan.from_json(plan_json))
+
+    records = index['__records__']
     logger.info(f"XML Source {xml_source_id}: Finished processing {len(records)} records in {time.time() - start_time:.2f} seconds.")
 
     if cache_key is not None:
-        with _XML_SOURCE_CACHE_LOCK:
-            if len(_XML_SOURCE_CACHE) >= XML_SOURCE_CACHE_MAX:
-                oldest_key = min(_XML_SOURCE_CACHE.items(), key=lambda item: item[1][0])[0]
-                _XML_SOURCE_CACHE.pop(oldest_key, None)
-            _XML_SOURCE_CACHE[cache_key] = (now, index)
-
-    # Disk Cache kaydetme devre dışı (geçici)
-    # try:
-    #     with open(cache_path, 'w', encoding='utf-8') as f:
-    #         json.dump(index, f)
-    # except Exception:
-    #     pass
+        # Keyed by what was parsed. The disk file is only written when that is the hash the
+        # other workers look up (the source's content_hash); refresh_xml_cache writes it
+        # after recording a new hash.
+        _cache_put(cache_key, index, download['content_hash'])
+        if download['content_hash'] and download['content_hash'] == src.content_hash:
+            xml_index_cache.save_index(cache_key, download['content_hash'], index)
 
     return index
 
+def parse_xml_feed(source: Any, parse_mode: str, user_id: Optional[int], brand_mapping: Dict[str, str],
+                   plan_json: Optional[str]):
+    """
+    Parse a feed (path or file object) and build its index without touching the DB,
+    so it can run in a parse pool worker. Returns (index, plan_json) where plan_json is the
+    refined extraction plan when it changed, else None.
+    """
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            return parse_xml_feed(f, parse_mode, user_id, brand_mapping, plan_json)
+
+    not_found = "XML formatı tanınamadı (Ürün listesi bulunamadı). Lütfen XML yapısını kontrol edin."
+    if parse_mode == 'stream':
+        # Stream mode: rows are parsed and indexed one by one, the DOM is never built
+        items = iter_xml_product_rows(source)
+    else:
+        xml_obj = xmltodict.parse(source)
+        node = find_product_list(xml_obj)
+        if node is None:
+            return {'_error': not_found}, None
+        items = node if isinstance(node, list) else [node]
+
+    index, plan = _index_xml_rows(items, user_id, brand_mapping, XmlExtractionPlan.from_json(plan_json))
+    if parse_mode == 'stream' and not index['__records__']:
+        return {'_error': not_found}, None
+    return index, (plan.to_json() if plan.changed else None)
+
 def generate_random_barcode() -> str:
     """Generate a random 13-digit EAN-like barcode."""
     import random
     return "".join([str(random.randint(0, 9)) for _ in range(13)])
 
-def refresh_xml_cache(xml_source_id: int, job_id: Optional[str] = None) -> Dict[str, Any]:
+# Columns rewritten when a cached row's content hash changes
+_CACHED_XML_UPDATE_COLUMNS = ('user_id', 'barcode', 'title', 'price', 'quantity', 'brand', 'category',
+                              'images_json', 'raw_data', 'row_hash')
+
+def _cached_xml_mapping(r: Dict[str, Any], src: SupplierXML) -> Dict[str, Any]:
+    raw_data = json.dumps(materialize_record(r), sort_keys=True)
+    return {
+        'xml_source_id': src.id,
+        'user_id': src.user_id,
+        'stock_code': r.get('stockCode') or r.get('barcode') or 'unknown',
+        'barcode': r.get('barcode'),
+        'title': r.get('title'),
+        'price': r.get('price', 0.0),
+        'quantity': r.get('quantity', 0),
+        'brand': r.get('brand'),
+        'category': r.get('category'),
+        'images_json': json.dumps(r.get('images', [])),
+        'raw_data': raw_data,
+        'row_hash': hashlib.md5(raw_data.encode('utf-8')).hexdigest(),
+    }
+
+def apply_cached_xml_delta(src: SupplierXML, records: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Bring CachedXmlProduct rows of a source in line with records, touching only the
+    rows whose content hash changed. Rows are keyed by (xml_source_id, stock_code);
+    when several records share a stock code (variants carry their parent's stockCode)
+    the last one wins, same as perform_sync. Their count is returned as 'collapsed'.
+    Price / quantity changes, new and dropped stock codes are appended to the source's
+    XmlChangeJournal (incremental Direct Push reads them).
+    Flushes but does not commit: the caller commits once so readers never see a
+    half-written or empty cache.
+    """
+    from app import db
+    from app.models import CachedXmlProduct
+    from app.services.bulk_loader import bulk_upsert
+
+    new_rows: Dict[str, Dict[str, Any]] = {}
+    for r in records:
+        m = _cached_xml_mapping(r, src)
+        new_rows[m['stock_code']] = m
+
+    existing = {
+        sc: (row_id, row_hash, price, quantity)
+        for row_id, sc, row_hash, price, quantity in db.session.query(
+            CachedXmlProduct.id, CachedXmlProduct.stock_code, CachedXmlProduct.row_hash,
+            CachedXmlProduct.price, CachedXmlProduct.quantity
+        ).filter(CachedXmlProduct.xml_source_id == src.id)
+    }
+
+    to_insert = [m for sc, m in new_rows.items() if sc not in existing]
+    to_update = [m for sc, m in new_rows.items() if sc in existing and existing[sc][1] != m['row_hash']]
+    to_delete = [row_id for sc, (row_id, *_) in existing.items() if sc not in new_rows]
+    batch_size = 1000
+
+    # (stock_code, old_price, new_price, old_quantity, new_quantity)
+    changes = [(m['stock_code'], None, m['price'], None, m['quantity']) for m in to_insert]
+    for m in to_update:
+        _, _, old_price, old_qty = existing[m['stock_code']]
+        if old_price != m['price'] or old_qty != m['quantity']:
+            changes.append((m['stock_code'], old_price, m['price'], old_qty, m['quantity']))
+    changes.extend((sc, price, None, qty, None) for sc, (_, _, price, qty) in existing.items() if sc not in new_rows)
+    _append_change_journal(src, changes)
+
+    # COPY + ON CONFLICT merge on PostgreSQL, executemany upsert on SQLite
+    now = datetime.now()
+    bulk_upsert(
+        CachedXmlProduct,
+        [dict(m, last_updated=now) for m in to_insert + to_update],
+        conflict_cols=('xml_source_id', 'stock_code'),
+        update_cols=_CACHED_XML_UPDATE_COLUMNS + ('last_updated',),
+    )
+
+    for chunk in chunked(to_delete, batch_size):
+        CachedXmlProduct.query.filter(CachedXmlProduct.id.in_(chunk)).delete(synchronize_session=False)
+    db.session.flush()
+
+    return {
+        'inserted': len(to_insert),
+        'updated': len(to_update),
+        'deleted': len(to_delete),
+        'unchanged': len(new_rows) - len(to_insert) - len(to_update),
+        'collapsed': len(records) - len(new_rows),
+        'journaled': len(changes),
+    }
+
+def _append_change_journal(src: SupplierXML, changes: List[tuple]) -> None:
+    """Append changes with consecutive seq numbers after src.change_seq and prune expired entries."""
+    from datetime import timedelta
+    from app import db
+    from app.models import XmlChangeJournal
+
+    if changes:
+        # Row lock on PostgreSQL: concurrent refreshes of a source get disjoint seq ranges
+        seq = db.session.query(SupplierXML.change_seq).filter(SupplierXML.id == src.id).with_for_update().scalar() or 0
+        now = datetime.now()
+        rows = [{'xml_source_id': src.id, 'seq': seq + i, 'stock_code': sc, 'old_price': old_price,
+                 'new_price': new_price, 'old_quantity': old_qty, 'new_quantity': new_qty, 'created_at': now}
+                for i, (sc, old_price, new_price, old_qty, new_qty) in enumerate(changes, 1)]
+        for chunk in chunked(rows, 1000):
+            db.session.execute(XmlChangeJournal.__table__.insert(), chunk)
+        src.change_seq = seq + len(changes)
+
+    cutoff = datetime.now() - timedelta(days=XML_CHANGE_JOURNAL_RETENTION_DAYS)
+    XmlChangeJournal.query.filter(XmlChangeJournal.xml_source_id == src.id,
+                                  XmlChangeJournal.created_at < cutoff).delete(synchronize_session=False)
+
+def refresh_xml_cache(xml_source_id: int, job_id: Optional[str] = None, force: bool = False) -> Dict[str, Any]:
     """
     Download XML, parse it, and save to central PostgreSQL database.
     High-Performance Bulk Update logic.
+
+    Unless force=True the download is a conditional GET; when the supplier answers
+    304 or the body hash matches the last cached one, nothing is parsed or written
+    and the result carries not_modified=True.
     """
+    from flask import current_app
     from app import db
     from app.models import CachedXmlProduct, SupplierXML
     from app.services.job_queue import append_mp_job_log, update_job_progress
@@ -426,13 +748,31 @@ def refresh_xml_cache(xml_source_id: int, job_id: Optional[str] = None) -> Dict[
     if not src:
         return {'success': False, 'message': 'XML kaynağı bulunamadı.'}
 
+    # The delta needs the unique (xml_source_id, stock_code) index and the change journal
+    missing = [name for name in current_app.config.get('SCHEMA_MISSING', [])
+               if name in ('idx_xml_stock_code', 'xml_change_journal')]
+    if missing:
+        msg = f"Veritabanı güncel değil ({', '.join(missing)} eksik). Önce `flask db upgrade` çalıştırılmalı."
+        logger.error(f"[XML-CACHE] {msg}")
+        if job_id: append_mp_job_log(job_id, msg, level='error')
+        return {'success': False, 'message': msg}
+
     msg = f"XML Önbelleği yenileniyor: {src.name}"
     logger.info(f"[XML-CACHE] {msg}")
     if job_id: append_mp_job_log(job_id, msg)
 
+    download = None
     try:
-        # 1. Download and parse XML (index format)
-        index = load_xml_source_index(xml_source_id, force=True)
+        # 1. Download (conditional GET) and parse XML (index format)
+        download = fetch_supplier_xml(src, conditional=not force)
+        if download['not_modified']:
+            msg = f"XML değişmemiş ({src.name}), önbellek zaten güncel."
+            logger.info(f"[XML-CACHE] {msg}")
+            if job_id: append_mp_job_log(job_id, msg)
+            return {'success': True, 'count': 0, 'not_modified': True, 'message': msg}
+
+        index = load_xml_source_index(xml_source_id, force=True, download=download)
+        download['file'].close()
         if '_error' in index:
             return {'success': False, 'message': index['_error']}
             
@@ -443,58 +783,37 @@ def refresh_xml_cache(xml_source_id: int, job_id: Optional[str] = None) -> Dict[
 
         if job_id: update_job_progress(job_id, 0, total_count, "Veritabanı güncelleniyor...")
 
-        # 2. Clear old cache in PostgreSQL for this source
-        CachedXmlProduct.query.filter_by(xml_source_id=xml_source_id).delete()
-        db.session.commit()
-        
-        # 3. Prepare bulk mappings (Instead of objects for max speed)
-        # Using mappings is faster as it skips state management per object
-        mappings = []
-        batch_size = 1000
-        processed = 0
-        
-        for r in records:
-            mappings.append({
-                'xml_source_id': xml_source_id,
-                'user_id': src.user_id,
-                'stock_code': r.get('stockCode') or r.get('barcode') or 'unknown',
-                'barcode': r.get('barcode'),
-                'title': r.get('title'),
-                'price': r.get('price', 0.0),
-                'quantity': r.get('quantity', 0),
-                'brand': r.get('brand'),
-                'category': r.get('category'),
-                'images_json': json.dumps(r.get('images', [])),
-                'raw_data': json.dumps(r)
-            })
-            
-            # Write in batches
-            if len(mappings) >= batch_size:
-                db.session.bulk_insert_mappings(CachedXmlProduct, mappings)
-                db.session.commit()
-                processed += len(mappings)
-                mappings = []
-                if job_id: update_job_progress(job_id, processed, total_count, f"{processed}/{total_count} ürün işlendi...")
-
-        # Write remaining
-        if mappings:
-            db.session.bulk_insert_mappings(CachedXmlProduct, mappings)
-            db.session.commit()
-            processed += len(mappings)
-            if job_id: update_job_progress(job_id, processed, total_count, "Tamamlanıyor...")
-
-        # 4. Update last_cached_at in main DB
+        # 2. Write only inserted/changed/deleted rows; everything (incl. validators) commits in one transaction
+        diff = apply_cached_xml_delta(src, records)
+        processed = diff['inserted'] + diff['updated'] + diff['unchanged']
+
+        # 4. Update last_cached_at and conditional GET validators in main DB
         src.last_cached_at = datetime.now()
+        src.etag = download['etag']
+        src.last_modified = download['last_modified']
+        src.content_hash = download['content_hash']
         db.session.commit()
+        if job_id: update_job_progress(job_id, total_count, total_count, "Tamamlanıyor...")
+
+        # Other workers see the new content_hash and switch to the new disk index
+        invalidate_xml_source_cache(xml_source_id, keep_hash=src.content_hash)
+        _cache_put(int(xml_source_id), index, src.content_hash)
+        xml_index_cache.save_index(int(xml_source_id), src.content_hash, index)
         
-        msg = f"XML Önbelleği başarıyla güncellendi. {processed} ürün PostgreSQL'e işlendi."
+        msg = (f"XML Önbelleği başarıyla güncellendi. {processed} ürün: {diff['inserted']} yeni, "
+               f"{diff['updated']} değişen, {diff['deleted']} silinen, {diff['unchanged']} aynı.")
+        if diff['collapsed']:
+            # One cached row per stock code: variants sharing their parent's stockCode keep only the last one
+            msg += f" Aynı stok koduna sahip {diff['collapsed']} varyant satırı tek satıra indirildi."
         logger.info(f"[XML-CACHE] {msg}")
         if job_id: append_mp_job_log(job_id, msg)
         
-        return {'success': True, 'count': processed}
+        return {'success': True, 'count': processed, 'diff': diff}
             
     except Exception as e:
         db.session.rollback()
+        if download and download.get('file'):
+            download['file'].close()
         msg = f"XML Önbelleği yenilenirken hata oluştu: {str(e)}"
         logger.error(f"[XML-CACHE] {msg}")
         if job_id: append_mp_job_log(job_id, msg, level='error')
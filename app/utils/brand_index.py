@@ -0,0 +1,187 @@
+"""
+Trendyol marka önbelleği için indeksli eşleştirici.
+match_brand_from_cache her aramada yüz binlerce markanın tamamını dolaşıp her birini iki re.sub ile
+normalize ediyordu. Marka listesi artık bir kez indekslenir:
+- normalize edilmiş ad -> ilk sıra (tam eşleşme ve "önbellekteki ad aranan adın içinde" kontrolü),
+- kelime -> sıra listesi ve sıralı kelime kümesi -> ilk sıra (kelime alt küme kuralları),
+- 3'lü harf grubu -> sıra listesi ("aranan ad önbellekteki adın içinde" kontrolü).
+Eski döngü listedeki ilk uyan markayı döndürüyordu; indeks her kuralın en küçük sırasını bulup
+aralarından en küçüğünü seçtiği için sonuç birebir aynıdır.
+"""
+import re
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from itertools import combinations
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+BRAND_INDEX_VERSION = 1  # bump when normalize_brand_name changes (persisted normalized names are then ignored)
+MIN_CONTAINMENT_LEN = 3  # "A" must not match "Apple"
+WORD_SUBSET_MAX = 10  # up to this many known search words, word subsets are looked up instead of counted
+
+_TR_TABLE = str.maketrans({
+    "ğ": "g", "Ğ": "g",
+    "ü": "u", "Ü": "u",
+    "ş": "s", "Ş": "s",
+    "ı": "i", "İ": "i",
+    "ö": "o", "Ö": "o",
+    "ç": "c", "Ç": "c",
+    "I": "i"
+})
+_PUNCT_RE = re.compile(r'[^\w\s]')
+_SPACES_RE = re.compile(r'\s+')
+
+_NONE = float('inf')
+
+
+def normalize_brand_name(name: str) -> str:
+    """
+    Normalize brand name for cache key (Legacy Style).
+    1. Turkish chars -> English
+    2. Lowercase
+    3. Remove punctuation but KEEP SPACES
+    Result: "Mavi Jeans" -> "mavi jeans"
+    """
+    if not name:
+        return ""
+    s = name.translate(_TR_TABLE).lower().strip()
+    s = _PUNCT_RE.sub('', s)  # Keep word chars and spaces
+    s = _SPACES_RE.sub(' ', s)  # Collapse multiple spaces
+    return s.strip()
+
+
+def _trigrams(s: str):
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+class BrandIndex:
+    """Lookup structures over the by_name dict of the brand cache (positions follow its order)."""
+
+    def __init__(self, by_name: Dict[str, Any], normalized: Optional[Sequence[str]] = None):
+        self.source = by_name
+        self.keys: List[str] = list(by_name)
+        values = [by_name[k] for k in self.keys]
+        if normalized is None or len(normalized) != len(self.keys):
+            normalized = [normalize_brand_name(_brand_name(v)) for v in values]
+        self.normalized: List[str] = list(normalized)
+
+        self._exact: Dict[str, int] = {}
+        self._word_sets: Dict[str, int] = {}  # sorted distinct words joined by ' ' -> first position
+        words: Dict[str, List[int]] = defaultdict(list)
+        grams: Dict[str, List[int]] = defaultdict(list)
+        word_counts = array('H')
+        exact_first, word_set_first = self._exact.setdefault, self._word_sets.setdefault
+        for i, norm in enumerate(self.normalized):
+            exact_first(norm, i)
+            tokens = set(norm.split())
+            word_counts.append(min(len(tokens), 0xFFFF))
+            if tokens:
+                word_set_first(' '.join(sorted(tokens)), i)
+                for token in tokens:
+                    words[token].append(i)
+            if len(norm) >= MIN_CONTAINMENT_LEN:
+                for gram in {norm[j:j + 3] for j in range(len(norm) - 2)}:
+                    grams[gram].append(i)
+        self._word_counts = word_counts
+        self._words = {k: array('I', v) for k, v in words.items()}
+        self._grams = {k: array('I', v) for k, v in grams.items()}
+        self._max_len = max((len(n) for n in self.normalized), default=0)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def covers(self, by_name: Dict[str, Any]) -> bool:
+        """False once the cache dict was replaced or brands were added / removed."""
+        return by_name is self.source and len(by_name) == len(self.keys)
+
+    def match(self, brand_name: str) -> Optional[Tuple[str, str]]:
+        """(by_name key, rule) of the first brand in cache order the legacy scan would return."""
+        search = normalize_brand_name(brand_name)
+        search_words = set(search.split())
+
+        best = self._exact.get(search, _NONE)
+        if len(search) >= MIN_CONTAINMENT_LEN:
+            best = min(best, self._cache_in_search(search))
+            best = min(best, self._search_in_cache(search, best))
+        best = min(best, self._words_match(search_words, best))
+        if best == _NONE:
+            return None
+        return self.keys[best], _rule(search, search_words, self.normalized[best])
+
+    def _words_match(self, search_words, limit: float) -> float:
+        """First brand (before limit) whose words contain all search words, or are a non-empty subset of them."""
+        known = [w for w in search_words if w in self._words]
+        if not known:
+            return _NONE
+        best = limit
+        if len(known) == len(search_words):
+            # Search words inside cache words: walk the rarest word's brands, check the others by bisect
+            postings = sorted((self._words[w] for w in known), key=len)
+            for i in postings[0]:
+                if i >= best:
+                    break
+                if all(_contains(p, i) for p in postings[1:]):
+                    best = i
+                    break
+        # Cache words inside search words: every non-empty combination of the known search words
+        if len(known) <= WORD_SUBSET_MAX:
+            word_sets = self._word_sets
+            for size in range(1, len(known) + 1):
+                for combo in combinations(sorted(known), size):
+                    i = word_sets.get(' '.join(combo))
+                    if i is not None and i < best:
+                        best = i
+        else:
+            hits: Counter = Counter()
+            for word in known:
+                hits.update(self._words[word])
+            counts = self._word_counts
+            best = min((i for i, n in hits.items() if n == counts[i] and i < best), default=best)
+        return best
+
+    def _cache_in_search(self, search: str) -> float:
+        """First brand whose normalized name (3+ chars) is a substring of the search."""
+        best = _NONE
+        exact = self._exact
+        longest = min(len(search), self._max_len)
+        for size in range(MIN_CONTAINMENT_LEN, longest + 1):
+            for start in range(len(search) - size + 1):
+                i = exact.get(search[start:start + size])
+                if i is not None and i < best:
+                    best = i
+        return best
+
+    def _search_in_cache(self, search: str, limit: float) -> float:
+        """First brand (before limit) whose normalized name contains the search."""
+        rarest = None
+        for gram in _trigrams(search):
+            posting = self._grams.get(gram)
+            if posting is None:
+                return _NONE
+            if rarest is None or len(posting) < len(rarest):
+                rarest = posting
+        normalized = self.normalized
+        for i in rarest:
+            if i >= limit:
+                break
+            if search in normalized[i]:
+                return i
+        return _NONE
+
+
+def _contains(posting: array, i: int) -> bool:
+    j = bisect_left(posting, i)
+    return j < len(posting) and posting[j] == i
+
+
+def _brand_name(value: Any) -> str:
+    return value.get("name") or "" if isinstance(value, dict) else ""
+
+
+def _rule(search: str, search_words, cache: str) -> str:
+    """Which legacy check matched (for the log line)."""
+    if search == cache:
+        return "Exact Norm"
+    if (search in cache or cache in search) and len(search) >= MIN_CONTAINMENT_LEN and len(cache) >= MIN_CONTAINMENT_LEN:
+        return "Containment"
+    return "Subset 1" if search_words.issubset(cache.split()) else "Subset 2"
@@ -1,4 +1,6 @@
-from typing import Iterable, List, Any, Optional
+from typing import Iterable, List, Any, Optional, Dict
+import hashlib
+import tempfile
 import requests
 from app.models import Setting
 
@@ -30,57 +32,37 @@ def get_marketplace_multiplier(marketplace: str, user_id: Optional[int] = None):
         mp_multiplier = 1.0
     return mp_multiplier
 
+def _resolve_user_id(user_id: Optional[int]) -> Optional[int]:
+    if user_id is None:
+        try:
+            from flask_login import current_user
+            if current_user and current_user.is_authenticated:
+                user_id = current_user.id
+        except Exception:
+            pass
+    return user_id
+
 def calculate_price(base_price: float, marketplace: str, user_id: Optional[int] = None, multiplier_override: Optional[float] = None, return_details: bool = False) -> Any:
     """
     Calculate final price based on GLOBAL tiered price rules.
     Looks up rules in GLOBAL_PRICE_RULES setting (JSON) which applies to ALL marketplaces.
     If no rules found or no matching range, returns the base price unchanged.
+    The rules are compiled once per user (app.utils.price_rules) and looked up with bisect.
     
     If return_details is True, returns (price, rule_description)
     """
-    if base_price <= 0:
-        return (0.0, "Geçersiz fiyat") if return_details else 0.0
+    from app.utils.price_rules import get_price_rules
 
-    # Ensure user_id
-    if user_id is None:
-        try:
-            from flask_login import current_user
-            if current_user and current_user.is_authenticated:
-                user_id = current_user.id
-        except Exception:
-            pass
+    return get_price_rules(_resolve_user_id(user_id)).apply(base_price, return_details=return_details)
 
-    import json
-    
-    # 1. Try GLOBAL Price Rules (applies to ALL marketplaces)
-    rules_json = Setting.get("GLOBAL_PRICE_RULES", "", user_id=user_id)
-    if rules_json:
-        try:
-            rules = json.loads(rules_json)
-            # Find the rule that matches the base_price range
-            for rule in rules:
-                rmin = float(rule.get('min', 0))
-                rmax = float(rule.get('max', 99999999))
-                if rmin <= base_price < rmax:
-                    percent = float(rule.get('percent', 0))
-                    fixed_on_top = float(rule.get('fixed', 0))
-                    price = base_price * (1 + (percent / 100.0)) + fixed_on_top
-                    
-                    desc = ""
-                    if percent > 0: desc += f"%{percent}"
-                    if fixed_on_top > 0: desc += f"{' + ' if desc else ''}{fixed_on_top} TL"
-                    if not desc: desc = "Kural eşleşti (değişim yok)"
-                    desc += f" ({rmin}-{rmax} TL arası)"
-                    
-                    final_p = round(price, 2)
-                    return (final_p, desc) if return_details else final_p
-        except Exception as e:
-            import logging
-            logging.error(f"Error calculating price with GLOBAL rules: {e}")
-
-    # 2. FALLBACK: No rules
-    final_p = round(base_price, 2)
-    return (final_p, "Fiyat kuralı yok") if return_details else final_p
+def calculate_prices(base_prices: Any, marketplace: str, user_id: Optional[int] = None, return_details: bool = False) -> Any:
+    """
+    calculate_price for a whole batch (list / np.ndarray of base prices) in one pass.
+    Returns an np.ndarray of final prices, or (prices, rule_descriptions) if return_details is True.
+    """
+    from app.utils.price_rules import get_price_rules
+
+    return get_price_rules(_resolve_user_id(user_id)).apply_many(base_prices, return_details=return_details)
 
 
 def chunked(iterable: Iterable[Any], size: int) -> Iterable[List[Any]]:
@@ -155,6 +137,81 @@ def fetch_xml_from_url(url: str):
         raise Exception(f"Beklenmedik bir hata oluştu: {e}")
 
 
+XML_DOWNLOAD_CHUNK_SIZE = 256 * 1024        # 256 KB per read
+XML_SPOOL_MAX_MEMORY = 8 * 1024 * 1024      # larger feeds roll over to a temp file on disk
+
+def download_xml_to_spool(url: str, etag: Optional[str] = None, last_modified: Optional[str] = None, timeout: int = 120) -> Dict[str, Any]:
+    """
+    Verilen URL'den XML'i parça parça (chunk) indirip bir spool dosyasına yazar.
+    etag / last_modified verilirse If-None-Match / If-Modified-Since gönderilir (conditional GET).
+
+    Returns:
+        {'not_modified': bool, 'file': file-like (None on 304), 'etag', 'last_modified',
+         'content_hash' (sha256 hex), 'size'}
+        The file is rewound to the start; the caller is responsible for closing it.
+    """
+    try:
+        if url.startswith('local:'):
+            import os
+            filename = url.split('local:', 1)[1]
+            base_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+            file_path = os.path.join(base_dir, 'xml_uploads', filename)
+
+            if not os.path.exists(file_path):
+                raise FileNotFoundError(f"Yerel XML dosyası bulunamadı: {filename}")
+
+            f = open(file_path, 'rb')
+            digest = hashlib.sha256()
+            size = 0
+            for chunk in iter(lambda: f.read(XML_DOWNLOAD_CHUNK_SIZE), b''):
+                digest.update(chunk)
+                size += len(chunk)
+            f.seek(0)
+            return {'not_modified': False, 'file': f, 'etag': None, 'last_modified': None,
+                    'content_hash': digest.hexdigest(), 'size': size}
+
+        headers = {'User-Agent': 'SOPYO-Integration-Client/1.0'}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        with requests.get(url, headers=headers, timeout=timeout, stream=True) as response:
+            if response.status_code == 304:
+                return {'not_modified': True, 'file': None, 'etag': etag, 'last_modified': last_modified,
+                        'content_hash': None, 'size': 0}
+            response.raise_for_status()
+
+            spool = tempfile.SpooledTemporaryFile(max_size=XML_SPOOL_MAX_MEMORY)
+            digest = hashlib.sha256()
+            size = 0
+            try:
+                for chunk in response.iter_content(chunk_size=XML_DOWNLOAD_CHUNK_SIZE):
+                    if not chunk:
+                        continue
+                    spool.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+            except Exception:
+                spool.close()
+                raise
+            spool.seek(0)
+
+            return {
+                'not_modified': False,
+                'file': spool,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'content_hash': digest.hexdigest(),
+                'size': size,
+            }
+
+    except FileNotFoundError as e:
+        raise Exception(str(e))
+    except requests.exceptions.RequestException as e:
+        raise Exception(f"URL'den XML çekilirken ağ hatası oluştu: {e}")
+
+
 def clean_forbidden_words(text: str, user_id: Optional[int] = None) -> str:
     """
     Remove forbidden words from text based on FORBIDDEN_KEYWORDS setting.
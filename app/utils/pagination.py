@@ -0,0 +1,192 @@
+"""
+Pazaryeri ürün listeleri için eşzamanlı sayfalama.
+fetch_all_* fonksiyonları sayfaları sırayla, aralarında time.sleep ile çekiyordu (40k ürün / 100 =
+400+ ardışık istek). fetch_pages ilk sayfayı çeker; toplam ürün sayısı biliniyorsa kalan sayfaları
+MP_PAGINATION_CONCURRENCY thread ile aynı anda ister. Hız sınırını istemcinin limitleyicisi
+(session.request) uygular. Ürünler sayfa sırasıyla döner; başarısız sayfalar tekrar denenir,
+yine olmazsa failed_pages'te raporlanır. Toplam eksik bildirilmişse son sayfadan sonra sırayla devam edilir.
+fetch_partitions birbirinden bağımsız listeleri (İdefix havuz statüleri, Pazarama onay durumları)
+MP_PARTITION_CONCURRENCY thread ile aynı anda çeker.
+"""
+import os
+import math
+import time
+import logging
+import concurrent.futures
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+PAGINATION_CONCURRENCY = int(os.environ.get('MP_PAGINATION_CONCURRENCY', '4'))
+PAGINATION_RETRIES = int(os.environ.get('MP_PAGINATION_RETRIES', '2'))
+PARTITION_CONCURRENCY = int(os.environ.get('MP_PARTITION_CONCURRENCY', '3'))
+PAGINATION_MAX_PAGES = 1000  # safety cap against APIs that keep returning full pages
+
+
+class PagedFetch:
+    """Outcome of fetch_pages: items in page order plus the pages that could not be fetched."""
+
+    def __init__(self):
+        self.items: List[Dict[str, Any]] = []
+        self.total: Optional[int] = None       # as reported by the first page
+        self.pages = 0                          # pages fetched successfully
+        self.failed_pages: Dict[int, str] = {}  # page -> last error
+        self.cancelled = False
+
+    @property
+    def complete(self) -> bool:
+        return not self.failed_pages and not self.cancelled
+
+
+def fetch_pages(
+    fetch_page: Callable[[int], Dict[str, Any]],
+    items_of: Callable[[Dict[str, Any]], List[Dict[str, Any]]],
+    page_size: int,
+    first_page: int = 0,
+    total_of: Optional[Callable[[Dict[str, Any]], Any]] = None,
+    concurrency: Optional[int] = None,
+    retries: Optional[int] = None,
+    on_progress: Optional[Callable[[int, Optional[int]], None]] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+    max_pages: int = PAGINATION_MAX_PAGES,
+) -> PagedFetch:
+    """
+    Fetch every page of a paginated listing.
+    fetch_page(page) returns the raw response (raises on failure), items_of(response) its rows,
+    total_of(response) the total row count (None/0 = unknown: pages are then fetched one by one).
+    on_progress(items_so_far, total) runs in the calling thread; should_stop() is checked before
+    every request (it may block while the job is paused).
+    """
+    concurrency = max(1, PAGINATION_CONCURRENCY if concurrency is None else concurrency)
+    retries = PAGINATION_RETRIES if retries is None else retries
+    result = PagedFetch()
+    pages: Dict[int, List[Dict[str, Any]]] = {}
+    last_page = first_page + max_pages - 1
+
+    def _fetch(page: int):
+        """Raw response of one page; None if stopped, raises after the last retry."""
+        for attempt in range(retries + 1):
+            if should_stop and should_stop():
+                return None
+            try:
+                return fetch_page(page)
+            except Exception as e:
+                if attempt >= retries:
+                    raise
+                wait_for = min(2 ** attempt, 8)
+                logger.warning("Page %s fetch failed (attempt %s/%s): %s — retrying in %ss",
+                               page, attempt + 1, retries + 1, e, wait_for)
+                time.sleep(wait_for)
+
+    def _rows(page: int):
+        response = _fetch(page)
+        return None if response is None else (items_of(response) or [])
+
+    def _progress():
+        if on_progress:
+            on_progress(sum(len(rows) for rows in pages.values()), result.total)
+
+    def _sequential(page: int) -> None:
+        # One page at a time until a short/empty page (total unknown or under-reported)
+        while page <= last_page:
+            try:
+                rows = _rows(page)
+            except Exception as e:
+                result.failed_pages[page] = str(e)
+                return
+            if rows is None:
+                result.cancelled = True
+                return
+            if not rows:
+                return
+            pages[page] = rows
+            _progress()
+            if len(rows) < page_size:
+                return
+            page += 1
+
+    try:
+        first = _fetch(first_page)
+    except Exception as e:
+        result.failed_pages[first_page] = str(e)
+        return result
+    if first is None:
+        result.cancelled = True
+        return result
+
+    rows = items_of(first) or []
+    if total_of:
+        try:
+            result.total = int(total_of(first) or 0) or None
+        except (TypeError, ValueError):
+            result.total = None
+    if rows:
+        pages[first_page] = rows
+        _progress()
+
+        if len(rows) >= page_size:
+            if result.total and concurrency > 1:
+                end = min(first_page + math.ceil(result.total / page_size) - 1, last_page)
+                with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency,
+                                                           thread_name_prefix='mp-pager') as pool:
+                    futures = {pool.submit(_rows, page): page for page in range(first_page + 1, end + 1)}
+                    for future in concurrent.futures.as_completed(futures):
+                        page = futures[future]
+                        try:
+                            rows = future.result()
+                        except Exception as e:
+                            result.failed_pages[page] = str(e)
+                            continue
+                        if rows is None:
+                            result.cancelled = True
+                        elif rows:
+                            pages[page] = rows
+                            _progress()
+                # Total under-reported (or grew meanwhile): continue after the last full page
+                if not result.cancelled and end not in result.failed_pages and len(pages.get(end, ())) >= page_size:
+                    _sequential(end + 1)
+            else:
+                _sequential(first_page + 1)
+
+    for page in sorted(pages):
+        result.items.extend(pages[page])
+    result.pages = len(pages)
+    if result.failed_pages:
+        logger.warning("Paginated fetch incomplete: %s page(s) failed: %s",
+                       len(result.failed_pages), sorted(result.failed_pages))
+    return result
+
+
+def fetch_partitions(
+    partitions: Dict[Hashable, Callable[[], PagedFetch]],
+    concurrency: Optional[int] = None,
+) -> Dict[Hashable, PagedFetch]:
+    """
+    Run independent listing fetches (one PagedFetch per partition) side by side; results keep the
+    order of `partitions`. Each runs under the caller's app context, so progress callbacks may use
+    the database. A partition that raises is reported as a failed first page.
+    """
+    concurrency = max(1, PARTITION_CONCURRENCY if concurrency is None else concurrency)
+    app = current_app._get_current_object() if has_app_context() else None
+
+    def _run(fetch: Callable[[], PagedFetch]) -> PagedFetch:
+        if app is None:
+            return fetch()
+        with app.app_context():
+            return fetch()
+
+    results: Dict[Hashable, PagedFetch] = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(concurrency, len(partitions) or 1),
+                                               thread_name_prefix='mp-partition') as pool:
+        futures = {key: pool.submit(_run, fetch) for key, fetch in partitions.items()}
+        for key, future in futures.items():
+            try:
+                results[key] = future.result()
+            except Exception as e:
+                logger.error("Partition %s fetch failed: %s", key, e)
+                failed = PagedFetch()
+                failed.failed_pages[0] = str(e)
+                results[key] = failed
+    return results
@@ -0,0 +1,154 @@
+"""
+GLOBAL_PRICE_RULES için derlenmiş fiyat kuralı motoru.
+calculate_price her üründe Setting.get + json.loads yapıp kademeleri baştan sona tarıyordu.
+Kurallar artık kullanıcı başına bir kez derlenir: tüm min/max sınırları sıralı bir diziye
+alınır, her aralığa o aralığı kapsayan ilk kural (listedeki sıra) atanır ve fiyat bisect ile
+bulunur. Çakışan kurallar, hatalı satırlar ve sınırlar eski döngüyle aynı sonucu verir.
+Derlenmiş kurallar ham JSON metniyle birlikte tutulur; metin değişmedikçe yeniden derlenmez.
+Metin Setting.get'in önbelleğinden geldiği için değişiklikleri tüm worker'lar görür.
+"""
+import json
+import logging
+import threading
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.models import Setting
+
+logger = logging.getLogger(__name__)
+
+NO_RULE_DESC = "Fiyat kuralı yok"
+INVALID_PRICE_DESC = "Geçersiz fiyat"
+
+_NO_RULE = -1
+_INVALID = -2
+
+
+class PriceRules:
+    """Tiered rules compiled to sorted boundaries; the first rule (list order) covering a price wins."""
+
+    def __init__(self, rules: Any = None):
+        # (factor, fixed, description) per rule; None: matching prices fall back to the base price
+        self._actions: List[Optional[Tuple[float, float, str]]] = []
+        ranges: List[Tuple[float, float]] = []
+        try:
+            for rule in rules or []:
+                try:
+                    rmin = float(rule.get('min', 0))
+                    rmax = float(rule.get('max', 99999999))
+                except Exception as e:
+                    # The loop stopped here before: later rules were never reached
+                    logger.error(f"Error calculating price with GLOBAL rules: {e}")
+                    break
+                try:
+                    percent = float(rule.get('percent', 0))
+                    fixed_on_top = float(rule.get('fixed', 0))
+                    action = (1 + (percent / 100.0), fixed_on_top, _describe(percent, fixed_on_top, rmin, rmax))
+                except Exception as e:
+                    logger.error(f"Error calculating price with GLOBAL rules: {e}")
+                    action = None
+                self._actions.append(action)
+                ranges.append((rmin, rmax))
+        except TypeError as e:  # not a list
+            logger.error(f"Error calculating price with GLOBAL rules: {e}")
+
+        self._bounds: List[float] = sorted({b for r in ranges if r[0] < r[1] for b in r})
+        # Rule index for [bounds[i], bounds[i + 1])
+        self._winner: List[int] = []
+        for lo, hi in zip(self._bounds, self._bounds[1:]):
+            self._winner.append(next((i for i, (rmin, rmax) in enumerate(ranges) if rmin <= lo and hi <= rmax), _NO_RULE))
+        self._bounds_arr = np.asarray(self._bounds, dtype=np.float64)
+        self._winner_arr = np.asarray(self._winner + [_NO_RULE], dtype=np.int64)
+
+    @classmethod
+    def from_json(cls, rules_json: Optional[str]) -> 'PriceRules':
+        if not rules_json:
+            return cls()
+        try:
+            return cls(json.loads(rules_json))
+        except Exception as e:
+            logger.error(f"Error calculating price with GLOBAL rules: {e}")
+            return cls()
+
+    def __bool__(self) -> bool:
+        return bool(self._actions)
+
+    def _rule_for(self, base_price: float) -> int:
+        i = bisect_right(self._bounds, base_price) - 1
+        return self._winner[i] if 0 <= i < len(self._winner) else _NO_RULE
+
+    def apply(self, base_price: float, return_details: bool = False) -> Any:
+        """Final price for one base price (calculate_price semantics)."""
+        if base_price <= 0:
+            return (0.0, INVALID_PRICE_DESC) if return_details else 0.0
+        rule = self._rule_for(base_price)
+        action = self._actions[rule] if rule >= 0 else None
+        if action is None:
+            final_p = round(base_price, 2)
+            return (final_p, NO_RULE_DESC) if return_details else final_p
+        factor, fixed_on_top, desc = action
+        final_p = round(base_price * factor + fixed_on_top, 2)
+        return (final_p, desc) if return_details else final_p
+
+    def apply_many(self, base_prices: Sequence[float], return_details: bool = False) -> Any:
+        """Vectorised apply; None / NaN prices count as invalid (0.0)."""
+        base = np.asarray(base_prices, dtype=np.float64).reshape(-1)
+        invalid = ~(base > 0)
+        slot = np.searchsorted(self._bounds_arr, base, side='right') - 1
+        rule = np.where(slot >= 0, self._winner_arr[np.clip(slot, 0, len(self._winner_arr) - 1)], _NO_RULE)
+        rule[invalid] = _INVALID
+
+        factor = np.ones(len(self._actions) + 2)
+        fixed = np.zeros(len(self._actions) + 2)
+        for i, action in enumerate(self._actions):
+            if action is not None:
+                factor[i], fixed[i] = action[0], action[1]
+        # Same float operations as apply(); -1 / -2 index the neutral tail entries
+        raw = np.where(invalid, 0.0, base * factor[rule] + fixed[rule])
+        # Python's round() per value so batch and single prices never differ by a kuruş
+        prices = np.fromiter((round(p, 2) for p in raw.tolist()), dtype=np.float64, count=len(raw))
+        if not return_details:
+            return prices
+        return prices, [self._description(r) for r in rule.tolist()]
+
+    def _description(self, rule: int) -> str:
+        if rule == _INVALID:
+            return INVALID_PRICE_DESC
+        action = self._actions[rule] if rule >= 0 else None
+        return action[2] if action is not None else NO_RULE_DESC
+
+
+def _describe(percent: float, fixed_on_top: float, rmin: float, rmax: float) -> str:
+    desc = ""
+    if percent > 0: desc += f"%{percent}"
+    if fixed_on_top > 0: desc += f"{' + ' if desc else ''}{fixed_on_top} TL"
+    if not desc: desc = "Kural eşleşti (değişim yok)"
+    desc += f" ({rmin}-{rmax} TL arası)"
+    return desc
+
+
+_CACHE: Dict[Optional[int], Tuple[Optional[str], PriceRules]] = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def get_price_rules(user_id: Optional[int] = None) -> PriceRules:
+    """Compiled GLOBAL_PRICE_RULES of a user; recompiled only when the stored JSON changes."""
+    raw = Setting.get("GLOBAL_PRICE_RULES", "", user_id=user_id)
+    with _CACHE_LOCK:
+        cached = _CACHE.get(user_id)
+    if cached is not None and cached[0] == raw:
+        return cached[1]
+    rules = PriceRules.from_json(raw)
+    with _CACHE_LOCK:
+        _CACHE[user_id] = (raw, rules)
+    return rules
+
+
+def invalidate_price_rules(user_id: Optional[int] = None, all_users: bool = False) -> None:
+    with _CACHE_LOCK:
+        if all_users:
+            _CACHE.clear()
+        else:
+            _CACHE.pop(user_id, None)
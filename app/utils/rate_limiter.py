@@ -1,47 +1,312 @@
+import os
+import re
 import time
+import struct
+import hashlib
+import tempfile
 import threading
+from email.utils import parsedate_to_datetime
 from functools import wraps
+from typing import Any, Callable, Dict, Optional
 import logging
 
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: the file backend falls back to per-process state
+    fcntl = None
+
+from config import Config
+
 logger = logging.getLogger(__name__)
 
+# Adaptive backoff after a 429 without Retry-After: base * 2^(consecutive 429s - 1), capped
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_MAX_SECONDS = 120.0
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After header (delta-seconds or HTTP-date) -> seconds to wait, None if absent/invalid."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+def credential_key(*parts: Any) -> str:
+    """Stable short key for a seller credential (the secret itself is never kept in limiter state)."""
+    raw = '\x1f'.join(str(p) for p in parts if p is not None)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16]
+
+
+class _BucketState:
+    __slots__ = ('tat', 'blocked_until', 'streak')
+
+    def __init__(self, tat: float = 0.0, blocked_until: float = 0.0, streak: int = 0):
+        self.tat = tat                      # theoretical arrival time of the next call
+        self.blocked_until = blocked_until  # backoff after 429
+        self.streak = streak                # consecutive 429s
+
+
+class LocalBucketStore:
+    """Bucket state in this process only."""
+    backend = 'local'
+
+    def __init__(self, name: str):
+        self._state = _BucketState()
+        self._lock = threading.Lock()
+
+    def update(self, fn: Callable[[_BucketState, float], Any]) -> Any:
+        """Run fn(state, now) atomically; fn mutates state in place."""
+        with self._lock:
+            return fn(self._state, time.monotonic())
+
+
+class FileBucketStore:
+    """
+    Bucket state in a small file under RATE_LIMIT_DIR, updated under flock: every worker
+    process on the host shares one budget. Times are wall-clock (time.time()).
+    """
+    backend = 'file'
+    _FORMAT = struct.Struct('<ddi')
+
+    def __init__(self, name: str, directory: Optional[str] = None):
+        directory = directory or Config.RATE_LIMIT_DIR or os.path.join(tempfile.gettempdir(), 'vidos_rate_limits')
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, re.sub(r'[^A-Za-z0-9_.-]', '_', name) + '.bucket')
+        self._lock = threading.Lock()  # flock does not exclude threads sharing the descriptor
+        self._fd: Optional[int] = None
+        self._pid: Optional[int] = None
+
+    def _descriptor(self) -> int:
+        # A descriptor inherited over fork shares its lock with the parent: open one per process
+        if self._fd is None or self._pid != os.getpid():
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            self._pid = os.getpid()
+        return self._fd
+
+    def update(self, fn: Callable[[_BucketState, float], Any]) -> Any:
+        with self._lock:
+            fd = self._descriptor()
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                raw = os.pread(fd, self._FORMAT.size, 0)
+                state = _BucketState(*self._FORMAT.unpack(raw)) if len(raw) == self._FORMAT.size else _BucketState()
+                before = (state.tat, state.blocked_until, state.streak)
+                result = fn(state, time.time())
+                if (state.tat, state.blocked_until, state.streak) != before:
+                    os.pwrite(fd, self._FORMAT.pack(state.tat, state.blocked_until, state.streak), 0)
+                return result
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+class PostgresBucketStore:
+    """
+    Bucket state in the rate_limit_buckets table, row-locked per call: shared by every host.
+    Times come from the database clock so hosts with skewed clocks agree.
+    """
+    backend = 'postgres'
+
+    def __init__(self, name: str, engine):
+        self.key = name
+        self._engine = engine
+
+    def update(self, fn: Callable[[_BucketState, float], Any]) -> Any:
+        from sqlalchemy import select, text, update
+        from sqlalchemy.dialects.postgresql import insert
+        from app.models import RateLimitBucket
+
+        table = RateLimitBucket.__table__
+        with self._engine.begin() as conn:
+            now = float(conn.execute(text('SELECT EXTRACT(EPOCH FROM clock_timestamp())')).scalar())
+            conn.execute(insert(table).values(key=self.key, tat=0, blocked_until=0, streak=0)
+                         .on_conflict_do_nothing(index_elements=['key']))
+            row = conn.execute(select(table.c.tat, table.c.blocked_until, table.c.streak)
+                               .where(table.c.key == self.key).with_for_update()).one()
+            state = _BucketState(*row)
+            before = tuple(row)
+            result = fn(state, now)
+            if (state.tat, state.blocked_until, state.streak) != before:
+                conn.execute(update(table).where(table.c.key == self.key)
+                             .values(tat=state.tat, blocked_until=state.blocked_until, streak=state.streak))
+            return result
+
+
+def backend_for(marketplace: str) -> str:
+    return os.environ.get(f'RATE_LIMIT_BACKEND_{marketplace.upper()}', Config.RATE_LIMIT_BACKEND).lower()
+
+
+def make_bucket_store(name: str, backend: str):
+    """Store for a bucket; falls back to per-process state when the backend cannot be used here."""
+    if backend == 'postgres':
+        try:
+            from flask import has_app_context
+            from app import db
+            if has_app_context() and db.engine.dialect.name == 'postgresql':
+                return PostgresBucketStore(name, db.engine)
+        except Exception as e:
+            logger.warning("Postgres rate limit store unavailable (%s): %s", name, e)
+        backend = 'file'
+    if backend == 'file':
+        if fcntl is not None:
+            try:
+                return FileBucketStore(name)
+            except OSError as e:
+                logger.warning("File rate limit store unavailable (%s): %s", name, e)
+    return LocalBucketStore(name)
+
+
 class RateLimiter:
     """
-    Thread-safe rate limiter.
-    Ensures that no more than `max_calls` are made within `period` seconds.
+    Thread-safe rate limiter (GCRA: token bucket with continuous refill).
+    Allows `max_calls` per `period` seconds on average, at most `burst` back-to-back.
+    A caller reserves its slot under the lock and sleeps outside it, so waiting threads
+    are served in order and never block each other. feedback() applies 429 / Retry-After
+    backoff to the whole bucket. The bucket state lives in `store` (per process by default;
+    see make_bucket_store for the shared backends); stats are per process.
     """
-    def __init__(self, max_calls: int, period: float):
+    def __init__(self, max_calls: int, period: float, burst: Optional[int] = None, name: str = '',
+                 store=None):
         self.max_calls = max_calls
         self.period = period
-        self.tokens = max_calls
-        self.last_refill = time.time()
-        self.lock = threading.Lock()
+        self.burst = burst or max(1, max_calls // 10)
+        self.name = name
+        self.interval = period / max_calls               # emission interval
+        self.tolerance = self.interval * (self.burst - 1)
+        self.store = store or LocalBucketStore(name)
+        self.lock = threading.Lock()  # guards _stats
+        self._stats = {'calls': 0, 'waited_calls': 0, 'wait_seconds': 0.0, 'max_wait': 0.0,
+                       'throttled': 0, 'last_retry_after': None}
+
+    def _take_slot(self, state: _BucketState, now: float) -> float:
+        tat = max(state.tat, now)
+        start = max(tat - self.tolerance, state.blocked_until, now)
+        # The slot is taken even if it lies in the future: later callers queue behind it
+        state.tat = max(tat, start) + self.interval
+        return start - now
+
+    def reserve(self) -> float:
+        """Take the next slot; returns how long the caller must sleep before using it."""
+        delay = self.store.update(self._take_slot)
+        with self.lock:
+            stats = self._stats
+            stats['calls'] += 1
+            if delay > 0:
+                stats['waited_calls'] += 1
+                stats['wait_seconds'] += delay
+                stats['max_wait'] = max(stats['max_wait'], delay)
+        return delay
 
     def wait(self):
         """Blocks until a token is available."""
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    def penalize(self, retry_after: Optional[float] = None) -> float:
+        """Pause the bucket after a 429: Retry-After if given, else exponential backoff. Returns the pause."""
+        def _apply(state: _BucketState, now: float) -> float:
+            state.streak += 1
+            pause = retry_after
+            if pause is None:
+                pause = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (state.streak - 1))
+            state.blocked_until = max(state.blocked_until, now + pause)
+            return pause
+
+        pause = self.store.update(_apply)
+        with self.lock:
+            self._stats['throttled'] += 1
+            self._stats['last_retry_after'] = pause
+        logger.warning("Rate limit hit (%s), pausing bucket for %.1fs", self.name or 'limiter', pause)
+        return pause
+
+    def feedback(self, response) -> None:
+        """Feed an HTTP response back: 429 (or any Retry-After) pauses the bucket, success resets the streak."""
+        status = getattr(response, 'status_code', None)
+        if status is None:
+            return
+        retry_after = parse_retry_after(response.headers.get('Retry-After')) if status in (429, 503) else None
+        if status == 429 or retry_after is not None:
+            self.penalize(retry_after)
+        elif status < 400 and self._stats['throttled']:
+            self.store.update(_reset_streak)
+
+    def metrics(self) -> Dict[str, Any]:
+        def _peek(state: _BucketState, now: float):
+            # Calls that could go out right now without waiting
+            available = (now + self.tolerance + self.interval - max(state.tat, now)) / self.interval
+            return (max(0.0, min(self.burst, available)) if state.blocked_until <= now else 0,
+                    max(0.0, state.blocked_until - now), state.streak)
+
+        available, blocked_for, streak = self.store.update(_peek)
         with self.lock:
-            while True:
-                now = time.time()
-                elapsed = now - self.last_refill
-                
-                # Refill tokens based on time passed
-                if elapsed > self.period:
-                    self.tokens = self.max_calls
-                    self.last_refill = now
-                elif self.tokens < self.max_calls:
-                     # Calculate if enough time has passed for at least 1 token refill
-                     # (Simple version: just reset if period passed, or wait)
-                     pass
-
-                if self.tokens > 0:
-                    self.tokens -= 1
-                    return
-                
-                # Sleep until basic period reset
-                sleep_time = self.period - elapsed
-                if sleep_time > 0:
-                    time.sleep(sleep_time)
-                # Continue loop to re-check
+            stats = dict(self._stats)
+        return dict(stats,
+                    backend=self.store.backend,
+                    rate_per_sec=round(1 / self.interval, 3),
+                    burst=self.burst,
+                    available=int(available),
+                    blocked_for=round(blocked_for, 3),
+                    throttle_streak=streak,
+                    wait_seconds=round(stats['wait_seconds'], 3),
+                    max_wait=round(stats['max_wait'], 3))
+
+    def __call__(self, func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            self.wait()
+            return func(*args, **kwargs)
+        return wrapper
+
+
+def _reset_streak(state: _BucketState, now: float) -> None:
+    state.streak = 0
+
+
+class MarketplaceLimiter:
+    """
+    One RateLimiter bucket per seller credential of a marketplace, so one seller's traffic
+    does not throttle the others. Calls without a key share the marketplace's default bucket.
+    Where the bucket state lives (process / host / database) comes from RATE_LIMIT_BACKEND.
+    """
+    def __init__(self, marketplace: str, max_calls: int, period: float, burst: Optional[int] = None):
+        self.marketplace = marketplace
+        self.max_calls = max_calls
+        self.period = period
+        self.burst = burst
+        self._buckets: Dict[str, RateLimiter] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, key: Optional[str] = None) -> RateLimiter:
+        key = key or 'default'
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    name = f'{self.marketplace}:{key}'
+                    bucket = self._buckets[key] = RateLimiter(
+                        self.max_calls, self.period, self.burst, name=name,
+                        store=make_bucket_store(name, backend_for(self.marketplace)))
+        return bucket
+
+    def wait(self, key: Optional[str] = None):
+        self.bucket(key).wait()
+
+    def feedback(self, key: Optional[str], response) -> None:
+        self.bucket(key).feedback(response)
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            buckets = dict(self._buckets)
+        return {key: bucket.metrics() for key, bucket in buckets.items()}
 
     def __call__(self, func):
         @wraps(func)
@@ -50,14 +315,28 @@ class RateLimiter:
             return func(*args, **kwargs)
         return wrapper
 
+
 # Global instances for marketplaces
 # Adjust limits as per API docs
-# Trendyol: Generally high limits but safer to be polite. 
+# Trendyol: Generally high limits but safer to be polite.
 # N11: Known for strict limits.
 # Pazarama: Unknown, use safe defaults.
 
-trendyol_limiter = RateLimiter(max_calls=30, period=10) # 3 calls/sec roughly
-n11_limiter = RateLimiter(max_calls=60, period=60)      # 1 call/sec
-pazarama_limiter = RateLimiter(max_calls=20, period=10) # 2 calls/sec
-hepsiburada_limiter = RateLimiter(max_calls=20, period=10) 
-idefix_limiter = RateLimiter(max_calls=20, period=10)
+trendyol_limiter = MarketplaceLimiter('trendyol', max_calls=30, period=10) # 3 calls/sec roughly
+n11_limiter = MarketplaceLimiter('n11', max_calls=60, period=60)           # 1 call/sec
+pazarama_limiter = MarketplaceLimiter('pazarama', max_calls=20, period=10) # 2 calls/sec
+hepsiburada_limiter = MarketplaceLimiter('hepsiburada', max_calls=20, period=10)
+idefix_limiter = MarketplaceLimiter('idefix', max_calls=20, period=10)
+
+MARKETPLACE_LIMITERS = {
+    'trendyol': trendyol_limiter,
+    'n11': n11_limiter,
+    'pazarama': pazarama_limiter,
+    'hepsiburada': hepsiburada_limiter,
+    'idefix': idefix_limiter,
+}
+
+
+def limiter_metrics() -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Bucket metrics of every marketplace limiter in this process (keys are credential hashes)."""
+    return {name: limiter.metrics() for name, limiter in MARKETPLACE_LIMITERS.items()}
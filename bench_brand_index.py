@@ -0,0 +1,252 @@
+"""
+Marka eşleştirici regresyon derlemi ve hız karşılaştırması (veritabanına dokunmaz).
+Sentetik bir marka önbelleği (Türkçe karakterler, noktalama, kısa adlar, normalize edilince çakışan
+adlar, birbirini içeren adlar) ve buna göre türetilmiş aramalar (tam ad, büyük/küçük harf ve Türkçe
+varyantları, alt/üst dizgiler, fazladan ya da eksik kelimeler, anlamsız girdiler) üretir.
+Her arama için eski tam tarama (_legacy_match) ile match_brand_from_cache'in aynı markayı
+döndürdüğünü kontrol eder, farklılıkları ve iki yolun arama başına süresini yazdırır.
+Kaydedilen normalize ad listesinin JSON'dan geri yüklenince aynı indeksi verdiği de kontrol edilir.
+Önce sabit bir derlem (FIXED_BRANDS / FIXED_QUERIES: alt küme, içerme, sıra önceliği, kısa adlar)
+beklenen sonuçlarla denenir. Herhangi bir uyuşmazlıkta çıkış kodu 1'dir.
+
+Kullanım: python bench_brand_index.py [marka_sayısı] [arama_sayısı]   (varsayılan: 50000 3000)
+"""
+import os
+import json
+import logging
+import random
+import sys
+import time
+
+sys.path.append(os.getcwd())
+
+from app.services import trendyol_service
+from app.utils.brand_index import BRAND_INDEX_VERSION, BrandIndex, normalize_brand_name
+
+WORDS = ['mavi', 'jeans', 'koton', 'LC', 'Waikiki', 'Defacto', 'Çiçek', 'Şık', 'Gölge', 'Işık', 'İnci',
+         'Ünlü', 'Home', 'Store', 'by', 'Collection', 'Kids', 'Sport', 'Türkiye', 'Adidas', 'Nike', 'Puma',
+         'A', 'Bo', 'X', 'Pro', 'Max', 'Life', 'Style', 'Moda', 'Giyim', 'Tekstil', 'Ev', 'Dekor', 'Kozmetik']
+PUNCT = ['', '', '', '&', '-', "'", '.', '!', ' & ', ' - ']
+
+# Brand cache in this order: the first brand (in cache order) that passes any rule wins
+FIXED_BRANDS = ["Jeans Mavi Kids", "Mavi Jeans", "Mavi", "LC Waikiki", "Waikiki", "A", "Bo", "Ab", "Çiçek Ev",
+                "Cicek", "Inci Home", "İnci", "Koton & Co", "Koton", "Pro Max", "Max", "X", "by", "Dekor",
+                "Ev Dekor", "Şık Giyim", "Sik", "a.b", "Puma 123", "Puma 12", "Sport", "Nike Sport Style",
+                "Home Store", "Store Home"]
+# (query, expected brand name or None)
+FIXED_QUERIES = [
+    ("mavi", "Mavi"),                     # exact key
+    ("MAVI", "Mavi"),
+    ("Mavi Jean", "Mavi Jeans"),          # search inside a cached name
+    ("jeans", "Jeans Mavi Kids"),         # containment: earlier brand wins over "Mavi Jeans"
+    ("Kids Jeans", "Jeans Mavi Kids"),    # search words subset of cached words
+    ("kids", "Jeans Mavi Kids"),
+    ("waikiki lc", "LC Waikiki"),         # same words, other order
+    ("LC", "LC Waikiki"),                 # 2 letters: only the word rule applies
+    ("ab", "Ab"),
+    ("a b", "A"),                         # cached words subset of search words
+    ("A.B", "a.b"),                       # exact key before normalization
+    ("AB!", "Ab"),
+    ("cicek", "Cicek"),                   # "Çiçek Ev" is not contained in "cicek"
+    ("ÇİÇEK EV", "Çiçek Ev"),
+    ("ev cicek", "Çiçek Ev"),
+    ("inci", "Inci Home"),                # containment in an earlier brand beats the exact "İnci"
+    ("INCI", "Inci Home"),
+    ("İNCİ", "Inci Home"),
+    ("koton co", "Koton & Co"),
+    ("koton", "Koton"),                   # exact key beats the earlier "Koton & Co"
+    ("co", "Koton & Co"),
+    ("max pro", "Pro Max"),
+    ("pro", "Pro Max"),
+    ("x", "X"),
+    ("by", "by"),
+    ("dekor ev", "Dekor"),                # word subset of an earlier brand beats the exact "Ev Dekor"
+    ("ev", "Çiçek Ev"),
+    ("sık", "Şık Giyim"),                 # earlier containment beats the exact "Sik"
+    ("ŞIK", "Şık Giyim"),
+    ("giyim şık", "Şık Giyim"),
+    ("puma 1", "Puma 123"),
+    ("puma", "Puma 123"),
+    ("puma 12", "Puma 12"),
+    ("sport nike", "Sport"),
+    ("Nike", "Nike Sport Style"),
+    ("style", "Nike Sport Style"),
+    ("store", "Home Store"),
+    ("home store", "Home Store"),
+    ("  Home   Store!! ", "Home Store"),
+    ("bo x", "Bo"),
+    ("b", None),                          # too short for containment, no word match
+    ("zzz", None),
+    ("!!!", None),
+    ("   ", None),
+    ("", None),
+]
+
+
+def _legacy_match(by_name, brand_name):
+    """match_brand_from_cache as it was before BrandIndex (kept here for comparison)."""
+    key = brand_name.lower().strip()
+    cached = by_name.get(key)
+    if cached:
+        return cached
+    normalized_search = normalize_brand_name(brand_name)
+    search_words = set(normalized_search.split())
+    for cache_key, cache_val in by_name.items():
+        normalized_cache = normalize_brand_name(cache_val["name"])
+        if normalized_search == normalized_cache:
+            return cache_val
+        if normalized_search in normalized_cache or normalized_cache in normalized_search:
+            if len(normalized_search) >= 3 and len(normalized_cache) >= 3:
+                return cache_val
+        if search_words:
+            cache_words = set(normalized_cache.split())
+            if cache_words:
+                if search_words.issubset(cache_words):
+                    return cache_val
+                if cache_words.issubset(search_words):
+                    return cache_val
+    return None
+
+
+def _reference_match(by_name, normalized, brand_name):
+    """Same scan as _legacy_match over pre-normalized names, fast enough to check every query."""
+    cached = by_name.get(brand_name.lower().strip())
+    if cached:
+        return cached
+    search = normalize_brand_name(brand_name)
+    search_words = set(search.split())
+    for cache_val, cache in zip(by_name.values(), normalized):
+        if search == cache:
+            return cache_val
+        if (search in cache or cache in search) and len(search) >= 3 and len(cache) >= 3:
+            return cache_val
+        if search_words:
+            cache_words = set(cache.split())
+            if cache_words and (search_words.issubset(cache_words) or cache_words.issubset(search_words)):
+                return cache_val
+    return None
+
+
+def _brand_name(rng):
+    words = rng.sample(WORDS, rng.choice([1, 1, 2, 2, 3]))
+    name = rng.choice(PUNCT).join(words) if len(words) > 1 and rng.random() < 0.3 else ' '.join(words)
+    if rng.random() < 0.5:
+        name += f' {rng.randrange(10000)}' if rng.random() < 0.5 else f'{rng.randrange(100)}'
+    if rng.random() < 0.05:
+        name = rng.choice(['A', 'Bo', 'XY', '!!!', 'İ', 'a.b', 'Pro'])
+    return name
+
+
+def _cache(n, rng):
+    by_name = {}
+    brand_id = 1000
+    while len(by_name) < n:
+        name = _brand_name(rng).strip()
+        if name and name.lower() not in by_name:
+            brand_id += 1
+            by_name[name.lower()] = {"id": brand_id, "name": name}
+    return by_name
+
+
+def _variant(name, rng):
+    kind = rng.randrange(9)
+    if kind == 0:
+        return name.upper()
+    if kind == 1:
+        return name.replace('i', 'ı').replace('s', 'ş').replace('c', 'ç')
+    if kind == 2:
+        return name[rng.randrange(max(1, len(name) - 2)):][:rng.randrange(1, 8)]
+    if kind == 3:
+        return f'{name} {rng.choice(WORDS)}'
+    if kind == 4:
+        return f'{rng.choice(WORDS)} {name}'
+    if kind == 5:
+        return ' '.join(reversed(name.split()))
+    if kind == 6:
+        return f'  {name}!!  '
+    if kind == 7:
+        return name.split()[0] if name.split() else name
+    return name
+
+
+def _queries(by_name, count, rng):
+    names = [v["name"] for v in by_name.values()]
+    queries = ['', ' ', '!!!', 'a', 'ab', 'xyz', 'zzzz qqqq', 'Ev\tDekor', 'IŞIK', 'ışık']
+    while len(queries) < count:
+        if rng.random() < 0.15:
+            queries.append(' '.join(rng.sample(WORDS, rng.randrange(1, 4))))
+        else:
+            queries.append(_variant(rng.choice(names), rng))
+    return queries
+
+
+def check_fixed_corpus():
+    """Run FIXED_QUERIES through the legacy scan and match_brand_from_cache; returns the failures."""
+    by_name = {}
+    for brand_id, name in enumerate(FIXED_BRANDS, 1):
+        by_name[name.lower()] = {"id": brand_id, "name": name}
+    trendyol_service._BRAND_CACHE.update(by_name=by_name, count=len(by_name), loaded=True, index=BrandIndex(by_name))
+
+    failures = []
+    for query, expected in FIXED_QUERIES:
+        legacy = _legacy_match(by_name, query) if query else None
+        indexed = trendyol_service.match_brand_from_cache(query)
+        legacy, indexed = legacy and legacy["name"], indexed and indexed["name"]
+        if not (legacy == indexed == expected):
+            failures.append((query, expected, legacy, indexed))
+    return failures
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 3000
+    logging.getLogger().setLevel(logging.WARNING)
+
+    failures = check_fixed_corpus()
+    print(f"--- fixed corpus: {len(FIXED_BRANDS)} brands, {len(FIXED_QUERIES)} queries, failures: {len(failures)} ---")
+    for q, expected, legacy, indexed in failures:
+        print(f"  {q!r}: expected={expected!r} legacy={legacy!r} indexed={indexed!r}")
+
+    rng = random.Random(25)
+    by_name = _cache(n, rng)
+    queries = _queries(by_name, count, rng)
+
+    t0 = time.perf_counter()
+    index = BrandIndex(by_name)
+    build = time.perf_counter() - t0
+    saved = json.loads(json.dumps({"by_name": by_name, "normalized": index.normalized,
+                                   "index_version": BRAND_INDEX_VERSION}, ensure_ascii=False))
+    t0 = time.perf_counter()
+    restored = BrandIndex(saved["by_name"], saved["normalized"])
+    reload = time.perf_counter() - t0
+    print(f"--- {n} brands, {count} queries ---")
+    print(f"index build {build:6.2f}s   from saved normalized names {reload:6.2f}s   "
+          f"same normalized: {restored.normalized == index.normalized}")
+
+    trendyol_service._BRAND_CACHE.update(by_name=by_name, count=len(by_name), loaded=True, index=index)
+    t0 = time.perf_counter()
+    indexed = [trendyol_service.match_brand_from_cache(q) for q in queries]
+    indexed_s = time.perf_counter() - t0
+
+    reference = [_reference_match(by_name, index.normalized, q) if q else None for q in queries]
+    mismatches = [(q, r and r["name"], m and m["name"]) for q, r, m in zip(queries, reference, indexed) if r is not m]
+    matched = sum(1 for m in indexed if m)
+    print(f"matched {matched}/{count}   mismatches vs legacy scan: {len(mismatches)}")
+    for q, r, m in mismatches[:20]:
+        print(f"  {q!r}: legacy={r!r} indexed={m!r}")
+
+    sample = queries[:min(len(queries), 200)]
+    t0 = time.perf_counter()
+    legacy = [_legacy_match(by_name, q) if q else None for q in sample]
+    legacy_s = time.perf_counter() - t0
+    same_sample = all(a is b for a, b in zip(legacy, indexed))
+    print(f"legacy  {legacy_s / len(sample) * 1000:9.3f} ms/lookup  (first {len(sample)} queries, identical={same_sample})")
+    print(f"indexed {indexed_s / count * 1000:9.3f} ms/lookup  speed-up={legacy_s / len(sample) / (indexed_s / count):.0f}x")
+
+    ok = not failures and not mismatches and same_sample and restored.normalized == index.normalized
+    print("OK" if ok else "FAILED: indexed matcher disagrees with the legacy scan")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+MarketplaceProduct toplu yazma karşılaştırması.
+Eski satır-satır (SELECT + add) yolu, bulk_insert_mappings ve bulk_upsert (PostgreSQL'de COPY)
+için saniyedeki satır sayısını ölçer. Geçici bir marketplace değeri kullanır ve sonunda temizler.
+
+Kullanım: python bench_bulk_loader.py [satır_sayısı] [user_id]
+"""
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.getcwd())
+
+from app import create_app, db
+
+app = create_app()
+
+BENCH_MARKETPLACE = '_bench_bulk'
+
+
+def _rows(user_id, n, suffix=''):
+    now = datetime.now()
+    return [{
+        'user_id': user_id,
+        'marketplace': BENCH_MARKETPLACE,
+        'barcode': f'BENCH{i:07d}',
+        'title': f'Bench Ürün {i}{suffix}',
+        'quantity': i % 50,
+        'price': 100.0 + i,
+        'sale_price': 90.0 + i,
+        'stock_code': f'SKU{i:07d}',
+        'status': 'Aktif',
+        'on_sale': True,
+        'last_sync_at': now,
+    } for i in range(n)]
+
+
+def _cleanup(MarketplaceProduct):
+    MarketplaceProduct.query.filter_by(marketplace=BENCH_MARKETPLACE).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def _legacy(MarketplaceProduct, rows):
+    for r in rows:
+        existing = db.session.query(MarketplaceProduct).filter_by(
+            user_id=r['user_id'], marketplace=r['marketplace'], barcode=r['barcode']).first()
+        if not existing:
+            existing = MarketplaceProduct(user_id=r['user_id'], marketplace=r['marketplace'], barcode=r['barcode'])
+            db.session.add(existing)
+        for k, v in r.items():
+            setattr(existing, k, v)
+    db.session.commit()
+
+
+def _timed(label, n, fn):
+    t0 = time.perf_counter()
+    fn()
+    dt = time.perf_counter() - t0
+    print(f"{label:<34} {dt:8.2f}s  {n / dt:10.0f} rows/s")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    with app.app_context():
+        from app.models import MarketplaceProduct, User
+        from app.services.bulk_loader import bulk_upsert
+
+        user_id = int(sys.argv[2]) if len(sys.argv) > 2 else User.query.first().id
+        print(f"--- {n} rows, dialect={db.engine.dialect.name}, user_id={user_id} ---")
+        _cleanup(MarketplaceProduct)
+        try:
+            rows = _rows(user_id, n)
+            _timed('legacy insert (SELECT + add)', n, lambda: _legacy(MarketplaceProduct, rows))
+            rows = _rows(user_id, n, ' v2')
+            _timed('legacy update (SELECT + add)', n, lambda: _legacy(MarketplaceProduct, rows))
+            _cleanup(MarketplaceProduct)
+
+            def _mappings():
+                db.session.bulk_insert_mappings(MarketplaceProduct, _rows(user_id, n))
+                db.session.commit()
+            _timed('bulk_insert_mappings (insert only)', n, _mappings)
+            _cleanup(MarketplaceProduct)
+
+            def _upsert(suffix):
+                bulk_upsert(MarketplaceProduct, _rows(user_id, n, suffix),
+                            conflict_cols=('user_id', 'marketplace', 'barcode'))
+                db.session.commit()
+            _timed('bulk_upsert insert', n, lambda: _upsert(''))
+            _timed('bulk_upsert update', n, lambda: _upsert(' v2'))
+
+            sample = MarketplaceProduct.query.filter_by(
+                user_id=user_id, marketplace=BENCH_MARKETPLACE, barcode='BENCH0000001').first()
+            print(f"check: count={MarketplaceProduct.query.filter_by(marketplace=BENCH_MARKETPLACE).count()} "
+                  f"title={sample.title if sample else None}")
+        finally:
+            db.session.rollback()
+            _cleanup(MarketplaceProduct)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""
+Pazaryeri istemci kayıt defteri TLS el sıkışma karşılaştırması (gerçek API'ye gitmez).
+Yerel bir HTTPS sunucusu (kendinden imzalı, *.trendyol.com / *.pazarama.com / ... sertifikası)
+başlatır, pazaryeri alan adlarına giden bağlantıları ona yönlendirir ve sync_all_orders'ı arka arkaya
+çalıştırır: önce CLIENT_REGISTRY kapalı (her çağrıda yeni istemci), sonra açık. Sunucunun kabul
+ettiği TLS bağlantı sayısını, istek sayısını ve süreyi yazdırır. Kimlik bilgileri sahte olarak verilir,
+veritabanındaki ayarlara dokunulmaz.
+
+Kullanım: python bench_client_registry.py [senkron_turu]
+"""
+import os
+import json
+import logging
+import ssl
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.getcwd())
+
+import requests
+import urllib3.util.connection
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+from app import create_app
+
+app = create_app()
+
+DOMAINS = ['trendyol.com', 'pazarama.com', 'idefix.com', 'n11.com', 'hepsiburada.com']
+FAKE_SETTINGS = {
+    'SELLER_ID': '1001', 'API_KEY': 'bench-key', 'API_SECRET': 'bench-secret',
+    'PAZARAMA_API_KEY': 'bench-client', 'PAZARAMA_API_SECRET': 'bench-secret',
+    'IDEFIX_API_KEY': 'bench-key', 'IDEFIX_API_SECRET': 'bench-secret', 'IDEFIX_VENDOR_ID': '2002',
+    'N11_API_KEY': 'bench-key', 'N11_API_SECRET': 'bench-secret',
+    'HB_MERCHANT_ID': 'bench-merchant', 'HB_SERVICE_KEY': 'bench-secret',
+}
+# Empty but well-formed for every marketplace's order / token endpoints
+EMPTY_BODY = json.dumps({
+    'access_token': 'bench-token', 'expires_in': 3600, 'success': True,
+    'data': [], 'content': [], 'items': [], 'orders': [], 'totalElements': 0, 'totalPages': 0,
+    'totalCount': 0,
+}).encode()
+
+
+def _certificate(directory):
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'bench.local')])
+    alt_names = [x509.DNSName(d) for d in DOMAINS] + [x509.DNSName(f'*.{d}') for d in DOMAINS]
+    cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name)
+            .public_key(key.public_key()).serial_number(x509.random_serial_number())
+            .not_valid_before(datetime.utcnow() - timedelta(days=1))
+            .not_valid_after(datetime.utcnow() + timedelta(days=1))
+            .add_extension(x509.SubjectAlternativeName(alt_names), critical=False)
+            .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+            .sign(key, hashes.SHA256()))
+    cert_path, key_path = os.path.join(directory, 'cert.pem'), os.path.join(directory, 'key.pem')
+    with open(cert_path, 'wb') as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, 'wb') as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+    return cert_path, key_path
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+
+    def _reply(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        self.server.requests += 1
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(EMPTY_BODY)))
+        self.end_headers()
+        self.wfile.write(EMPTY_BODY)
+
+    do_GET = do_POST = do_PUT = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, context):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.context = context
+        self.handshakes = 0
+        self.requests = 0
+
+    def get_request(self):
+        sock, addr = super().get_request()
+        self.handshakes += 1
+        return self.context.wrap_socket(sock, server_side=True), addr
+
+
+def _route_to(server, cert_path):
+    port = server.server_address[1]
+    original_create = urllib3.util.connection.create_connection
+
+    def create_connection(address, *args, **kwargs):
+        host = address[0]
+        if any(host == d or host.endswith('.' + d) for d in DOMAINS):
+            address = ('127.0.0.1', port)
+        return original_create(address, *args, **kwargs)
+
+    urllib3.util.connection.create_connection = create_connection
+    original_merge = requests.Session.merge_environment_settings
+
+    def merge_environment_settings(self, url, proxies, stream, verify, cert):
+        settings = original_merge(self, url, proxies, stream, verify, cert)
+        settings['verify'] = cert_path  # trust the bench certificate only
+        return settings
+
+    requests.Session.merge_environment_settings = merge_environment_settings
+
+
+def _run(name, server, rounds, enabled):
+    from app.services.client_registry import CLIENT_REGISTRY
+    from app.services.order_service import sync_all_orders
+
+    CLIENT_REGISTRY.invalidate()
+    CLIENT_REGISTRY.enabled = enabled
+    handshakes, reqs = server.handshakes, server.requests
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        results = sync_all_orders(user_id=None)
+    elapsed = time.perf_counter() - t0
+    errors = {mp: r.get('error') or r.get('message') for mp, r in results.items()
+              if isinstance(r, dict) and (r.get('error') or r.get('success') is False)}
+    print(f"{name:<10} rounds={rounds} requests={server.requests - reqs:<5} "
+          f"tls_handshakes={server.handshakes - handshakes:<4} wall={elapsed:6.2f}s")
+    if errors:
+        print(f"           errors: {errors}")
+    return server.handshakes - handshakes
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    directory = tempfile.mkdtemp(prefix='bench_tls_')
+    cert_path, key_path = _certificate(directory)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_path, key_path)
+    server = _Server(context)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _route_to(server, cert_path)
+
+    with app.app_context():
+        from app.models import Setting
+        original_get = Setting.get
+        Setting.get = staticmethod(lambda k, default=None, user_id=None:
+                                   FAKE_SETTINGS.get(k, original_get(k, default, user_id=user_id)))
+        logging.getLogger().setLevel(logging.ERROR)
+        try:
+            print(f"--- sync_all_orders x{rounds} against a local TLS endpoint ---")
+            fresh = _run('per-call', server, rounds, enabled=False)
+            pooled = _run('registry', server, rounds, enabled=True)
+            print(f"TLS handshakes saved: {fresh - pooled} ({fresh} -> {pooled})")
+        finally:
+            Setting.get = original_get
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+İş ilerleme bildirimi DB gidiş-dönüş karşılaştırması.
+10k ürünlük bir senkronu taklit eder: her 100'lük grupta update_mp_job(progress=...),
+her 10 üründe update_job_progress çağrılır; grup başına API gecikmesi time.sleep ile verilir.
+Eski yol (her çağrıda expire_all + SELECT + UPDATE + commit + BatchLog senkronu) ile
+birleştirilmiş PROGRESS_REPORTER yolunun çalıştırdığı SQL ifadesi sayısını ve süresini yazdırır.
+
+Kullanım: python bench_job_progress.py [ürün_sayısı] [grup_gecikmesi_ms]
+"""
+import os
+import logging
+import sys
+import time
+
+sys.path.append(os.getcwd())
+
+from sqlalchemy import event
+
+from app import create_app, db
+
+app = create_app()
+
+
+def _legacy_update_job_progress(job_id, current, total=None, message=None):
+    """update_job_progress as it was before the reporter (kept here for comparison)."""
+    from app.models import PersistentJob
+    from app.services.job_queue import _sync_with_batch_log
+
+    db.session.expire_all()
+    job = PersistentJob.query.get(job_id)
+    if job:
+        job.progress_current = current
+        if total is not None:
+            job.progress_total = total
+        if message:
+            job.progress_message = message
+        db.session.commit()
+        _sync_with_batch_log(job)
+
+
+def _simulate(report, job_id, items, chunk_delay):
+    for start in range(0, items, 100):
+        for i in range(start, min(start + 100, items), 10):
+            report(job_id, i, items, None)
+        report(job_id, min(start + 100, items), items, f'Güncelleniyor ({min(start + 100, items)}/{items})...')
+        time.sleep(chunk_delay)
+
+
+def _run(name, report, items, chunk_delay, finish=None):
+    from app.services.job_queue import register_mp_job
+
+    job_id = register_mp_job('bench_progress', '_bench', {})
+    statements = [0]
+
+    def _count(*_args):
+        statements[0] += 1
+
+    event.listen(db.engine, 'before_cursor_execute', _count)
+    t0 = time.perf_counter()
+    try:
+        _simulate(report, job_id, items, chunk_delay)
+        if finish:
+            finish(job_id)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', _count)
+    elapsed = time.perf_counter() - t0
+    busy = elapsed - chunk_delay * ((items + 99) // 100)
+    print(f"{name:<10} statements={statements[0]:<6} wall={elapsed:6.2f}s  excl. simulated API={busy:6.3f}s")
+    return job_id
+
+
+def _cleanup(job_ids):
+    from app.models import BatchLog, PersistentJob
+
+    BatchLog.query.filter(BatchLog.batch_id.in_(job_ids)).delete(synchronize_session=False)
+    PersistentJob.query.filter(PersistentJob.id.in_(job_ids)).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def main():
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    chunk_delay = (int(sys.argv[2]) if len(sys.argv) > 2 else 50) / 1000.0
+    with app.app_context():
+        from app.models import PersistentJob
+        from app.services.job_queue import update_job_progress
+        from app.services.job_progress import PROGRESS_REPORTER
+
+        logging.getLogger().setLevel(logging.WARNING)
+        print(f"--- {items} items, {items // 10 + (items + 99) // 100} progress calls, "
+              f"{chunk_delay * 1000:.0f} ms per 100-item chunk ---")
+        legacy = _run('legacy', _legacy_update_job_progress, items, chunk_delay)
+        coalesced = _run('coalesced', update_job_progress, items, chunk_delay, finish=PROGRESS_REPORTER.finish)
+        db.session.expire_all()
+        a, b = PersistentJob.query.get(legacy), PersistentJob.query.get(coalesced)
+        print(f"final progress identical: {(a.progress_current, a.progress_total, a.progress_message) == (b.progress_current, b.progress_total, b.progress_message)}")
+        _cleanup([legacy, coalesced])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+Eşzamanlı sayfalama karşılaştırması (ağ gerektirmez).
+Sahte bir pazaryeri listesi: her istek sabit gecikmeyle yanıt verir, hız sınırı RateLimiter ile
+uygulanır, bazı sayfalar ilk denemede hata verir. fetch_pages'i concurrency=1 (eski sıralı davranış)
+ve MP_PAGINATION_CONCURRENCY ile çalıştırıp süreyi, sırayı ve eksik sayfaları yazdırır.
+
+Kullanım: python bench_pagination.py [ürün_sayısı] [istek_gecikmesi_ms] [istek/sn]
+"""
+import os
+import sys
+import time
+import threading
+
+sys.path.append(os.getcwd())
+
+from app.utils.pagination import fetch_pages, PAGINATION_CONCURRENCY
+from app.utils.rate_limiter import RateLimiter
+
+PAGE_SIZE = 100
+
+
+def _fake_api(total, latency, limiter, flaky_pages):
+    failed_once = set()
+    lock = threading.Lock()
+
+    def fetch_page(page):
+        limiter.wait()
+        time.sleep(latency)
+        with lock:
+            if page in flaky_pages and page not in failed_once:
+                failed_once.add(page)
+                raise ConnectionError(f"simulated reset on page {page}")
+        start = page * PAGE_SIZE
+        rows = [{'id': i} for i in range(start, min(start + PAGE_SIZE, total))]
+        return {'content': rows, 'totalElements': total}
+
+    return fetch_page
+
+
+def _run(name, total, latency, rate, concurrency):
+    limiter = RateLimiter(rate, 1, burst=max(1, rate // 10), name=name)
+    fetch_page = _fake_api(total, latency, limiter, flaky_pages={3, 17})
+    t0 = time.perf_counter()
+    result = fetch_pages(fetch_page, lambda resp: resp['content'], page_size=PAGE_SIZE,
+                         total_of=lambda resp: resp['totalElements'], concurrency=concurrency)
+    elapsed = time.perf_counter() - t0
+    in_order = [row['id'] for row in result.items] == list(range(total))
+    print(f"{name:<12} concurrency={concurrency:<3} pages={result.pages:<4} items={len(result.items):<6} "
+          f"in_order={in_order} failed={sorted(result.failed_pages)} wall={elapsed:6.2f}s")
+    return elapsed
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    latency = (int(sys.argv[2]) if len(sys.argv) > 2 else 250) / 1000.0
+    rate = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    print(f"--- {total} items, {PAGE_SIZE}/page, {latency * 1000:.0f} ms per request, {rate} req/s limit ---")
+    sequential = _run('sequential', total, latency, rate, 1)
+    concurrent = _run('concurrent', total, latency, rate, max(2, PAGINATION_CONCURRENCY))
+    print(f"speed-up: {sequential / concurrent:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
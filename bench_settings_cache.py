@@ -0,0 +1,152 @@
+"""
+Setting.get önbelleği sorgu sayısı karşılaştırması (gerçek API'ye gitmez).
+Geçici bir kullanıcı ayar seti, XML kaynağı (indeksi bellekteki önbelleğe hazır konur) ve kategori
+eşlemesi oluşturur; Trendyol istemcisinin ağ çağrılarını sahte yanıtlarla değiştirip
+perform_trendyol_send_all'ı önce SETTINGS_CACHE kapalı, sonra açık çalıştırır. Toplam SQL sorgusu,
+settings tablosuna giden sorgu ve süreyi yazdırır.
+
+Kullanım: python bench_settings_cache.py [ürün_sayısı]   (varsayılan: 2000)
+"""
+import os
+import json
+import logging
+import sys
+import time
+
+sys.path.append(os.getcwd())
+
+from sqlalchemy import event
+
+from app import create_app, db
+
+app = create_app()
+
+CATEGORY = 'Giyim > Tişört'
+BENCH_SETTINGS = {
+    'SELLER_ID': '1001', 'API_KEY': 'bench-key', 'API_SECRET': 'bench-secret',
+    'TRENDYOL_BRAND_ID': '1234', 'TRENDYOL_BRAND_NAME': 'Bench Marka',
+    'TRENDYOL_DEFAULT_DESI': '2', 'TRENDYOL_CARGO_COMPANY_ID': '10',
+    'GLOBAL_PRICE_RULES': json.dumps([{'min': 0, 'max': 500, 'percent': 25}, {'min': 500, 'max': 99999999, 'percent': 15}]),
+    'FORBIDDEN_KEYWORDS': 'replika, çakma',
+}
+
+
+def _rows(n):
+    for i in range(n):
+        yield {
+            'barcode': f'869{i:010d}', 'stockCode': f'SKU-{i:07d}', 'name': f'Örnek Ürün {i} Pamuklu Tişört',
+            'detail': f'<p>Ürün {i} açıklaması.</p>', 'quantity': str(i % 75), 'price': f'{100 + (i % 900)},90',
+            'tax': '20', 'brand': 'Marka', 'category': CATEGORY, 'image1': f'https://cdn.example.com/img/{i}_1.jpg',
+        }
+
+
+def _seed(n):
+    from app.models import CategoryMapping, Setting, SupplierXML, User
+    from app.services import xml_service
+
+    user = User(email=f'bench-settings-{time.time_ns()}@example.com')
+    user.password_hash = 'x'
+    db.session.add(user)
+    db.session.commit()
+    for key, value in BENCH_SETTINGS.items():
+        Setting.set(key, value, user_id=user.id)
+    for i in range(40):  # a realistic settings row count per user
+        Setting.set(f'BENCH_OTHER_{i}', str(i), user_id=user.id)
+    src = SupplierXML(name='bench settings', url='http://bench.invalid/feed.xml', user_id=user.id,
+                      content_hash='bench-settings')
+    db.session.add(src)
+    if not CategoryMapping.query.filter_by(source_category=CATEGORY, marketplace='trendyol').first():
+        db.session.add(CategoryMapping(source_category=CATEGORY, marketplace='trendyol', target_category_id=597))
+    db.session.commit()
+    index = xml_service._build_xml_index(_rows(n), src, 0)
+    xml_service._cache_put(src.id, index, src.content_hash)
+    return user.id, src.id
+
+
+def _cleanup(user_id, src_id):
+    from app.models import CategoryMapping, Setting, SupplierXML, User
+    from app.services import xml_service
+
+    xml_service.invalidate_xml_source_cache(src_id)
+    Setting.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+    SupplierXML.query.filter_by(id=src_id).delete(synchronize_session=False)
+    CategoryMapping.query.filter_by(source_category=CATEGORY, marketplace='trendyol').delete(synchronize_session=False)
+    User.query.filter_by(id=user_id).delete(synchronize_session=False)
+    db.session.commit()
+    Setting.invalidate_cache(user_id)
+
+
+def _fake_client():
+    """Trendyol network calls answered locally (restored by the returned function)."""
+    from app.services.trendyol_client import TrendyolClient
+
+    fakes = {
+        'get_category_attributes': lambda self, category_id: {'categoryAttributes': []},
+        'create_products': lambda self, items: {'batchRequestId': f'bench-{len(items)}'},
+        'check_batch_status': lambda self, batch_id: {'status': 'COMPLETED', 'items': []},
+    }
+    originals = {name: getattr(TrendyolClient, name) for name in fakes}
+    original_sleep = time.sleep
+    for name, fn in fakes.items():
+        setattr(TrendyolClient, name, fn)
+    time.sleep = lambda seconds: None  # the job waits 3 s per batch for Trendyol
+
+    def restore():
+        for name, fn in originals.items():
+            setattr(TrendyolClient, name, fn)
+        time.sleep = original_sleep
+    return restore
+
+
+def _run(name, user_id, src_id, enabled):
+    from app.services.client_registry import CLIENT_REGISTRY
+    from app.services.settings_cache import SETTINGS_CACHE
+    from app.services.trendyol_service import perform_trendyol_send_all
+
+    SETTINGS_CACHE.invalidate(all_users=True)
+    SETTINGS_CACHE.enabled = enabled
+    CLIENT_REGISTRY.invalidate()
+    counts = {'total': 0, 'settings': 0}
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        counts['total'] += 1
+        if 'settings' in statement or 'setting_versions' in statement:
+            counts['settings'] += 1
+
+    event.listen(db.engine, 'before_cursor_execute', count)
+    t0 = time.perf_counter()
+    try:
+        result = perform_trendyol_send_all(f'bench-settings-{name}', src_id, user_id=user_id)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count)
+    elapsed = time.perf_counter() - t0
+    print(f"{name:<9} sent={result.get('count', 0):<6} queries={counts['total']:<7} "
+          f"settings_queries={counts['settings']:<7} wall={elapsed:6.2f}s")
+    if not result.get('success'):
+        print(f"          error: {result.get('message')}")
+    return result, counts
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with app.app_context():
+        from app.services.settings_cache import SETTINGS_CACHE
+
+        logging.getLogger().setLevel(logging.ERROR)
+        enabled = SETTINGS_CACHE.enabled
+        user_id, src_id = _seed(n)
+        restore = _fake_client()
+        try:
+            print(f"--- perform_trendyol_send_all, {n} products ---")
+            before, q_before = _run('uncached', user_id, src_id, enabled=False)
+            after, q_after = _run('cached', user_id, src_id, enabled=True)
+            same = before.get('matched') == after.get('matched')
+            print(f"settings queries: {q_before['settings']} -> {q_after['settings']}  same payload: {same}")
+        finally:
+            restore()
+            SETTINGS_CACHE.enabled = enabled
+            _cleanup(user_id, src_id)
+
+
+if __name__ == '__main__':
+    main()
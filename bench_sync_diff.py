@@ -0,0 +1,141 @@
+"""
+Direct Push fark (diff) motoru karşılaştırması.
+Her boyut için geçici bir XML kaynağı ve pazaryeri kayıtları oluşturur (~%5 fiyat/stok değişikliği,
+~%2 yeni ürün, ~%1 XML'den düşmüş ürün). Eski yol (tüm raw_data + json.loads + sözlük döngüsü)
+ile compute_diff'in sütunsal ve SQL arka uçlarının süresini, tepe belleğini ve sonuçların aynı olup
+olmadığını yazdırır.
+
+Kullanım: python bench_sync_diff.py [satır_sayısı ...]   (varsayılan: 10000 50000 200000)
+"""
+import os
+import json
+import logging
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+sys.path.append(os.getcwd())
+
+from app import create_app, db
+
+app = create_app()
+
+MARKETPLACE = '_bench_diff'
+
+
+def _legacy_diff(marketplace, user_id, xml_source_id):
+    """perform_sync's diff as it was before compute_diff (kept here for comparison)."""
+    from app.models import CachedXmlProduct, MarketplaceProduct
+
+    xml_products = db.session.query(
+        CachedXmlProduct.stock_code, CachedXmlProduct.price, CachedXmlProduct.quantity,
+        CachedXmlProduct.barcode, CachedXmlProduct.title, CachedXmlProduct.raw_data
+    ).filter(CachedXmlProduct.xml_source_id == xml_source_id).all()
+    xml_map = {}
+    for p in xml_products:
+        if not p.stock_code:
+            continue
+        ns = SimpleNamespace(**(json.loads(p.raw_data) if p.raw_data else {}))
+        ns.stock_code, ns.price, ns.quantity = p.stock_code, p.price, p.quantity
+        ns.barcode, ns.title, ns.raw_data = p.barcode, p.title, p.raw_data
+        xml_map[p.stock_code] = ns
+    local_products = db.session.query(
+        MarketplaceProduct.id, MarketplaceProduct.stock_code, MarketplaceProduct.barcode,
+        MarketplaceProduct.quantity, MarketplaceProduct.price, MarketplaceProduct.sale_price,
+        MarketplaceProduct.xml_source_id
+    ).filter_by(user_id=user_id, marketplace=marketplace).all()
+    local_map = {p.stock_code: p for p in local_products if p.stock_code}
+
+    to_update, to_create, to_zero = [], [], []
+    for sc, xml_item in xml_map.items():
+        if sc in local_map:
+            local_item = local_map[sc]
+            if (xml_item.quantity != local_item.quantity or xml_item.price != local_item.price
+                    or local_item.xml_source_id != xml_source_id):
+                to_update.append((xml_item, local_item))
+        else:
+            to_create.append(xml_item)
+    for sc, local_item in local_map.items():
+        if sc not in xml_map and (local_item.quantity or 0) > 0 and local_item.xml_source_id == xml_source_id:
+            to_zero.append(local_item)
+    return to_update, to_create, to_zero
+
+
+def _seed(n):
+    from app.models import CachedXmlProduct, MarketplaceProduct, SupplierXML, User
+
+    user = User.query.first()
+    src = SupplierXML(name=f'bench diff {n}', url='http://bench.invalid/feed.xml', user_id=user.id)
+    db.session.add(src)
+    db.session.commit()
+    description = 'Pamuklu, rahat kesim, günlük kullanım için uygundur. ' * 12
+    xml_rows, local_rows = [], []
+    for i in range(n):
+        code = f'SKU-{i:07d}'
+        price, qty = 100.0 + i % 500, i % 40
+        raw = {'stock_code': code, 'barcode': f'869{i:010d}', 'title': f'Ürün {i}', 'price': price,
+               'quantity': qty, 'description': description, 'images': [f'https://cdn.invalid/{i}/{k}.jpg' for k in range(4)],
+               'brand': f'Marka {i % 40}', 'category': f'Kategori > Alt {i % 120}'}
+        if i % 100 != 99:  # ~1% dropped from the feed
+            xml_rows.append({'xml_source_id': src.id, 'user_id': user.id, 'stock_code': code, 'barcode': raw['barcode'],
+                             'title': raw['title'], 'price': price, 'quantity': qty, 'raw_data': json.dumps(raw, ensure_ascii=False)})
+        if i % 50 != 7:  # ~2% not yet on the marketplace
+            changed = i % 20 == 3  # ~5% price/stock changes
+            local_rows.append({'user_id': user.id, 'marketplace': MARKETPLACE, 'barcode': raw['barcode'], 'stock_code': code,
+                               'price': price + (1 if changed else 0), 'sale_price': price, 'quantity': qty + 1 if i % 40 == 11 else qty,
+                               'xml_source_id': src.id})
+    db.session.execute(CachedXmlProduct.__table__.insert(), xml_rows)
+    db.session.execute(MarketplaceProduct.__table__.insert(), local_rows)
+    db.session.commit()
+    return user.id, src.id
+
+
+def _cleanup(src_id):
+    from app.models import CachedXmlProduct, MarketplaceProduct, SupplierXML
+
+    CachedXmlProduct.query.filter_by(xml_source_id=src_id).delete(synchronize_session=False)
+    MarketplaceProduct.query.filter_by(marketplace=MARKETPLACE).delete(synchronize_session=False)
+    SupplierXML.query.filter_by(id=src_id).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def _measure(fn):
+    """(result, seconds, peak bytes); timed without tracemalloc, which slows allocation-heavy code."""
+    db.session.expire_all()
+    t0 = time.perf_counter()
+    out = fn()
+    elapsed = time.perf_counter() - t0
+    db.session.expire_all()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return out, elapsed, peak
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [10000, 50000, 200000]
+    with app.app_context():
+        from app.services.sync_diff import DIFF_BACKENDS, compute_diff
+
+        logging.getLogger().setLevel(logging.WARNING)
+        for n in sizes:
+            user_id, src_id = _seed(n)
+            try:
+                (lu, lc, lz), legacy_s, legacy_peak = _measure(lambda: _legacy_diff(MARKETPLACE, user_id, src_id))
+                print(f"--- {n} rows: {len(lu)} update, {len(lc)} create, {len(lz)} zero ---")
+                print(f"legacy     {legacy_s:7.3f}s  peak={legacy_peak / 1e6:7.1f} MB")
+                for backend in DIFF_BACKENDS:
+                    diff, took, peak = _measure(lambda: compute_diff(MARKETPLACE, user_id, src_id, backend=backend))
+                    same = ([(x.stock_code, l.id) for x, l in lu] == [(x.stock_code, l.id) for x, l in diff.to_update]
+                            and [x.stock_code for x in lc] == [x.stock_code for x in diff.to_create]
+                            and [l.id for l in lz] == [l.id for l in diff.to_zero])
+                    print(f"{backend:<10} {took:7.3f}s  peak={peak / 1e6:7.1f} MB  identical={same}  "
+                          f"speed-up={legacy_s / took:.1f}x")
+            finally:
+                _cleanup(src_id)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+XML indeks kayıt düzeni bellek karşılaştırması.
+Aynı sentetik feed'i _build_xml_index ile 'dict' ve 'compact' (XmlRecordStore) düzeninde
+kurar; tutulan bellek (tracemalloc), tepe bellek, kurulum süresi ve tam tarama süresini yazdırır.
+
+Kullanım: python bench_xml_record_store.py [ürün_sayısı] [varyant_oranı_yüzde]
+"""
+import gc
+import os
+import logging
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+sys.path.append(os.getcwd())
+
+from app import create_app
+
+app = create_app()
+
+BRANDS = [f'Marka {i}' for i in range(40)]
+CATEGORIES = [f'Kategori > Alt {i}' for i in range(120)]
+
+
+def _rows(n, variant_pct):
+    for i in range(n):
+        desc = f'<p>Ürün {i} açıklaması. Pamuklu, rahat kesim, günlük kullanım için uygundur.</p>' * 3
+        row = {
+            'barcode': f'869{i:010d}',
+            'productCode': f'PC{i // 4:07d}',
+            'modelCode': f'MD{i // 8:06d}',
+            'stockCode': f'SKU-{i:07d}',
+            'name': f'Örnek Ürün {i} Pamuklu Tişört',
+            'detail': desc,
+            'quantity': str(i % 75),
+            'price': f'{100 + (i % 900)},90',
+            'tax': '20',
+            'brand': BRANDS[i % len(BRANDS)],
+            'category': CATEGORIES[i % len(CATEGORIES)],
+            'image1': f'https://cdn.example.com/img/{i}_1.jpg',
+            'image2': f'https://cdn.example.com/img/{i}_2.jpg',
+            'link': 'https://www.example.com/urun',
+        }
+        if variant_pct and i % 100 < variant_pct:
+            row['variants'] = {'variant': [
+                {'barcode': f'869{i:010d}{s}', 'stock': str(s), 'price': '129.90', 'name1': 'Beden', 'value1': size}
+                for s, size in enumerate(('S', 'M', 'L'))
+            ]}
+        yield row
+
+
+def _measure(mode, n, variant_pct):
+    from app.services import xml_service
+
+    xml_service.XML_RECORD_STORE = mode
+    src = SimpleNamespace(user_id=None)
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    index = xml_service._build_xml_index(_rows(n, variant_pct), src, 0)
+    build = time.perf_counter() - t0
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    t0 = time.perf_counter()
+    hits = sum(1 for rec in index['__records__']
+               if 'tişört' in rec.get('title_normalized', '') and rec.get('quantity', 0) > 10)
+    scan = time.perf_counter() - t0
+    records = len(index['__records__'])
+    print(f"{mode:<8} records={records:<7} retained={retained / 1024 ** 2:8.1f} MB  "
+          f"peak={peak / 1024 ** 2:8.1f} MB  build={build:6.2f}s  scan={scan * 1000:7.1f} ms  hits={hits}")
+    return index
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    variant_pct = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    with app.app_context():
+        logging.getLogger('app.services.xml_service').setLevel(logging.WARNING)
+        print(f"--- {n} products, %{variant_pct} with 3 variants ---")
+        a = _measure('dict', n, variant_pct)
+        b = _measure('compact', n, variant_pct)
+        same = all(dict(x) == y for x, y in zip(b['__records__'], a['__records__']))
+        print(f"records identical: {same}")
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,20 @@ class Config:
     # Marketplace Settings
     TRENDYOL_SNAPSHOT_TTL = int(os.environ.get("TRENDYOL_SNAPSHOT_TTL", "300"))
     MP_MAX_JOBS = int(os.environ.get("MP_MAX_JOBS", "120"))
+    # Job scheduler limits (running jobs across all workers)
+    MP_MAX_RUNNING_JOBS = int(os.environ.get("MP_MAX_RUNNING_JOBS", "10"))
+    MP_MAX_JOBS_PER_USER = int(os.environ.get("MP_MAX_JOBS_PER_USER", "3"))
+    MP_MAX_JOBS_PER_MARKETPLACE = int(os.environ.get("MP_MAX_JOBS_PER_MARKETPLACE", "6"))
+    MP_JOB_STALE_SECONDS = int(os.environ.get("MP_JOB_STALE_SECONDS", "3600"))  # running rows not updated since are ignored
+    # Marketplace API rate limit state: 'local' (per process), 'file' (shared by the workers on this
+    # host), 'postgres' (shared by every host). RATE_LIMIT_BACKEND_<MARKETPLACE> overrides per marketplace.
+    RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "file")
+    RATE_LIMIT_DIR = os.environ.get("RATE_LIMIT_DIR", "")  # file backend; default: <tmp>/vidos_rate_limits
+    # Marketplace OAuth tokens: 'local' (per process) or 'file' (shared by the workers on this host)
+    TOKEN_CACHE_BACKEND = os.environ.get("TOKEN_CACHE_BACKEND", "local")
+    TOKEN_CACHE_DIR = os.environ.get("TOKEN_CACHE_DIR", "")  # file backend; default: <tmp>/vidos_tokens
+    # Direct Push diff: 'columnar' (NumPy in the worker) or 'sql' (join in the database, only changed rows returned)
+    DIRECT_SYNC_DIFF_BACKEND = os.environ.get("DIRECT_SYNC_DIFF_BACKEND", "columnar")
     
     # Email Settings (Flask-Mail)
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
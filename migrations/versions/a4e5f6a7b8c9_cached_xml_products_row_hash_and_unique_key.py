@@ -0,0 +1,36 @@
+"""cached_xml_products row_hash and unique (xml_source_id, stock_code)
+
+Revision ID: a4e5f6a7b8c9
+Revises: 7a8b9c0d1e2f
+Create Date: 2026-10-16 12:20:05.118734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4e5f6a7b8c9'
+down_revision = '7a8b9c0d1e2f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep the newest row per (xml_source_id, stock_code) before making the key unique
+    op.execute(
+        "DELETE FROM cached_xml_products WHERE id NOT IN ("
+        "SELECT MAX(id) FROM cached_xml_products GROUP BY xml_source_id, stock_code)"
+    )
+
+    with op.batch_alter_table('cached_xml_products', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('row_hash', sa.String(length=32), nullable=True))
+        batch_op.drop_index('idx_xml_stock_code')
+        batch_op.create_index('idx_xml_stock_code', ['xml_source_id', 'stock_code'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('cached_xml_products', schema=None) as batch_op:
+        batch_op.drop_index('idx_xml_stock_code')
+        batch_op.create_index('idx_xml_stock_code', ['xml_source_id', 'stock_code'], unique=False)
+        batch_op.drop_column('row_hash')
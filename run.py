@@ -3,7 +3,9 @@ load_dotenv()  # Load .env file before importing app
 
 from app import create_app
 
-app = create_app()
+# Parse pool workers (spawn/forkserver) re-import this script as __mp_main__; they need no app
+if __name__ != '__mp_main__':
+    app = create_app()
 
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port=5000)
@@ -0,0 +1,144 @@
+"""
+download_xml_to_spool / fetch_supplier_xml against a local HTTP stand-in:
+304 on matching If-None-Match / If-Modified-Since, validators stored from the response,
+and the identical-body (content_hash) short-circuit when the supplier sends no validators.
+
+Run directly (python test_xml_conditional_get.py) or with pytest.
+"""
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+from app.utils.helpers import download_xml_to_spool
+from app.services.xml_service import fetch_supplier_xml
+
+FEED_V1 = b'<Products><Product><stockCode>A1</stockCode><price>10</price></Product></Products>'
+FEED_V2 = b'<Products><Product><stockCode>A1</stockCode><price>12</price></Product></Products>'
+ETAG = '"feed-v1"'
+LAST_MODIFIED = 'Wed, 14 Oct 2026 08:00:00 GMT'
+
+
+class _FeedHandler(BaseHTTPRequestHandler):
+    # /validated: ETag + Last-Modified, answers 304 when either validator matches
+    # /plain: no validators, always 200 with the current body
+    body = FEED_V1
+    requests_seen = []
+
+    def do_GET(self):
+        _FeedHandler.requests_seen.append((self.path, dict(self.headers)))
+        if self.path == '/validated':
+            if (self.headers.get('If-None-Match') == ETAG
+                    or self.headers.get('If-Modified-Since') == LAST_MODIFIED):
+                self.send_response(304)
+                self.end_headers()
+                return
+            self._send(_FeedHandler.body, {'ETag': ETAG, 'Last-Modified': LAST_MODIFIED})
+        elif self.path == '/plain':
+            self._send(_FeedHandler.body, {})
+        else:
+            self.send_response(404)
+            self.end_headers()
+
+    def _send(self, body, headers):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _serve():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _FeedHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def _read(download):
+    try:
+        return download['file'].read()
+    finally:
+        download['file'].close()
+
+
+def test_full_download_keeps_validators():
+    server, base = _serve()
+    try:
+        _FeedHandler.body = FEED_V1
+        d = download_xml_to_spool(f'{base}/validated')
+        assert d['not_modified'] is False
+        assert d['etag'] == ETAG and d['last_modified'] == LAST_MODIFIED
+        assert d['size'] == len(FEED_V1)
+        assert d['content_hash'] == hashlib.sha256(FEED_V1).hexdigest()
+        assert _read(d) == FEED_V1
+    finally:
+        server.shutdown()
+
+
+def test_304_on_matching_validators():
+    server, base = _serve()
+    try:
+        for kwargs in ({'etag': ETAG}, {'last_modified': LAST_MODIFIED}, {'etag': ETAG, 'last_modified': LAST_MODIFIED}):
+            _FeedHandler.requests_seen = []
+            d = download_xml_to_spool(f'{base}/validated', **kwargs)
+            assert d['not_modified'] is True, kwargs
+            assert d['file'] is None and d['content_hash'] is None and d['size'] == 0
+            # The stored validators are passed back for the next request
+            assert d['etag'] == kwargs.get('etag') and d['last_modified'] == kwargs.get('last_modified')
+            headers = _FeedHandler.requests_seen[-1][1]
+            if 'etag' in kwargs:
+                assert headers.get('If-None-Match') == ETAG
+            if 'last_modified' in kwargs:
+                assert headers.get('If-Modified-Since') == LAST_MODIFIED
+    finally:
+        server.shutdown()
+
+
+def test_stale_etag_downloads_again():
+    server, base = _serve()
+    try:
+        _FeedHandler.body = FEED_V1
+        d = download_xml_to_spool(f'{base}/validated', etag='"feed-v0"')
+        assert d['not_modified'] is False and d['etag'] == ETAG
+        assert _read(d) == FEED_V1
+    finally:
+        server.shutdown()
+
+
+def test_identical_hash_short_circuit():
+    server, base = _serve()
+    try:
+        _FeedHandler.body = FEED_V1
+        src = SimpleNamespace(url=f'{base}/plain', etag=None, last_modified=None,
+                              content_hash=hashlib.sha256(FEED_V1).hexdigest())
+
+        # No validators from the supplier: same body -> not_modified by content_hash
+        d = fetch_supplier_xml(src, conditional=True)
+        assert d['not_modified'] is True and d['file'] is None
+
+        # force (conditional=False) always returns the body
+        d = fetch_supplier_xml(src, conditional=False)
+        assert d['not_modified'] is False
+        assert _read(d) == FEED_V1
+
+        # Changed body -> full download with the new hash
+        _FeedHandler.body = FEED_V2
+        d = fetch_supplier_xml(src, conditional=True)
+        assert d['not_modified'] is False
+        assert d['content_hash'] == hashlib.sha256(FEED_V2).hexdigest()
+        assert _read(d) == FEED_V2
+    finally:
+        _FeedHandler.body = FEED_V1
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    for name, fn in list(globals().items()):
+        if name.startswith('test_') and callable(fn):
+            fn()
+            print(f'OK  {name}')